@@ -0,0 +1,259 @@
+import asyncio
+import os
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
+from batch import BatchResult, parse_chunk
+
+
+class AsyncParser:
+    """
+    Parse queries from asyncio code without blocking the event loop.
+
+    Parsing runs in an executor, a process pool by default. Queries passed to
+    parse in the same loop iteration are coalesced into one executor call,
+    up to batch_size queries or batch_chars characters, so many small queries
+    share the handoff cost. At most max_in_flight executor calls run at once;
+    further batches wait for a free slot.
+    """
+
+    def __init__(self, executor: Optional[Executor] = None, max_workers: Optional[int] = None,
+                 max_in_flight: Optional[int] = None, batch_size: int = 64, batch_chars: int = 16384):
+        """
+        Initialize the AsyncParser.
+
+        Parameters:
+        executor (Optional[Executor]): The executor to run parsing in. If None, a process
+            pool is created on first use and shut down by close.
+        max_workers (Optional[int]): Size of the process pool created when executor is None,
+            or of the given executor; defaults to the CPU count.
+        max_in_flight (Optional[int]): Maximum number of concurrent executor calls;
+            defaults to twice the number of workers.
+        batch_size (int): Maximum number of queries per executor call.
+        batch_chars (int): Total query length above which a batch is sent at once.
+
+        Raises:
+        ValueError: If a limit is not positive.
+        """
+        if batch_size < 1 or batch_chars < 1 or (max_in_flight is not None and max_in_flight < 1):
+            raise ValueError("Batch and in-flight limits must be positive")
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._max_workers = max_workers
+        self._max_in_flight = max_in_flight
+        self.batch_size = batch_size
+        self.batch_chars = batch_chars
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._slots_loop: Optional[asyncio.AbstractEventLoop] = None
+        # Queries waiting to be sent, keyed by the (flat, normalize) options.
+        self._pending: Dict[Tuple[bool, bool], List[Tuple[str, asyncio.Future]]] = {}
+        self._pending_chars: Dict[Tuple[bool, bool], int] = {}
+        self._tasks = set()
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self._max_workers)
+        return self._executor
+
+    @property
+    def max_in_flight(self) -> int:
+        if self._max_in_flight is None:
+            self._max_in_flight = 2 * (self._max_workers or os.cpu_count() or 1)
+        return self._max_in_flight
+
+    async def parse(self, query: str, flat: bool = False, normalize: bool = True) -> BatchResult:
+        """
+        Parse one query in the executor.
+
+        Parameters:
+        query (str): The SQL query.
+        flat (bool): If True, return flattened token strings instead of the dict tree.
+        normalize (bool): If True, normalize the query before building the tree.
+
+        Returns:
+        BatchResult: The parse result; errors are reported in its error field.
+        """
+        loop = asyncio.get_running_loop()
+        key = (flat, normalize)
+        future = loop.create_future()
+        batch = self._pending.setdefault(key, [])
+        if not batch:
+            self._pending_chars[key] = 0
+            loop.call_soon(self._flush, key)
+        batch.append((query, future))
+        self._pending_chars[key] += len(query) if isinstance(query, str) else 0
+        if len(batch) >= self.batch_size or self._pending_chars[key] >= self.batch_chars:
+            self._flush(key)
+        return await future
+
+    async def parse_stream(self, source: Union[Iterable[str], AsyncIterable[str]], chunk_size: int = 64,
+                           ordered: bool = True, flat: bool = False,
+                           normalize: bool = True) -> AsyncIterator[BatchResult]:
+        """
+        Parse a stream of queries, reading ahead only as far as the executor can keep up.
+
+        Parameters:
+        source (Union[Iterable[str], AsyncIterable[str]]): The SQL queries to parse.
+        chunk_size (int): Number of queries sent to the executor at once.
+        ordered (bool): If True, yield results in input order; otherwise as they complete.
+        flat (bool): If True, return flattened token strings instead of the dict tree.
+        normalize (bool): If True, normalize queries before building the tree.
+
+        Returns:
+        AsyncIterator[BatchResult]: One result per query.
+
+        Raises:
+        ValueError: If chunk_size is not positive.
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be positive")
+        items = _aenumerate(source)
+        pending = deque()
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(pending) < self.max_in_flight:
+                    chunk = [item async for item in _aislice(items, chunk_size)]
+                    exhausted = len(chunk) < chunk_size
+                    if chunk:
+                        pending.append(asyncio.ensure_future(self._run_chunk(chunk, flat, normalize)))
+                if not pending:
+                    return
+                if ordered:
+                    for result in await pending.popleft():
+                        yield result
+                    continue
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    pending.remove(task)
+                    for result in task.result():
+                        yield result
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def close(self):
+        """
+        Wait for queued work and shut down the executor if this parser created it.
+        """
+        for key in list(self._pending):
+            self._flush(key)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._owns_executor and self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.get_running_loop().run_in_executor(None, executor.shutdown)
+
+    async def __aenter__(self) -> "AsyncParser":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def _flush(self, key: Tuple[bool, bool]):
+        batch = self._pending.pop(key, None)
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._dispatch(batch, *key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, batch: List[Tuple[str, asyncio.Future]], flat: bool, normalize: bool):
+        try:
+            results = await self._run_chunk([(index, query) for index, (query, _) in enumerate(batch)],
+                                            flat, normalize)
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for result, (_, future) in zip(results, batch):
+            result.index = 0
+            if not future.done():
+                future.set_result(result)
+
+    async def _run_chunk(self, chunk: List[Tuple[int, str]], flat: bool, normalize: bool) -> List[BatchResult]:
+        loop = asyncio.get_running_loop()
+        if self._slots_loop is not loop:
+            # Semaphores are bound to one event loop; the shared parser may outlive it.
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+            self._slots_loop = loop
+        async with self._slots:
+            return await loop.run_in_executor(self.executor, parse_chunk, chunk, flat, normalize)
+
+
+_default_parser: Optional[AsyncParser] = None
+
+
+def _get_default_parser() -> AsyncParser:
+    global _default_parser
+    if _default_parser is None:
+        _default_parser = AsyncParser()
+    return _default_parser
+
+
+async def parse_async(query: str, flat: bool = False, normalize: bool = True,
+                      parser: Optional[AsyncParser] = None) -> BatchResult:
+    """
+    Parse one query off the event loop.
+
+    Parameters:
+    query (str): The SQL query.
+    flat (bool): If True, return flattened token strings instead of the dict tree.
+    normalize (bool): If True, normalize the query before building the tree.
+    parser (Optional[AsyncParser]): The parser to use; defaults to a shared one
+        backed by a process pool.
+
+    Returns:
+    BatchResult: The parse result; errors are reported in its error field.
+    """
+    return await (parser or _get_default_parser()).parse(query, flat=flat, normalize=normalize)
+
+
+async def parse_stream_async(source: Union[Iterable[str], AsyncIterable[str]], chunk_size: int = 64,
+                             ordered: bool = True, flat: bool = False, normalize: bool = True,
+                             parser: Optional[AsyncParser] = None) -> AsyncIterator[BatchResult]:
+    """
+    Parse a stream of queries off the event loop, with bounded read-ahead.
+
+    Parameters:
+    source (Union[Iterable[str], AsyncIterable[str]]): The SQL queries to parse.
+    chunk_size (int): Number of queries sent to the executor at once.
+    ordered (bool): If True, yield results in input order; otherwise as they complete.
+    flat (bool): If True, return flattened token strings instead of the dict tree.
+    normalize (bool): If True, normalize queries before building the tree.
+    parser (Optional[AsyncParser]): The parser to use; defaults to a shared one
+        backed by a process pool.
+
+    Returns:
+    AsyncIterator[BatchResult]: One result per query.
+    """
+    stream = (parser or _get_default_parser()).parse_stream(
+        source, chunk_size=chunk_size, ordered=ordered, flat=flat, normalize=normalize)
+    async for result in stream:
+        yield result
+
+
+async def _aenumerate(source: Union[Iterable[str], AsyncIterable[str]]) -> AsyncIterator[Tuple[int, str]]:
+    index = 0
+    if hasattr(source, "__aiter__"):
+        async for item in source:
+            yield index, item
+            index += 1
+    else:
+        for item in source:
+            yield index, item
+            index += 1
+
+
+async def _aislice(items: AsyncIterator, count: int) -> AsyncIterator:
+    for _ in range(count):
+        try:
+            yield await items.__anext__()
+        except StopAsyncIteration:
+            return
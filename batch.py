@@ -0,0 +1,126 @@
+import os
+from collections import deque
+from concurrent.futures import Executor, FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from sql_query import SqlQuery
+
+
+@dataclass
+class BatchResult:
+    """
+    The outcome of parsing one query of a batch.
+
+    Attributes:
+    index (int): Position of the query in the input iterable.
+    query (str): The raw SQL query.
+    normalized_query (Optional[str]): The normalized query, if normalization was requested.
+    tree (Optional[Dict]): The dict form of the token tree, with token types as strings.
+    flat_tokens (Optional[List[str]]): The flattened token strings, in flat mode.
+    error (Optional[str]): The error message if the query could not be processed.
+    """
+    index: int
+    query: str
+    normalized_query: Optional[str] = None
+    tree: Optional[Dict] = None
+    flat_tokens: Optional[List[str]] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def parse_chunk(chunk: List[Tuple[int, str]], flat: bool = False, normalize: bool = True) -> List[BatchResult]:
+    """
+    Parse a chunk of queries, keeping errors per query.
+
+    Parameters:
+    chunk (List[Tuple[int, str]]): Pairs of input position and query.
+    flat (bool): If True, return flattened token strings instead of the dict tree.
+    normalize (bool): If True, normalize queries before building the tree.
+
+    Returns:
+    List[BatchResult]: One result per query, in chunk order.
+    """
+    sql_query = SqlQuery()
+    results = []
+    for index, query in chunk:
+        result = BatchResult(index=index, query=query)
+        try:
+            if not isinstance(query, str):
+                raise ValueError("Query must be a string")
+            sql_query.set_query(query, normalize=normalize)
+            sql_query.create_tree()
+            result.normalized_query = sql_query.normalized_query if normalize else None
+            if flat:
+                result.flat_tokens = sql_query.flatten_tree()
+            else:
+                result.tree = sql_query.query_tree().to_dict(type_names=True)
+        except ValueError as e:
+            result.error = str(e)
+        results.append(result)
+    return results
+
+
+def parse_many(queries: Iterable[str], chunk_size: int = 64, max_workers: Optional[int] = None,
+               ordered: bool = True, flat: bool = False, normalize: bool = True,
+               executor: Optional[Executor] = None) -> Iterator[BatchResult]:
+    """
+    Parse an iterable of queries across a pool of worker processes.
+
+    The input is consumed lazily, and only a bounded number of chunks is in
+    flight at any time, so generators of arbitrary length can be processed.
+
+    Parameters:
+    queries (Iterable[str]): The SQL queries to parse.
+    chunk_size (int): Number of queries sent to a worker at once.
+    max_workers (Optional[int]): Size of the process pool, or of the given executor;
+        defaults to the CPU count. Twice as many chunks are kept in flight.
+    ordered (bool): If True, yield results in input order; otherwise as they complete.
+    flat (bool): If True, return flattened token strings instead of the dict tree.
+    normalize (bool): If True, normalize queries before building the tree.
+    executor (Optional[Executor]): An existing executor to submit work to instead of
+        creating a process pool.
+
+    Returns:
+    Iterator[BatchResult]: One result per query.
+
+    Raises:
+    ValueError: If chunk_size is not positive.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be positive")
+    workers = max_workers or os.cpu_count() or 1
+    if executor is not None:
+        yield from _run(executor, 2 * workers, queries, chunk_size, ordered, flat, normalize)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from _run(pool, 2 * workers, queries, chunk_size, ordered, flat, normalize)
+
+
+def _run(executor: Executor, max_in_flight: int, queries: Iterable[str], chunk_size: int, ordered: bool,
+         flat: bool, normalize: bool) -> Iterator[BatchResult]:
+    items = enumerate(queries)
+    pending = deque()
+
+    def submit() -> bool:
+        chunk = list(islice(items, chunk_size))
+        if chunk:
+            pending.append(executor.submit(parse_chunk, chunk, flat, normalize))
+        return bool(chunk)
+
+    exhausted = False
+    while True:
+        while not exhausted and len(pending) < max_in_flight:
+            exhausted = not submit()
+        if not pending:
+            return
+        if ordered:
+            yield from pending.popleft().result()
+            continue
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            pending.remove(future)
+            yield from future.result()
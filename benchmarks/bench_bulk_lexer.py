@@ -0,0 +1,44 @@
+"""
+Compare lexing a corpus query by query with sqlparse against one bulk pass.
+
+Usage: python benchmarks/bench_bulk_lexer.py [queries]
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from sqlparse import lexer
+from bench_fingerprint import make_queries
+from bulk_lexer import BulkLexer
+from generators import cte_chain, wide_select
+
+
+def timed(label, queries, func):
+    chars = sum(len(query) for query in queries)
+    start = time.perf_counter()
+    tokens = func(queries)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40}{elapsed:>8.3f} s{tokens / elapsed:>14,.0f} tokens/s{chars / elapsed / 1e6:>8.2f} MB/s")
+
+
+def per_query(queries):
+    return sum(len(list(lexer.tokenize(query))) for query in queries)
+
+
+def main(count: int = 20000):
+    bulk = BulkLexer()
+    corpora = [
+        (f"{count} logged queries", list(make_queries(count))),
+        (f"{count // 100} wide selects", [wide_select(200)] * (count // 100)),
+        (f"{count // 100} CTE chains", [cte_chain(20)] * (count // 100)),
+        (f"{count} queries with comments", [f"/* app:{n} */ SELECT {n} FROM t" for n in range(count)]),
+    ]
+    for name, queries in corpora:
+        timed(f"{name}, sqlparse per query", queries, per_query)
+        timed(f"{name}, bulk", queries, lambda queries: len(bulk.lex(queries)))
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,66 @@
+"""
+Measure the per-query cost of fingerprinting.
+
+Usage: python benchmarks/bench_fingerprint.py [queries]
+"""
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import sqlparse
+from fingerprint import fingerprint_query, fingerprint_tokens
+from parse_cache import parse_cache
+from sql_query import SqlQuery
+
+
+TEMPLATES = [
+    "SELECT id, name FROM users WHERE id = {n} AND status = 'active'",
+    "SELECT * FROM orders WHERE user_id IN ({ids}) ORDER BY created_at DESC LIMIT {n}",
+    "UPDATE accounts SET balance = balance - {n} WHERE id = {m}",
+    "INSERT INTO events (kind, payload) VALUES ('click', '{{\"x\": {n}}}')",
+]
+
+
+def make_queries(count: int):
+    rng = random.Random(0)
+    for _ in range(count):
+        template = rng.choice(TEMPLATES)
+        ids = ", ".join(str(rng.randint(1, 10 ** 6)) for _ in range(rng.randint(1, 20)))
+        yield template.format(n=rng.randint(1, 10 ** 6), m=rng.randint(1, 10 ** 6), ids=ids)
+
+
+def timed(label, queries, func):
+    start = time.perf_counter()
+    for query in queries:
+        func(query)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32}{elapsed / len(queries) * 1e6:>10.1f} us/query")
+
+
+def main(count: int = 2000):
+    queries = list(make_queries(count))
+    trees = {query: sqlparse.parse(query)[0].tokens for query in queries}
+
+    sql_queries = {}
+    for query in queries:
+        sql_queries[query] = SqlQuery()
+        sql_queries[query].set_query(query)
+
+    timed("fingerprint_query (lexer only)", queries, fingerprint_query)
+    timed("fingerprint_tokens (parsed tree)", queries, lambda query: fingerprint_tokens(trees[query]))
+    timed("sqlparse.parse alone", queries, sqlparse.parse)
+    parse_cache.clear()
+    # SqlQuery.fingerprint caches by the raw query: the first pass fills the
+    # cache, the second is answered from it.
+    for label in ("SqlQuery.fingerprint (cold)", "SqlQuery.fingerprint (warm)"):
+        before = parse_cache.stats()
+        timed(label, queries, lambda query: sql_queries[query].fingerprint())
+        after = parse_cache.stats()
+        print(f"{'':<4}cache: {after.hits - before.hits} hits, {after.misses - before.misses} misses")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,58 @@
+"""
+Compare incremental re-parsing after a small edit with parsing the whole document again.
+
+Usage: python benchmarks/bench_incremental.py [edits]
+"""
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import sqlparse
+from incremental import IncrementalParser
+
+
+STATEMENT = "SELECT a, b + (c * {n}) AS x FROM t{n} WHERE y IN (1, 2, 3) AND z = 'v{n}';\n"
+
+
+def make_script(statements: int) -> str:
+    return "".join(STATEMENT.format(n=n) for n in range(statements))
+
+
+def make_wide_query(columns: int) -> str:
+    terms = ", ".join(f"f(col{n} + (col{n} * {n}))" for n in range(columns))
+    return f"SELECT {terms} FROM t"
+
+
+def run(label: str, text: str, anchor: str, edits: int):
+    rng = random.Random(0)
+    offsets = [pos for pos in range(len(text)) if text.startswith(anchor, pos)]
+    parser = IncrementalParser(text)
+    start = time.perf_counter()
+    reparsed = 0
+    for _ in range(edits):
+        # Replace one digit inside a parenthesis with another.
+        offset = rng.choice(offsets) + len(anchor)
+        parser.apply_edit(offset, 1, str(rng.randint(0, 9)))
+        reparsed += parser.last_reparsed_chars
+    incremental = (time.perf_counter() - start) / edits
+
+    start = time.perf_counter()
+    repeats = max(1, edits // 20)
+    for _ in range(repeats):
+        sqlparse.parse(parser.text)
+    full = (time.perf_counter() - start) / repeats
+    print(f"{label:<28}{len(text):>9} chars{incremental * 1e3:>10.3f} ms/edit{full * 1e3:>12.3f} ms/full parse"
+          f"{reparsed // edits:>8} chars re-parsed")
+
+
+def main(edits: int = 200):
+    for statements in (10, 100, 1000):
+        run(f"script, {statements} statements", make_script(statements), "(c * ", edits)
+    run("one statement, 400 columns", make_wide_query(400), "* ", edits)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,51 @@
+"""
+Measure the overhead of instrumentation when it is off and when a collector is attached.
+
+Usage: python benchmarks/bench_instrumentation.py [repeat]
+"""
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from instrumentation import MetricsCollector, add_hook, remove_hook, stage
+from parse_cache import configure_cache, parse_cache
+from sql_query import SqlQuery
+
+
+QUERY = "SELECT a, b FROM t WHERE c IN (1, 2, 3) AND d = (SELECT max(e) FROM u)"
+
+
+def pipeline():
+    sql_query = SqlQuery()
+    sql_query.set_query(QUERY)
+    sql_query.create_tree()
+    sql_query.tree_to_dict()
+
+
+def empty_stage():
+    with stage("noop"):
+        pass
+
+
+def report(label, func, number):
+    elapsed = min(timeit.repeat(func, number=number, repeat=5))
+    print(f"{label:<36}{elapsed / number * 1e6:>10.2f} us")
+
+
+def main(repeat: int = 200):
+    report("stage() block, disabled", empty_stage, repeat * 100)
+    for cached in (False, True):
+        configure_cache(max_entries=4096 if cached else 0)
+        parse_cache.clear()
+        label = "cached" if cached else "uncached"
+        report(f"pipeline, {label}, disabled", pipeline, repeat)
+        collector = MetricsCollector()
+        add_hook(collector)
+        report(f"pipeline, {label}, collector", pipeline, repeat)
+        remove_hook(collector)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
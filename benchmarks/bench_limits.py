@@ -0,0 +1,50 @@
+"""
+Compare time and peak memory of parsing pathological queries with and without degraded mode.
+
+Usage: python benchmarks/bench_limits.py [size]
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from generators import huge_in_list
+from limits import LimitExceededError, ParseLimits
+from parse_cache import configure_cache
+from sql_query import SqlQuery
+
+
+def run(name, query, limits):
+    sql_query = SqlQuery()
+    start = time.perf_counter()
+    try:
+        sql_query.set_query(query, limits=limits)
+        sql_query.tree_to_dict(spans=True)
+    except LimitExceededError as e:
+        print(f"{name:<34}rejected: {e}")
+        return
+    except ValueError as e:
+        print(f"{name:<34}failed: {e}")
+        return
+    elapsed = time.perf_counter() - start
+    peak = sql_query.peak_memory or 0
+    print(f"{name:<34}{elapsed * 1e3:>10.1f} ms{peak / 1024:>12.0f} KiB peak"
+          f"{sql_query.count_nodes():>10} nodes")
+
+
+def main(size: int = 2000):
+    configure_cache(max_entries=0)
+    in_list = huge_in_list(size)
+    literal = "SELECT * FROM blobs WHERE body = '" + "x" * (size * 500) + "'"
+    tracked = ParseLimits(track_memory=True)
+    degraded = ParseLimits(max_tokens=5000, max_literal_length=4096, degrade=True, track_memory=True)
+    run(f"in-list ({size})", in_list, tracked)
+    run(f"in-list ({size}), degraded", in_list, degraded)
+    run(f"in-list ({size}), strict", in_list, degraded._replace(degrade=False))
+    run(f"literal ({size * 500} chars)", literal, tracked)
+    run(f"literal ({size * 500} chars), degraded", literal, degraded)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
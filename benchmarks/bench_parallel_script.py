@@ -0,0 +1,62 @@
+"""
+Measure how parsing one large script scales with the number of worker processes.
+
+Reports the wall time, speedup and scaling efficiency (speedup divided by the
+number of workers) for 1 to N workers, the time spent splitting and
+stitching in the parent process, and the time of a single sqlparse.parse
+of the whole script for reference.
+
+Usage: python benchmarks/bench_parallel_script.py [statements] [max_workers] [chunk_kib]
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import sqlparse
+from generators import cte_chain, multi_statement_script
+from parallel_script import parse_script, split_script
+from query_tree import QueryTree
+
+
+def etl_script(statements: int) -> str:
+    # Mostly short DML statements, with a long WITH chain every hundred statements.
+    parts = []
+    for block in range(0, statements, 100):
+        parts.append(multi_statement_script(min(100, statements - block)))
+        parts.append(cte_chain(40) + ";")
+    return "\n".join(parts)
+
+
+def main(statements: int = 3000, max_workers: int = 0, chunk_kib: int = 64):
+    max_workers = max_workers or os.cpu_count() or 1
+    script = etl_script(statements)
+    chunk_size = chunk_kib * 1024
+    print(f"script: {len(script) / 1e6:.1f} MB, {statements} statements, cpu_count={os.cpu_count()}")
+
+    started = time.perf_counter()
+    QueryTree(list(sqlparse.parse(script)), script)
+    print(f"{'sqlparse.parse, one process':<32}{time.perf_counter() - started:>9.2f} s")
+
+    started = time.perf_counter()
+    pieces = split_script(script, chunk_size, split_ctes=True)
+    print(f"{'split_script (serial)':<32}{time.perf_counter() - started:>9.2f} s  {len(pieces)} pieces")
+
+    for split_ctes in (False, True):
+        baseline = None
+        workers = 1
+        while workers <= max_workers:
+            started = time.perf_counter()
+            parse_script(script, max_workers=workers, chunk_size=chunk_size, split_ctes=split_ctes)
+            elapsed = time.perf_counter() - started
+            baseline = baseline or elapsed
+            speedup = baseline / elapsed
+            label = f"parse_script{' +ctes' if split_ctes else ''}, {workers} workers"
+            print(f"{label:<32}{elapsed:>9.2f} s  speedup {speedup:4.2f}  efficiency {speedup / workers:4.0%}")
+            workers *= 2
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,48 @@
+"""
+Compare parsing from scratch with loading trees from the persistent cache.
+
+Usage: python benchmarks/bench_persistent_cache.py [queries]
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from generators import cte_chain, huge_in_list, wide_select
+from parse_cache import parse_cache
+from persistent_cache import configure_disk_cache
+from sql_query import SqlQuery
+
+
+def make_queries(count: int):
+    for i in range(count):
+        generator = (wide_select, huge_in_list, cte_chain)[i % 3]
+        yield generator(10 + i % 40) + f" -- report {i}"
+
+
+def parse_all(queries) -> float:
+    parse_cache.clear()
+    start = time.perf_counter()
+    for query in queries:
+        sql_query = SqlQuery()
+        sql_query.set_query(query)
+        sql_query.create_tree()
+    return time.perf_counter() - start
+
+
+def main(count: int = 300):
+    queries = list(make_queries(count))
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'no persistent cache':<28}{parse_all(queries):>10.3f} s")
+        cache = configure_disk_cache(str(Path(directory) / "cache.sqlite"))
+        print(f"{'cold (parse and store)':<28}{parse_all(queries):>10.3f} s")
+        print(f"{'warm (load from disk)':<28}{parse_all(queries):>10.3f} s")
+        stats = cache.stats()
+        print(f"{stats.entries} entries, {stats.size_bytes / 1024:.0f} KiB on disk")
+        configure_disk_cache(None)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,38 @@
+"""
+Compare the single-pass normalize+parse pipeline against the two-pass path.
+
+Usage: python benchmarks/bench_pipeline.py [repeat]
+"""
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+sys.path.append(str(Path(__file__).resolve().parent.parent / "test"))
+
+from parse_cache import configure_cache
+from query_processor import QueryProcessor
+from test_cases.test_case import load_test_cases
+
+
+def two_pass(query: str):
+    normalized = QueryProcessor(query).normalize_query()
+    return normalized, QueryProcessor(normalized).parse_query()
+
+
+def single_pass(query: str):
+    return QueryProcessor(query).process_query()
+
+
+def main(repeat: int = 200):
+    configure_cache(max_entries=0)
+    directory = Path(__file__).resolve().parent.parent / "test" / "test_cases"
+    queries = [case.query for case in load_test_cases(directory)]
+    print(f"{'pipeline':<12}{'total (s)':>12}{'per query (us)':>16}")
+    for name, func in (("two-pass", two_pass), ("single-pass", single_pass)):
+        elapsed = min(timeit.repeat(lambda: [func(q) for q in queries], number=repeat, repeat=3))
+        print(f"{name:<12}{elapsed:>12.3f}{elapsed / (repeat * len(queries)) * 1e6:>16.1f}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
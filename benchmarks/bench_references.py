@@ -0,0 +1,58 @@
+"""
+Compare answering lineage questions by walking tree_to_dict output with one reference index.
+
+Usage: python benchmarks/bench_references.py [repeat]
+"""
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from generators import cte_chain, deep_subqueries
+from references import READ, build_index
+from sql_query import SqlQuery
+
+
+def walk_tables(tree) -> list:
+    # What a caller of tree_to_dict does today: one full walk per question.
+    tables = []
+    stack = list(tree["children"])
+    after_from = False
+    while stack:
+        node = stack.pop()
+        if node["is_group"]:
+            if after_from and node["type"] == "Identifier":
+                tables.append(node["value"])
+                after_from = False
+            stack.extend(reversed(node["children"]))
+        elif str(node["type"]).startswith("Token.Keyword"):
+            after_from = node["value"] == "FROM"
+    return tables
+
+
+def run(name, query, repeat, questions=20):
+    sql_query = SqlQuery()
+    sql_query.set_query(query)
+    tokens = sql_query.create_tree()
+    tree = sql_query.query_tree()
+    view = sql_query.tree_to_dict().to_dict()
+    index = build_index(tokens, tree)
+
+    cases = [
+        ("walk dict per question", lambda: [walk_tables(view) for _ in range(questions)]),
+        ("build index", lambda: build_index(tokens, tree)),
+        ("index lookups", lambda: [index.tables_with_role(READ) for _ in range(questions)]),
+    ]
+    for label, func in cases:
+        elapsed = min(timeit.repeat(func, number=repeat, repeat=3))
+        print(f"{name:<26}{label:<26}{elapsed / repeat * 1e3:>10.3f} ms")
+
+
+def main(repeat: int = 20):
+    run("cte chain (50)", cte_chain(50), repeat)
+    run("deep subqueries (40)", deep_subqueries(40), repeat)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
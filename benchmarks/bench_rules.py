@@ -0,0 +1,76 @@
+"""
+Compare one dict walk per rule with checking all rules in a single traversal.
+
+Usage: python benchmarks/bench_rules.py [repeat]
+"""
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from sqlparse import tokens as T
+from generators import cte_chain, wide_select
+from rules import Rule, RuleSet, blocked_tables, no_cross_join, no_select_star, require_where
+from sql_query import SqlQuery
+
+
+def walk(tree, visit) -> bool:
+    # What each hand-written check does today: its own walk over tree_to_dict output.
+    stack = list(tree["children"])
+    while stack:
+        node = stack.pop()
+        if visit(node):
+            return True
+        if node.get("is_group"):
+            stack.extend(node["children"])
+    return False
+
+
+# Statements a gateway typically refuses outright; most queries contain none of them.
+_REFUSED = [(T.Keyword.DDL, value) for value in ("DROP", "TRUNCATE", "ALTER", "CREATE", "RENAME")] + \
+    [(T.Keyword, value) for value in ("GRANT", "REVOKE", "LOCK", "VACUUM", "COPY", "EXECUTE", "CALL")]
+
+
+def dict_checks(count: int):
+    checks = [
+        lambda node: node["type"] is T.Wildcard,
+        lambda node: node["type"] is T.Keyword.DML and node["value"] in ("UPDATE", "DELETE"),
+        lambda node: node["type"] is T.Keyword and node["value"] == "CROSS JOIN",
+        lambda node: node["type"] == "Identifier" and node["value"].lower() == "secrets",
+    ]
+    checks.extend((lambda node, ttype=ttype, value=value: node["type"] is ttype and node["value"] == value)
+                  for ttype, value in _REFUSED[:count])
+    return checks
+
+
+def rule_set(count: int) -> RuleSet:
+    rules = [no_select_star(), require_where(), no_cross_join(), blocked_tables(["secrets"])]
+    rules.extend(Rule(f"no_{value.lower()}", [ttype], values=[value]) for ttype, value in _REFUSED[:count])
+    return RuleSet(rules)
+
+
+def run(name, query, repeat):
+    sql_query = SqlQuery()
+    sql_query.set_query(query)
+    tree = sql_query.query_tree()
+    view = sql_query.tree_to_dict().to_dict()
+    for count in (0, len(_REFUSED)):
+        checks, rules = dict_checks(count), rule_set(count)
+        cases = [
+            (f"{len(checks)} dict walks", lambda: [walk(view, check) for check in checks]),
+            (f"{len(checks)} rules, one pass", lambda: rules.check(tree)),
+            ("  with timings", lambda: rules.check(tree, timings=True)),
+        ]
+        for label, func in cases:
+            elapsed = min(timeit.repeat(func, number=repeat, repeat=3))
+            print(f"{name:<22}{label:<24}{elapsed / repeat * 1e3:>10.3f} ms")
+
+
+def main(repeat: int = 10):
+    run("wide select (400)", wide_select(400), repeat)
+    run("cte chain (50)", cte_chain(50), repeat)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,53 @@
+"""
+Compare extracting one clause with SqlQuery.select against converting the whole tree.
+
+The tree is parsed once per query beforehand, so the timings cover only the
+conversion: TokenProcessor.process over every token, QueryTree.to_dict, and
+select with and without first-match.
+
+Usage: python benchmarks/bench_select.py [repeat]
+"""
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from generators import cte_chain, huge_in_list, wide_select
+from sql_query import SqlQuery
+from token_processor import TokenProcessor
+
+
+def cases():
+    return {
+        "wide_select(800), WHERE": (wide_select(800) + " WHERE col0 = 1 AND col1 > 2", "Where"),
+        "huge_in_list(3000), WHERE": (huge_in_list(3000), "Where"),
+        "cte_chain(50), function args": (cte_chain(50).replace("amount * ", "abs(amount) * "),
+                                         ("Identifier", "Function")),
+    }
+
+
+def main(repeat: int = 20):
+    print(f"{'case':<34}{'process':>10}{'to_dict':>10}{'select':>10}{'first':>10}  (ms)")
+    for name, (query, selector) in cases().items():
+        selector, within = selector if isinstance(selector, tuple) else (selector, None)
+        sql_query = SqlQuery()
+        sql_query.set_query(query)
+        tokens = sql_query.create_tree()
+
+        def full_tree():
+            # A fresh compact tree each time, as for a new query.
+            sql_query._query_tree = None
+            return sql_query.query_tree().to_dict()
+
+        timings = [
+            timeit.timeit(lambda: TokenProcessor().process(tokens), number=repeat),
+            timeit.timeit(full_tree, number=repeat),
+            timeit.timeit(lambda: sql_query.select(selector, within=within), number=repeat),
+            timeit.timeit(lambda: sql_query.select(selector, within=within, first=True), number=repeat),
+        ]
+        print(f"{name:<34}" + "".join(f"{1e3 * timing / repeat:>10.2f}" for timing in timings))
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,49 @@
+"""
+Compare the binary and streaming JSON tree formats with pickle and json.
+
+Usage: python benchmarks/bench_serialization.py [repeat]
+"""
+import json
+import pickle
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from generators import huge_in_list, wide_select
+from serialization import dump_dict, dump_tree, dumps_json, load_dict, load_tree
+from sql_query import SqlQuery
+
+
+def report(name, label, dump, load, repeat):
+    data = dump()
+    dump_time = min(timeit.repeat(dump, number=repeat, repeat=3)) / repeat
+    load_time = min(timeit.repeat(lambda: load(data), number=repeat, repeat=3)) / repeat
+    print(f"{name:<18}{label:<26}{len(data) / 1024:>10.1f} KiB{dump_time * 1e3:>10.2f} ms dump"
+          f"{load_time * 1e3:>10.2f} ms load")
+
+
+def run(name, query, repeat):
+    sql_query = SqlQuery()
+    sql_query.set_query(query)
+    tokens = sql_query.create_tree()
+    tree = sql_query.query_tree()
+    plain = tree.to_dict(type_names=True)
+    typed = tree.to_dict()
+
+    report(name, "pickle (sqlparse tokens)", lambda: pickle.dumps(tokens), pickle.loads, repeat)
+    report(name, "pickle (dict)", lambda: pickle.dumps(typed), pickle.loads, repeat)
+    report(name, "json.dumps (dict)", lambda: json.dumps(plain), json.loads, repeat)
+    report(name, "dumps_json (streaming)", lambda: dumps_json(tree), json.loads, repeat)
+    report(name, "dump_dict (binary)", lambda: dump_dict(typed), load_dict, repeat)
+    report(name, "dump_tree (binary)", lambda: dump_tree(tree), load_tree, repeat)
+
+
+def main(repeat: int = 20):
+    run("wide (400 columns)", wide_select(400), repeat)
+    run("IN-list (2000)", huge_in_list(2000), repeat)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,93 @@
+"""
+Compare per-fingerprint statistics from a tree_to_dict walk per query with ShapeStats.
+
+The baseline is what log analysis does today: create_tree, then a Python walk
+of tree_to_dict for each line, with exact per-fingerprint dictionaries. The
+log follows a Zipf distribution over a few hundred shapes with random literals.
+
+Usage: python benchmarks/bench_shape_stats.py [queries] [shapes] [max_workers]
+"""
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from generators import cte_chain, wide_select
+from parse_cache import configure_cache
+from shape_stats import ShapeStats, collect_shape_stats
+from sql_query import SqlQuery
+
+
+def query_log(queries: int, shapes: int, seed: int = 7) -> list:
+    templates = [
+        "SELECT id, name FROM app.users{n} WHERE id = {v}",
+        "UPDATE accounts{n} SET balance = balance - {v} WHERE id = {v}",
+        "SELECT u.id, COUNT(*) FROM users{n} u JOIN orders o ON o.user_id = u.id WHERE o.total > {v} GROUP BY u.id",
+        wide_select(15).replace(" FROM t", " FROM wide{n}") + " WHERE col0 = {v}",
+        cte_chain(3).replace("orders", "orders{n}") + " WHERE id IN ({v}, {v}, {v})",
+    ]
+    generator = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(shapes)]
+    picks = generator.choices(range(shapes), weights=weights, k=queries)
+    return [templates[shape % len(templates)].format(n=shape, v=generator.randrange(10 ** 6))
+            for shape in picks]
+
+
+def dict_walk(log: list) -> dict:
+    stats = {}
+    sql_query = SqlQuery()
+    for query in log:
+        sql_query.set_query(query, normalize=False)
+        sql_query.create_tree()
+        tree = sql_query.tree_to_dict()
+        tokens = 0
+        depth = 0
+        tables = set()
+        stack = [(child, 1) for child in tree["children"]]
+        while stack:
+            node, level = stack.pop()
+            depth = max(depth, level)
+            if node.get("is_group"):
+                if node["type"] == "Identifier" and level <= 3:
+                    tables.add(node["value"].lower())
+                stack.extend((child, level + 1) for child in node["children"])
+            elif not str(node["type"]).startswith("Token.Text.Whitespace"):
+                tokens += 1
+        entry = stats.setdefault(sql_query.fingerprint().hash, {"count": 0, "tokens": [], "depth": 0, "tables": set()})
+        entry["count"] += 1
+        entry["tokens"].append(tokens)
+        entry["depth"] = max(entry["depth"], depth)
+        entry["tables"] |= tables
+    return stats
+
+
+def main(queries: int = 5000, shapes: int = 300, max_workers: int = 2):
+    # Every log line is distinct; keep the parse cache out of the comparison.
+    configure_cache(max_entries=0)
+    log = query_log(queries, shapes)
+
+    started = time.perf_counter()
+    exact = dict_walk(log)
+    walk_time = time.perf_counter() - started
+    print(f"{'create_tree + dict walk':<28}{walk_time:>8.2f} s  {len(exact)} shapes")
+
+    started = time.perf_counter()
+    stats = ShapeStats(max_shapes=100).update(log)
+    elapsed = time.perf_counter() - started
+    print(f"{'ShapeStats':<28}{elapsed:>8.2f} s  {walk_time / elapsed:.1f}x  "
+          f"~{stats.distinct_shapes()} shapes, {len(stats.to_dict()['shapes'])} tracked")
+
+    started = time.perf_counter()
+    merged = collect_shape_stats(log, chunk_size=1000, max_workers=max_workers, max_shapes=100)
+    print(f"{'collect_shape_stats':<28}{time.perf_counter() - started:>8.2f} s  {max_workers} workers")
+
+    errors = [abs(summary.count - exact[summary.hash]["count"]) / exact[summary.hash]["count"]
+              for summary in merged.top(20)]
+    print(f"top-20 count error: max {max(errors):.1%}; "
+          f"tokens p50/p99: {stats.token_counts.quantile(0.5):.0f}/{stats.token_counts.quantile(0.99):.0f}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
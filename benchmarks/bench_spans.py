@@ -0,0 +1,59 @@
+"""
+Compare dict output carrying token text with output carrying source spans.
+
+Usage: python benchmarks/bench_spans.py [repeat]
+"""
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import sqlparse
+from sqlparse.sql import Parenthesis, Token
+from query_tree import QueryTree
+from token_processor import TokenProcessor
+
+
+def wide_tokens(columns: int):
+    query = "SELECT " + ", ".join(f"col{i} + {i} AS alias{i}" for i in range(columns)) + " FROM t"
+    return sqlparse.parse(query)[0].tokens
+
+
+def deep_tokens(depth: int):
+    tree = Token(sqlparse.tokens.Name, "x" * 20)
+    for _ in range(depth):
+        tree = Parenthesis([Token(sqlparse.tokens.Punctuation, "("), tree, Token(sqlparse.tokens.Punctuation, ")")])
+    return [tree]
+
+
+def peak_kib(func) -> float:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def run(name, tokens, repeat):
+    processor = TokenProcessor()
+    cases = [
+        ("process, values", lambda: processor.process(tokens)),
+        ("process, spans", lambda: processor.process(tokens, spans=True)),
+        ("QueryTree.to_dict, values", lambda: QueryTree(tokens).to_dict()),
+        ("QueryTree.to_dict, spans", lambda: QueryTree(tokens).to_dict(spans=True)),
+    ]
+    for label, func in cases:
+        elapsed = min(timeit.repeat(func, number=repeat, repeat=3))
+        print(f"{name:<20}{label:<28}{elapsed / repeat * 1e3:>10.2f} ms{peak_kib(func):>12.0f} KiB peak")
+
+
+def main(repeat: int = 10):
+    run("wide (800 columns)", wide_tokens(800), repeat)
+    run("deep (2000 levels)", deep_tokens(2000), repeat)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
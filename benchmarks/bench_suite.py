@@ -0,0 +1,280 @@
+"""
+Time each stage of the parse pipeline over the test_cases corpus and synthetic queries.
+
+Every stage is timed separately on every case and reported as throughput,
+p50/p99 latency and peak traced memory. Results can be written to JSON and
+compared with a previous run to spot regressions between commits.
+
+The "startup" case times a cold import of sql_query and the first parse
+after it, each in a fresh interpreter.
+
+Usage: python benchmarks/bench_suite.py [--output results.json] [--compare baseline.json]
+                                        [--min-time 0.2] [--only wide_select,corpus,startup] [--quick]
+                                        [--startup-runs 10]
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+sys.path.append(str(ROOT / "test"))
+
+import sqlparse
+from generators import DEFAULT_SIZES, GENERATORS
+from parse_cache import configure_cache
+from query_processor import QueryProcessor
+from sql_query import SqlQuery
+from test_cases.test_case import load_test_cases
+
+
+STAGES = ("normalize_query", "parse_query", "create_tree", "flatten_tree", "tree_to_dict")
+STARTUP_QUERY = "SELECT a, b FROM t WHERE c = 1"
+
+# Run in a fresh interpreter; prints the import and first-parse times and the traced peak.
+_STARTUP_SCRIPT = """
+import sys, time, tracemalloc
+trace = sys.argv[1] == "trace"
+if trace:
+    tracemalloc.start()
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+from sql_query import SqlQuery
+imported = time.perf_counter()
+sql_query = SqlQuery()
+sql_query.set_query({query!r})
+sql_query.create_tree()
+parsed = time.perf_counter()
+print(imported - start, parsed - imported, tracemalloc.get_traced_memory()[1] if trace else 0)
+"""
+
+
+def load_cases(only: Optional[List[str]] = None, quick: bool = False) -> List[Tuple[str, str]]:
+    """
+    Collect the (name, query) pairs to benchmark.
+
+    Parameters:
+    only (Optional[List[str]]): Case groups to keep: "corpus" or generator names.
+    quick (bool): If True, use only the smallest size of each generator.
+
+    Returns:
+    List[Tuple[str, str]]: Case names and their SQL text.
+    """
+    cases = []
+    if not only or "corpus" in only:
+        for case in sorted(load_test_cases(ROOT / "test" / "test_cases"), key=lambda case: case.name):
+            cases.append((f"corpus/{case.name}", case.query))
+    for name, generator in GENERATORS.items():
+        if only and name not in only:
+            continue
+        sizes = DEFAULT_SIZES[name][:1] if quick else DEFAULT_SIZES[name]
+        cases.extend((f"{name}/{size}", generator(size)) for size in sizes)
+    return cases
+
+
+def stage_functions(query: str) -> Dict[str, Callable[[], object]]:
+    """
+    Build a zero-argument callable per stage, with its inputs prepared up front.
+
+    Parameters:
+    query (str): The SQL query.
+
+    Returns:
+    Dict[str, Callable[[], object]]: The stage callables, keyed by stage name.
+    """
+    normalized = QueryProcessor(query).normalize_query()
+    tree = QueryProcessor(normalized).parse_query()
+    prepared = SqlQuery()
+    prepared.set_query(query)
+    prepared.create_tree()
+
+    def create_tree():
+        sql_query = SqlQuery()
+        sql_query.set_query(query)
+        return sql_query.create_tree()
+
+    def tree_to_dict():
+        # A fresh holder, so the compact tree is rebuilt on every run.
+        sql_query = SqlQuery()
+        sql_query.raw_query, sql_query.normalized_query, sql_query.tree = query, normalized, tree
+        return sql_query.tree_to_dict().to_dict()
+
+    return {
+        "normalize_query": lambda: QueryProcessor(query).normalize_query(),
+        "parse_query": lambda: QueryProcessor(normalized).parse_query(),
+        "create_tree": create_tree,
+        "flatten_tree": prepared.flatten_tree,
+        "tree_to_dict": tree_to_dict,
+    }
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def measure(func: Callable[[], object], min_time: float, min_runs: int = 5, max_runs: int = 1000) -> Dict:
+    """
+    Time a callable repeatedly and trace its peak memory on a separate run.
+
+    Parameters:
+    func (Callable[[], object]): The stage to time.
+    min_time (float): Keep running until this many seconds have been spent.
+    min_runs (int): Minimum number of timed runs.
+    max_runs (int): Maximum number of timed runs.
+
+    Returns:
+    Dict: Run count, mean/p50/p99 latency in microseconds, throughput and peak bytes.
+    """
+    func()
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < min_runs or (time.perf_counter() - started < min_time and len(samples) < max_runs):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    mean = sum(samples) / len(samples)
+    return {
+        "runs": len(samples),
+        "mean_us": mean * 1e6,
+        "p50_us": percentile(samples, 0.50) * 1e6,
+        "p99_us": percentile(samples, 0.99) * 1e6,
+        "per_second": 1 / mean if mean else float("inf"),
+        "peak_bytes": peak,
+    }
+
+
+def run_suite(cases: List[Tuple[str, str]], min_time: float = 0.2) -> Dict:
+    """
+    Benchmark every stage on every case, with the parse cache disabled.
+
+    Parameters:
+    cases (List[Tuple[str, str]]): Case names and their SQL text.
+    min_time (float): Minimum time spent timing each stage of each case.
+
+    Returns:
+    Dict: Environment metadata and one result record per case and stage.
+    """
+    configure_cache(max_entries=0)
+    results = []
+    for name, query in cases:
+        for stage, func in stage_functions(query).items():
+            record = {"case": name, "stage": stage, "chars": len(query)}
+            record.update(measure(func, min_time))
+            record["chars_per_second"] = record["per_second"] * len(query)
+            results.append(record)
+            print(f"{name:<32}{stage:<17}{record['p50_us']:>12.1f} us p50{record['p99_us']:>12.1f} us p99"
+                  f"{record['per_second']:>10.1f}/s{record['peak_bytes'] / 1024:>10.0f} KiB")
+    return {"metadata": metadata(), "results": results}
+
+
+def run_startup(runs: int = 10) -> List[Dict]:
+    """
+    Time the cold import of sql_query and the first parse, in fresh interpreters.
+
+    Peak memory is traced on one extra run, so tracing does not skew the timings.
+
+    Parameters:
+    runs (int): Number of timed interpreter launches.
+
+    Returns:
+    List[Dict]: One result record for the "import" stage and one for "first_parse".
+    """
+    script = _STARTUP_SCRIPT.format(root=str(ROOT), query=STARTUP_QUERY)
+
+    def launch(mode: str) -> List[float]:
+        output = subprocess.run([sys.executable, "-c", script, mode], capture_output=True,
+                                text=True, check=True).stdout
+        return [float(value) for value in output.split()]
+
+    samples = [launch("time") for _ in range(runs)]
+    peak = launch("trace")[2]
+    results = []
+    for index, stage in enumerate(("import", "first_parse")):
+        times = [sample[index] for sample in samples]
+        mean = sum(times) / len(times)
+        record = {"case": "startup", "stage": stage, "chars": len(STARTUP_QUERY), "runs": len(times),
+                  "mean_us": mean * 1e6, "p50_us": percentile(times, 0.50) * 1e6,
+                  "p99_us": percentile(times, 0.99) * 1e6, "per_second": 1 / mean if mean else float("inf"),
+                  # Traced from interpreter start, so both stages share the peak.
+                  "peak_bytes": peak}
+        record["chars_per_second"] = record["per_second"] * len(STARTUP_QUERY)
+        results.append(record)
+        print(f"{'startup':<32}{stage:<17}{record['p50_us']:>12.1f} us p50{record['p99_us']:>12.1f} us p99"
+              f"{record['per_second']:>10.1f}/s{record['peak_bytes'] / 1024:>10.0f} KiB")
+    return results
+
+
+def metadata() -> Dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "sqlparse": sqlparse.__version__,
+        "platform": platform.platform(),
+    }
+
+
+def compare(current: Dict, baseline: Dict, threshold: float = 0.10):
+    """
+    Print the p50 change of every case and stage present in both runs.
+
+    Parameters:
+    current (Dict): Results of this run.
+    baseline (Dict): Results loaded from a previous run.
+    threshold (float): Relative change above which a row is flagged.
+    """
+    previous = {(record["case"], record["stage"]): record for record in baseline["results"]}
+    print(f"\ncompared with {baseline['metadata'].get('commit') or 'baseline'}")
+    for record in current["results"]:
+        old = previous.get((record["case"], record["stage"]))
+        if old is None:
+            continue
+        change = record["p50_us"] / old["p50_us"] - 1 if old["p50_us"] else 0.0
+        flag = "  slower" if change > threshold else "  faster" if change < -threshold else ""
+        print(f"{record['case']:<32}{record['stage']:<17}{old['p50_us']:>12.1f} ->{record['p50_us']:>12.1f} us"
+              f"{change:>+9.1%}{flag}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the parse pipeline stage by stage.")
+    parser.add_argument("--output", type=Path, help="write results to this JSON file")
+    parser.add_argument("--compare", type=Path, help="compare with results from a previous run")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds spent per case and stage")
+    parser.add_argument("--only", help="comma-separated case groups: corpus or generator names")
+    parser.add_argument("--quick", action="store_true", help="use only the smallest generated sizes")
+    parser.add_argument("--startup-runs", type=int, default=10, help="interpreter launches for the startup case")
+    args = parser.parse_args(argv)
+
+    only = args.only.split(",") if args.only else None
+    cases = load_cases(only, quick=args.quick)
+    results = run_suite(cases, min_time=args.min_time)
+    if (not only or "startup" in only) and args.startup_runs > 0:
+        results["results"].extend(run_startup(args.startup_runs))
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+    if args.compare:
+        compare(results, json.loads(args.compare.read_text()))
+
+
+if __name__ == "__main__":
+    main()
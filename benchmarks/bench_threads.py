@@ -0,0 +1,89 @@
+"""
+Compare a new SqlQuery per request with one shared Parser across worker threads.
+
+Reports throughput and p99 latency per thread count, memory allocated per
+request, and how often threads contended for the pooled filter stacks.
+
+Usage: python benchmarks/bench_threads.py [requests] [max_threads]
+"""
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from generators import cte_chain, wide_select
+from parse_cache import configure_cache
+from query_processor import format_stacks
+from sql_parser import Parser
+from sql_query import SqlQuery
+
+
+def workload(requests: int) -> list:
+    # Distinct literals keep the parse cache from answering repeated requests.
+    shapes = [
+        "SELECT id, name FROM users WHERE id = {n}",
+        "UPDATE accounts SET balance = balance - {n} WHERE id = {n}",
+        "SELECT u.id, COUNT(*) FROM users u JOIN orders o ON o.user_id = u.id WHERE o.total > {n} GROUP BY u.id",
+        wide_select(20) + " WHERE col0 = {n}",
+        cte_chain(3) + " WHERE id = {n}",
+    ]
+    return [shapes[number % len(shapes)].replace("{n}", str(number)) for number in range(requests)]
+
+
+def per_request(query: str):
+    sql_query = SqlQuery()
+    sql_query.set_query(query)
+    sql_query.create_tree()
+    return sql_query.query_tree()
+
+
+def run(label, handle, queries, threads):
+    latencies = []
+
+    def timed(query):
+        start = time.perf_counter()
+        handle(query)
+        latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(timed, queries))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))]
+    print(f"{label:<24}{threads:>3} threads{len(queries) / elapsed:>10.0f} q/s{p99 * 1e3:>10.2f} ms p99")
+
+
+def allocated(handle, queries) -> float:
+    tracemalloc.start()
+    try:
+        for query in queries:
+            handle(query)
+        snapshot = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    # Blocks still alive at the end are the results kept by the parse cache, or garbage.
+    return sum(stat.size for stat in snapshot.statistics("filename")) / len(queries)
+
+
+def main(requests: int = 2000, max_threads: int = 8):
+    configure_cache(max_entries=0)
+    queries = workload(requests)
+    parser = Parser()
+    handlers = [("SqlQuery per request", per_request), ("shared Parser", parser.parse)]
+    threads = 1
+    while threads <= max_threads:
+        for label, handle in handlers:
+            format_stacks.clear()
+            run(label, handle, queries, threads)
+        print(f"{'':<24}pool: {format_stacks.stats()}")
+        threads *= 2
+    for label, handle in handlers:
+        print(f"{label:<24}{allocated(handle, queries[:200]) / 1024:>10.1f} KiB retained per request")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,79 @@
+"""
+Compare the iterative tree walks with the previous recursive implementations.
+
+Usage: python benchmarks/bench_traversal.py [repeat]
+"""
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import sqlparse
+from sqlparse.sql import Parenthesis, Token, TokenList
+from sql_query import SqlQuery
+from token_processor import TokenProcessor
+
+
+def recursive_process(tokens):
+    result = []
+    for token in tokens:
+        if isinstance(token, TokenList):
+            result.append({"type": type(token).__name__, "value": token.normalized,
+                           "is_group": True, "children": recursive_process(token.tokens)})
+        else:
+            result.append({"type": token.ttype, "value": token.normalized, "is_group": False})
+    return result
+
+
+def recursive_flatten(tokens):
+    flat_tokens = []
+    for token in tokens:
+        if isinstance(token, TokenList):
+            flat_tokens.extend(recursive_flatten(token.tokens))
+        else:
+            flat_tokens.append(token.normalized)
+    return flat_tokens
+
+
+def wide_query(columns: int) -> str:
+    return "SELECT " + ", ".join(f"col{i} + {i} AS alias{i}" for i in range(columns)) + " FROM t"
+
+
+def deep_query(depth: int) -> str:
+    return "SELECT " + "(" * depth + "1" + ")" * depth
+
+
+def synthetic_deep_tree(depth: int):
+    tree = Token(sqlparse.tokens.Name, "x")
+    for _ in range(depth):
+        tree = Parenthesis([tree])
+    return [tree]
+
+
+def run(name, tokens, repeat):
+    sql_query = SqlQuery()
+    processor = TokenProcessor()
+    cases = [
+        ("process (recursive)", lambda: recursive_process(tokens)),
+        ("process (iterative)", lambda: processor.process(tokens)),
+        ("flatten (recursive)", lambda: recursive_flatten(tokens)),
+        ("flatten (iterative)", lambda: sql_query.flatten_tree(tokens)),
+        ("iter_flat_tokens", lambda: sum(1 for _ in sql_query.iter_flat_tokens(tokens))),
+    ]
+    for label, func in cases:
+        try:
+            elapsed = min(timeit.repeat(func, number=repeat, repeat=3))
+            print(f"{name:<22}{label:<22}{elapsed / repeat * 1e6:>12.1f} us")
+        except RecursionError:
+            print(f"{name:<22}{label:<22}{'RecursionError':>15}")
+
+
+def main(repeat: int = 50):
+    run("wide (800 columns)", sqlparse.parse(wide_query(800))[0].tokens, repeat)
+    run("deep (90 levels)", sqlparse.parse(deep_query(90))[0].tokens, repeat)
+    run("synthetic (5000)", synthetic_deep_tree(5000), repeat)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
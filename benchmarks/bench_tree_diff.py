@@ -0,0 +1,58 @@
+"""
+Compare diffing two large, mostly-unchanged queries by subtree hashes with comparing their dict trees.
+
+Usage: python benchmarks/bench_tree_diff.py [size] [repeat]
+"""
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from generators import cte_chain, wide_select
+from sql_query import SqlQuery
+from tree_diff import _hash_cache, diff_trees
+
+
+def dict_changes(old, new, path=()) -> list:
+    # Walk both dict trees in lockstep, the way callers compare tree_to_dict output today.
+    if old["type"] != new["type"] or old.get("is_group") != new.get("is_group"):
+        return [path]
+    if "children" not in old:
+        return [] if old["value"] == new["value"] else [path]
+    changes = []
+    for index, (left, right) in enumerate(zip(old["children"], new["children"])):
+        changes.extend(dict_changes(left, right, path + (index,)))
+    if len(old["children"]) != len(new["children"]):
+        changes.append(path)
+    return changes
+
+
+def run(name, old_query, new_query, repeat):
+    old, new = SqlQuery(), SqlQuery()
+    old.set_query(old_query)
+    new.set_query(new_query)
+    old_tree, new_tree = old.query_tree(), new.query_tree()
+    old_dict, new_dict = old.tree_to_dict().to_dict(), new.tree_to_dict().to_dict()
+    changes = diff_trees(old_tree, new_tree)
+
+    cases = [
+        ("dict walk", lambda: dict_changes(old_dict, new_dict)),
+        ("hash + diff", lambda: (_hash_cache.clear(), diff_trees(old_tree, new_tree))),
+        ("diff (hashes cached)", lambda: diff_trees(old_tree, new_tree)),
+    ]
+    print(f"{name}: {len(old_tree)} nodes, {len(changes)} change(s)")
+    for label, func in cases:
+        elapsed = min(timeit.repeat(func, number=repeat, repeat=3))
+        print(f"  {label:<20}{elapsed / repeat * 1e3:>10.3f} ms")
+
+
+def main(size: int = 800, repeat: int = 10):
+    query = wide_select(size)
+    run(f"wide select ({size})", query, query.replace(f"+ {size // 2} ", f"+ {size // 2 + 1} ", 1), repeat)
+    query = cte_chain(size // 10)
+    run(f"cte chain ({size // 10})", query, query.replace("amount > 1)", "amount > 1 AND id > 0)", 1), repeat)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,60 @@
+"""
+Synthetic query generators for scaling benchmarks.
+
+Each generator takes a size and returns one SQL text whose cost grows with it.
+"""
+from typing import Callable, Dict
+
+
+def wide_select(columns: int) -> str:
+    """SELECT with many aliased expressions in its column list."""
+    return "SELECT " + ", ".join(f"col{i} + {i} AS alias{i}" for i in range(columns)) + " FROM t"
+
+
+def deep_subqueries(depth: int) -> str:
+    """Subqueries nested inside each other's FROM clause."""
+    query = "SELECT id, val FROM base WHERE val > 0"
+    for level in range(depth):
+        query = f"SELECT id, val FROM ({query}) AS q{level} WHERE id > {level}"
+    return query
+
+
+def huge_in_list(size: int) -> str:
+    """WHERE clause with a long IN-list of literals."""
+    return "SELECT * FROM events WHERE id IN (" + ", ".join(str(i) for i in range(size)) + ")"
+
+
+def cte_chain(length: int) -> str:
+    """WITH chain where each CTE reads from the previous one."""
+    ctes = ["c0 AS (SELECT id, amount FROM orders)"]
+    ctes += [f"c{i} AS (SELECT id, amount * {i} AS amount FROM c{i - 1} WHERE amount > {i})"
+             for i in range(1, length)]
+    return "WITH " + ", ".join(ctes) + f" SELECT * FROM c{length - 1}"
+
+
+def multi_statement_script(statements: int) -> str:
+    """Script of alternating INSERT, UPDATE and SELECT statements."""
+    templates = (
+        "INSERT INTO log (id, msg) VALUES ({i}, 'message {i}');",
+        "UPDATE accounts SET balance = balance - {i} WHERE id = {i};",
+        "SELECT a.id, b.name FROM a JOIN b ON a.id = b.id WHERE a.x = {i};",
+    )
+    return "\n".join(templates[i % len(templates)].format(i=i) for i in range(statements))
+
+
+GENERATORS: Dict[str, Callable[[int], str]] = {
+    "wide_select": wide_select,
+    "deep_subqueries": deep_subqueries,
+    "huge_in_list": huge_in_list,
+    "cte_chain": cte_chain,
+    "multi_statement_script": multi_statement_script,
+}
+
+# Sizes used by the default suite; the largest stay below sqlparse's token limit.
+DEFAULT_SIZES: Dict[str, tuple] = {
+    "wide_select": (10, 100, 800),
+    "deep_subqueries": (2, 8, 16),
+    "huge_in_list": (10, 500, 3000),
+    "cte_chain": (2, 10, 50),
+    "multi_statement_script": (3, 30, 300),
+}
@@ -0,0 +1,396 @@
+import re
+import string
+from array import array
+try:
+    from re import _parser
+except ImportError:  # Python < 3.11
+    import sre_parse as _parser
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from sqlparse import keywords
+from sqlparse import tokens as T
+from sqlparse.lexer import Lexer
+from sqlparse.tokens import _TokenType
+
+
+# Placed between queries in the buffer, so look-behind assertions at the start
+# of a query see a line break rather than the end of the previous query.
+_SEPARATOR = "\n"
+_BACKREFERENCE = re.compile(r"(?<!\\)\\([1-9][0-9]*)")
+_FLAGS = re.IGNORECASE | re.UNICODE
+_ASCII = 128
+# Compiled dispatch state, shared by every BulkLexer with the same pattern table.
+_shared_plans: Dict[Tuple[str, ...], "_Plan"] = {}
+_CATEGORY_CHARS = {
+    "DIGIT": string.digits,
+    "WORD": string.ascii_letters + string.digits + "_",
+    "SPACE": " \t\n\r\f\v\x1c\x1d\x1e\x1f",
+    "LINEBREAK": "\n\r\x0b\x0c\x1c\x1d\x1e",
+}
+
+
+class LexedCorpus:
+    """
+    The tokens of many queries, in parallel arrays over one text buffer.
+
+    Token i belongs to query query[i], has type types[kind[i]] and spans
+    buffer[start[i]:stop[i]]. The tokens of query q are the contiguous range
+    token_offsets[q] to token_offsets[q + 1], and its text is
+    buffer[query_offsets[q]:query_ends[q]].
+
+    Attributes:
+    buffer (str): The queries, separated by line breaks.
+    types (List[_TokenType]): Type table.
+    keyword (bytearray): 1 for types whose values are upper-cased when normalized.
+    query (array): Query index of each token.
+    kind (array): Index into the type table for each token.
+    start (array): Offset in buffer where each token starts.
+    stop (array): Offset in buffer where each token ends.
+    query_offsets (array): Offset in buffer where each query starts.
+    query_ends (array): Offset in buffer where each query ends.
+    token_offsets (array): Index of the first token of each query, plus the token count.
+    """
+
+    def __init__(self, buffer: str, types: List[_TokenType], query: array, kind: array, start: array,
+                 stop: array, query_offsets: array, query_ends: array, token_offsets: array):
+        self.buffer = buffer
+        self.types = types
+        self.keyword = bytearray(1 if ttype in T.Keyword else 0 for ttype in types)
+        self.query = query
+        self.kind = kind
+        self.start = start
+        self.stop = stop
+        self.query_offsets = query_offsets
+        self.query_ends = query_ends
+        self.token_offsets = token_offsets
+
+    def __len__(self) -> int:
+        return len(self.kind)
+
+    @property
+    def query_count(self) -> int:
+        return len(self.query_offsets)
+
+    def tokens_of(self, query: int) -> range:
+        """
+        Return the token indices of one query.
+
+        Parameters:
+        query (int): The query index.
+
+        Returns:
+        range: The indices of the query's tokens, in order.
+        """
+        return range(self.token_offsets[query], self.token_offsets[query + 1])
+
+    def query_text(self, query: int) -> str:
+        return self.buffer[self.query_offsets[query]:self.query_ends[query]]
+
+    def type_of(self, token: int) -> _TokenType:
+        return self.types[self.kind[token]]
+
+    def value(self, token: int, normalized: bool = False) -> str:
+        """
+        Return the text of a token.
+
+        Parameters:
+        token (int): The token index.
+        normalized (bool): If True, upper-case keywords as sqlparse's Token.normalized does.
+
+        Returns:
+        str: The token text.
+        """
+        value = self.buffer[self.start[token]:self.stop[token]]
+        return value.upper() if normalized and self.keyword[self.kind[token]] else value
+
+    def span(self, token: int) -> Tuple[int, int]:
+        """
+        Return the offsets of a token within its own query.
+
+        Parameters:
+        token (int): The token index.
+
+        Returns:
+        Tuple[int, int]: The start and stop offsets relative to the query text.
+        """
+        base = self.query_offsets[self.query[token]]
+        return self.start[token] - base, self.stop[token] - base
+
+    def pairs(self, query: int, normalized: bool = False) -> Iterator[Tuple[_TokenType, str]]:
+        """
+        Iterate over the (token type, value) pairs of one query.
+
+        The pairs match what sqlparse.lexer.tokenize yields for the query, so
+        consumers such as fingerprint_pairs can read them directly.
+
+        Parameters:
+        query (int): The query index.
+        normalized (bool): If True, upper-case keywords.
+
+        Returns:
+        Iterator[Tuple[_TokenType, str]]: The pairs, in order.
+        """
+        buffer, types, kind, start, stop = self.buffer, self.types, self.kind, self.start, self.stop
+        keyword = self.keyword if normalized else bytes(len(types))
+        for token in self.tokens_of(query):
+            value = buffer[start[token]:stop[token]]
+            yield types[kind[token]], value.upper() if keyword[kind[token]] else value
+
+
+class BulkLexer:
+    """
+    Lex many queries in one pass with a single combined regular expression.
+
+    sqlparse's lexer tries each of its patterns in turn at every position.
+    Here the same patterns, in the same order, are alternatives of one
+    compiled pattern, so each token costs one regex match, and the result is
+    written to flat arrays instead of token objects. Tokens are identical to
+    those of sqlparse.lexer.tokenize for each query on its own.
+    """
+
+    def __init__(self, lexer: Optional[Lexer] = None):
+        """
+        Initialize the BulkLexer from a sqlparse lexer configuration.
+
+        Parameters:
+        lexer (Optional[Lexer]): The lexer whose patterns and keywords are used;
+            defaults to sqlparse's default instance.
+        """
+        self._lexer = lexer or Lexer.get_default_instance()
+        patterns = tuple(match.__self__.pattern for match, _ in self._lexer._SQL_REGEX)
+        self._actions = [action for _, action in self._lexer._SQL_REGEX] + [T.Error]
+        plan = _shared_plans.get(patterns)
+        if plan is None:
+            plan = _shared_plans[patterns] = _Plan(patterns)
+        self._plan = plan
+
+    def lex(self, queries: Iterable[str]) -> LexedCorpus:
+        """
+        Lex a sequence of queries into one LexedCorpus.
+
+        Parameters:
+        queries (Iterable[str]): The SQL queries.
+
+        Returns:
+        LexedCorpus: The tokens of all queries, in query order.
+
+        Raises:
+        ValueError: If a query is not a string.
+        """
+        texts = []
+        for query in queries:
+            if not isinstance(query, str):
+                raise ValueError("Query must be a string")
+            texts.append(query)
+        buffer = _SEPARATOR.join(texts)
+
+        types: List[_TokenType] = []
+        type_ids: Dict[_TokenType, int] = {}
+
+        def type_id(ttype: _TokenType) -> int:
+            kind_id = type_ids.get(ttype)
+            if kind_id is None:
+                kind_id = type_ids[ttype] = len(types)
+                types.append(ttype)
+            return kind_id
+
+        # Type id of each alternative, and of each keyword-like word seen so far.
+        actions = self._actions
+        alternative_kinds = [None if action is keywords.PROCESS_AS_KEYWORD else type_id(action)
+                             for action in actions]
+        word_kinds: Dict[str, int] = {}
+        is_keyword = self._lexer.is_keyword
+        plan = self._plan
+        dispatch = plan.dispatch
+
+        query_column, kind, start, stop = array("I"), array("H"), array("q"), array("q")
+        query_offsets, query_ends, token_offsets = array("q"), array("q"), array("q")
+        append_kind, append_start, append_stop = kind.append, start.append, stop.append
+        position = 0
+        for number, text in enumerate(texts):
+            base = position
+            end = base + len(text)
+            query_offsets.append(base)
+            query_ends.append(end)
+            token_offsets.append(len(kind))
+            # Dollar quotes and block comments are paired up front, as sqlparse does.
+            spans = keywords.find_delimited_spans(text) if "$" in text or "/*" in text else None
+            while position < end:
+                if spans is not None and position - base in spans.openers:
+                    resolved = spans.resolve(position - base)
+                    if resolved is not None:
+                        append_kind(type_id(resolved[1]))
+                        append_start(position)
+                        position = base + resolved[0]
+                        append_stop(position)
+                        continue
+                char = buffer[position]
+                entry = dispatch[ord(char)] if char < "\x80" else plan.full
+                if entry is None:
+                    entry = plan.compile_for(char)
+                pattern, owners = entry
+                match = pattern.match(buffer, position, end)
+                alternative = owners[match.lastindex]
+                kind_id = alternative_kinds[alternative]
+                append_start(position)
+                position = match.end()
+                if kind_id is None:
+                    word = buffer[match.start():position]
+                    kind_id = word_kinds.get(word)
+                    if kind_id is None:
+                        kind_id = word_kinds[word] = type_id(is_keyword(word)[0])
+                append_kind(kind_id)
+                append_stop(position)
+            query_column.extend(array("I", [number]) * (len(kind) - token_offsets[-1]))
+            position = end + len(_SEPARATOR)
+        token_offsets.append(len(kind))
+        return LexedCorpus(buffer, types, query_column, kind, start, stop, query_offsets, query_ends, token_offsets)
+
+
+class _Plan:
+    """
+    The combined patterns of one lexer configuration, compiled on first use.
+
+    Python's re tries alternatives one by one, so each ASCII first character
+    gets a pattern with only the alternatives that can start with it, in
+    their original order. Compiling all of them up front costs tens of
+    milliseconds, most of it for characters a short run never meets, so each
+    is compiled the first time a token starts with its character.
+    """
+
+    def __init__(self, patterns: Tuple[str, ...]):
+        self.patterns = patterns
+        self.full: Optional[Tuple[re.Pattern, List[int]]] = None
+        self.dispatch: List[Optional[Tuple[re.Pattern, List[int]]]] = [None] * _ASCII
+        self._firsts: Optional[List[Optional[frozenset]]] = None
+        self._compiled: Dict[Tuple[int, ...], Tuple[re.Pattern, List[int]]] = {}
+
+    def compile_for(self, char: str) -> Tuple[re.Pattern, List[int]]:
+        """
+        Compile, store and return the combined pattern used at a given first character.
+
+        Parameters:
+        char (str): The character at the current position.
+
+        Returns:
+        Tuple[re.Pattern, List[int]]: The pattern and, per group, the alternative it wraps.
+        """
+        if char >= "\x80":
+            if self.full is None:
+                self.full = self._compile(tuple(range(len(self.patterns))))
+            return self.full
+        if self._firsts is None:
+            self._firsts = [_first_chars(pattern) for pattern in self.patterns]
+        candidates = tuple(number for number, chars in enumerate(self._firsts)
+                           if chars is None or char in chars)
+        entry = self._compiled.get(candidates)
+        if entry is None:
+            entry = self._compiled[candidates] = self._compile(candidates)
+        self.dispatch[ord(char)] = entry
+        return entry
+
+    def _compile(self, alternatives: Tuple[int, ...]) -> Tuple[re.Pattern, List[int]]:
+        # Returns the combined pattern and, per group, the alternative it wraps (-1 for inner groups).
+        pieces = []
+        owners = [-1]
+        for number in alternatives:
+            group = len(owners)
+            pattern = _BACKREFERENCE.sub(lambda m: "\\" + str(int(m.group(1)) + group), self.patterns[number])
+            pieces.append(f"({pattern})")
+            owners.extend([number] + [-1] * re.compile(pattern, _FLAGS).groups)
+        # Characters no pattern matches become single error tokens, as in sqlparse.
+        pieces.append(r"([\s\S])")
+        owners.append(len(self.patterns))
+        return re.compile("|".join(pieces), _FLAGS), owners
+
+
+def _first_chars(pattern: str) -> Optional[frozenset]:
+    """
+    Return the ASCII characters a pattern's matches can start with, or None if any character can.
+
+    The answer may include characters that cannot actually start a match,
+    which only costs speed; patterns it cannot analyse get None.
+    """
+    try:
+        parsed = _parser.parse(pattern, _FLAGS)
+        chars, nullable = _first_of_sequence(parsed)
+    except Exception:
+        return None
+    if chars is None or nullable:
+        return None
+    # Case-insensitive matching also lets some non-ASCII characters match ASCII ones.
+    return frozenset(char for member in chars for char in (member, member.lower(), member.upper()))
+
+
+def _first_of_sequence(items) -> Tuple[Optional[set], bool]:
+    chars = set()
+    for op, argument in items:
+        first, nullable = _first_of_item(op, argument)
+        if first is None:
+            return None, False
+        chars |= first
+        if not nullable:
+            return chars, False
+    return chars, True
+
+
+def _first_of_item(op, argument) -> Tuple[Optional[set], bool]:
+    name = str(op)
+    if name == "LITERAL":
+        return {chr(argument)}, False
+    if name == "IN":
+        chars = set()
+        for member, value in argument:
+            member = str(member)
+            if member == "LITERAL":
+                chars.add(chr(value))
+            elif member == "RANGE" and value[1] - value[0] < 0x1000:
+                chars.update(chr(code) for code in range(value[0], value[1] + 1))
+            elif member == "CATEGORY" and str(value).rsplit("_", 1)[-1] in _CATEGORY_CHARS \
+                    and "NOT" not in str(value):
+                chars.update(_CATEGORY_CHARS[str(value).rsplit("_", 1)[-1]])
+            else:
+                return None, False
+        return chars, False
+    if name == "SUBPATTERN":
+        return _first_of_sequence(argument[-1])
+    if name == "ATOMIC_GROUP":
+        return _first_of_sequence(argument)
+    if name == "BRANCH":
+        chars = set()
+        nullable = False
+        for branch in argument[1]:
+            first, branch_nullable = _first_of_sequence(branch)
+            if first is None:
+                return None, False
+            chars |= first
+            nullable = nullable or branch_nullable
+        return chars, nullable
+    if name in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT"):
+        first, nullable = _first_of_sequence(argument[2])
+        return first, nullable or argument[0] == 0
+    if name in ("ASSERT", "ASSERT_NOT", "AT"):
+        # Zero-width: the match starts with whatever follows.
+        return set(), True
+    return None, False
+
+
+_default_lexer: Optional[BulkLexer] = None
+
+
+def lex_many(queries: Iterable[str]) -> LexedCorpus:
+    """
+    Lex many queries at once with a shared BulkLexer.
+
+    Parameters:
+    queries (Iterable[str]): The SQL queries.
+
+    Returns:
+    LexedCorpus: The tokens of all queries, in parallel arrays.
+
+    Raises:
+    ValueError: If a query is not a string.
+    """
+    global _default_lexer
+    if _default_lexer is None:
+        _default_lexer = BulkLexer()
+    return _default_lexer.lex(queries)
@@ -0,0 +1,105 @@
+import hashlib
+from typing import Iterable, List, NamedTuple, Tuple
+from sqlparse import lexer
+from sqlparse import tokens as T
+from sqlparse.sql import Token
+from sqlparse.tokens import _TokenType
+from token_processor import iter_leaves
+
+
+PLACEHOLDER = "?"
+LIST_PLACEHOLDER = "(?+)"
+
+_NO_SPACE_BEFORE = frozenset(("(", ")", ",", ".", ";"))
+_NO_SPACE_AFTER = frozenset(("(", "."))
+
+
+class Fingerprint(NamedTuple):
+    """
+    Canonical form of a query with its literal values removed.
+
+    Attributes:
+    text (str): The canonical query text.
+    hash (int): An unsigned 64-bit hash of the canonical text.
+    """
+    text: str
+    hash: int
+
+
+def fingerprint_pairs(pairs: Iterable[Tuple[_TokenType, str]]) -> Fingerprint:
+    """
+    Fingerprint a stream of (token type, normalized value) pairs.
+
+    Literals become placeholders, lists of literals after IN collapse to a
+    single placeholder, comments are dropped and tokens are separated by
+    single spaces, except before brackets, commas and dots and after opening
+    brackets and dots.
+
+    Parameters:
+    pairs (Iterable[Tuple[_TokenType, str]]): The leaf tokens of a query, in order.
+
+    Returns:
+    Fingerprint: The canonical text and its 64-bit hash.
+    """
+    parts: List[str] = []
+    after_in = False
+    # Index in parts of the "(" opening a candidate IN-list, or -1.
+    in_list = -1
+    for ttype, value in pairs:
+        if ttype in T.Whitespace or ttype in T.Comment:
+            continue
+        if ttype in T.Literal and ttype is not T.String.Symbol:
+            value = PLACEHOLDER
+        elif ttype in T.Keyword and value == "IN":
+            after_in = True
+            parts.append(value)
+            continue
+        elif value == "(" and after_in:
+            in_list = len(parts)
+        elif value == ")" and in_list >= 0:
+            del parts[in_list:]
+            value = LIST_PLACEHOLDER
+            in_list = -1
+        elif in_list >= 0 and value != ",":
+            in_list = -1
+        after_in = False
+        parts.append(value)
+
+    pieces = []
+    previous = "("
+    for part in parts:
+        if part[0] not in _NO_SPACE_BEFORE and previous[-1] not in _NO_SPACE_AFTER:
+            pieces.append(" ")
+        pieces.append(part)
+        previous = part
+    text = "".join(pieces)
+    digest = hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=8).digest()
+    return Fingerprint(text, int.from_bytes(digest, "big"))
+
+
+def fingerprint_tokens(tokens: List[Token]) -> Fingerprint:
+    """
+    Fingerprint a parsed token tree.
+
+    Parameters:
+    tokens (List[Token]): The top-level tokens of the tree.
+
+    Returns:
+    Fingerprint: The canonical text and its 64-bit hash.
+    """
+    return fingerprint_pairs((token.ttype, token.normalized) for token in iter_leaves(tokens))
+
+
+def fingerprint_query(query: str) -> Fingerprint:
+    """
+    Fingerprint a query from its lexical stream, without grouping it.
+
+    Parameters:
+    query (str): The SQL query.
+
+    Returns:
+    Fingerprint: The canonical text and its 64-bit hash.
+    """
+    return fingerprint_pairs(
+        (ttype, value.upper() if ttype in T.Keyword else value)
+        for ttype, value in lexer.tokenize(query))
@@ -0,0 +1,234 @@
+import re
+from bisect import bisect_right
+from typing import List, Optional, Tuple
+import sqlparse
+from sqlparse.sql import Parenthesis, Token, TokenList
+from statement_reader import StatementSplitter
+
+
+# Edits containing these characters may change how statements split or how
+# quotes, comments and brackets pair up, so they re-parse whole statements.
+_STRUCTURAL_CHARS = re.compile(r"[;'\"`$()\-/*]")
+_TRAILING_BLANKS = re.compile(r"[ \t]*")
+
+
+class _Segment:
+    """
+    One statement of the document, with any whitespace up to the next one.
+    """
+
+    def __init__(self, text: str, terminated: bool):
+        self.text = text
+        self.terminated = terminated
+        self.tokens = _parse_segment(text)
+
+
+class IncrementalParser:
+    """
+    Keep the token trees of a SQL document up to date under small edits.
+
+    The document is kept as a list of statements. An edit re-lexes and
+    re-groups only the innermost parenthesized expression that contains it
+    when that is safe, otherwise only the statements it touches; the trees of
+    all other statements are reused as they are.
+    """
+
+    def __init__(self, text: str):
+        """
+        Initialize the IncrementalParser by parsing the whole document once.
+
+        Parameters:
+        text (str): The SQL document.
+
+        Raises:
+        ValueError: If the text is not a string.
+        """
+        if not isinstance(text, str):
+            raise ValueError("Query must be a string")
+        self._segments = _split_segments(text)
+        self._starts = _prefix_sums(self._segments)
+        self._length = len(text)
+        self._text: Optional[str] = text
+        self.last_reparsed_chars = len(text)
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = "".join(segment.text for segment in self._segments)
+        return self._text
+
+    @property
+    def statements(self) -> List[List[Token]]:
+        """
+        The top-level tokens of each statement, in document order.
+        """
+        return [segment.tokens for segment in self._segments if segment.tokens]
+
+    @property
+    def tokens(self) -> List[Token]:
+        """
+        The top-level tokens of the first statement, as QueryProcessor.parse_query
+        would return them.
+        """
+        return self._segments[0].tokens if self._segments else []
+
+    def apply_edit(self, offset: int, deleted: int, inserted: str) -> List[Token]:
+        """
+        Apply a text edit and update the affected part of the trees.
+
+        Parameters:
+        offset (int): Character offset where the edit starts.
+        deleted (int): Number of characters removed at offset.
+        inserted (str): Text inserted at offset.
+
+        Returns:
+        List[Token]: The top-level tokens of the first statement.
+
+        Raises:
+        ValueError: If the edit falls outside the document.
+        """
+        if not isinstance(inserted, str):
+            raise ValueError("Inserted text must be a string")
+        if offset < 0 or deleted < 0 or offset + deleted > self._length:
+            raise ValueError("Edit is outside the query")
+        if not deleted and not inserted:
+            self.last_reparsed_chars = 0
+            return self.tokens
+
+        if not self._segments:
+            self._segments = _split_segments(inserted)
+            self.last_reparsed_chars = len(inserted)
+        else:
+            first = max(bisect_right(self._starts, offset) - 1, 0)
+            last = max(bisect_right(self._starts, offset + deleted) - 1, first)
+            if first and offset == self._starts[first]:
+                # Blanks typed right after a semicolon belong to the previous statement.
+                first -= 1
+            if first != last or not self._edit_parenthesis(first, offset - self._starts[first], deleted, inserted):
+                self._edit_statements(first, last, offset, deleted, inserted)
+        self._starts = _prefix_sums(self._segments)
+        self._length += len(inserted) - deleted
+        self._text = None
+        return self.tokens
+
+    def _edit_parenthesis(self, index: int, offset: int, deleted: int, inserted: str) -> bool:
+        segment = self._segments[index]
+        if not segment.tokens or _STRUCTURAL_CHARS.search(inserted) \
+                or _STRUCTURAL_CHARS.search(segment.text, offset, offset + deleted):
+            return False
+
+        path = _innermost_parenthesis(segment.tokens, offset, offset + deleted)
+        if path is None:
+            return False
+        parent, position, start = path
+        old = parent.tokens[position] if parent is not None else segment.tokens[position]
+        local = offset - start
+        text = old.value[:local] + inserted + old.value[local + deleted:]
+        parsed = _parse_segment(text)
+        if len(parsed) != 1 or not isinstance(parsed[0], Parenthesis):
+            return False
+
+        replacement = parsed[0]
+        replacement.parent = old.parent
+        if parent is not None:
+            parent.tokens[position] = replacement
+            group = parent
+            while group is not None and isinstance(group, TokenList):
+                group.value = "".join(token.value for token in group.tokens)
+                group.normalized = group.value
+                group = group.parent
+        else:
+            segment.tokens[position] = replacement
+        segment.text = segment.text[:offset] + inserted + segment.text[offset + deleted:]
+        self.last_reparsed_chars = len(text)
+        return True
+
+    def _edit_statements(self, first: int, last: int, offset: int, deleted: int, inserted: str):
+        start = self._starts[first]
+        local = offset - start
+        region = "".join(segment.text for segment in self._segments[first:last + 1])
+        region = region[:local] + inserted + region[local + deleted:]
+        while True:
+            pieces = _split_segments(region)
+            # The region must end where a statement ends, or it swallows the next one.
+            if not region or last + 1 >= len(self._segments) or pieces[-1].terminated:
+                break
+            last += 1
+            region += self._segments[last].text
+        self._segments[first:last + 1] = pieces
+        self.last_reparsed_chars = len(region)
+
+
+def _parse_segment(text: str) -> List[Token]:
+    parsed = sqlparse.parse(text)
+    if not parsed:
+        return []
+    tokens = [token for statement in parsed for token in statement.tokens]
+    _refresh_values(tokens)
+    return tokens
+
+
+def _refresh_values(tokens: List[Token]):
+    # Group values cached by sqlparse can be stale; offsets rely on exact lengths.
+    groups = []
+    stack = list(tokens)
+    while stack:
+        token = stack.pop()
+        if token.is_group:
+            groups.append(token)
+            stack.extend(token.tokens)
+    for group in reversed(groups):
+        group.value = "".join(token.value for token in group.tokens)
+        group.normalized = group.value
+
+
+def _innermost_parenthesis(tokens: List[Token], begin: int, end: int) -> Optional[Tuple[Optional[TokenList], int, int]]:
+    """
+    Find the innermost Parenthesis whose brackets strictly enclose [begin, end].
+
+    Returns the parent group (None at top level), the index of the
+    Parenthesis in it and the Parenthesis' start offset.
+    """
+    found = None
+    parent = None
+    children = tokens
+    base = 0
+    while True:
+        position = 0
+        for position, token in enumerate(children):
+            length = len(token.value)
+            if base <= begin and end <= base + length:
+                break
+            base += length
+        else:
+            return found
+        token = children[position]
+        if not token.is_group:
+            return found
+        if isinstance(token, Parenthesis) and base < begin and end < base + len(token.value):
+            found = (parent, position, base)
+        parent = token
+        children = token.tokens
+
+
+def _split_segments(text: str) -> List[_Segment]:
+    splitter = StatementSplitter()
+    terminated = splitter.feed(text)
+    boundaries = [0]
+    for statement in terminated:
+        boundaries.append(_TRAILING_BLANKS.match(text, statement.end).end())
+    if boundaries[-1] < len(text):
+        boundaries.append(len(text))
+    segments = []
+    for number, (begin, finish) in enumerate(zip(boundaries, boundaries[1:])):
+        segments.append(_Segment(text[begin:finish], terminated=number < len(terminated)))
+    return segments
+
+
+def _prefix_sums(segments: List[_Segment]) -> List[int]:
+    starts = []
+    total = 0
+    for segment in segments:
+        starts.append(total)
+        total += len(segment.text)
+    return starts
@@ -0,0 +1,293 @@
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+
+COUNT = "count"
+TIMING = "timing"
+GAUGE = "gauge"
+
+
+class Event(NamedTuple):
+    """
+    One measurement reported by the parse pipeline.
+
+    Attributes:
+    name (str): Metric name, e.g. "stage_seconds" or "cache_hits".
+    kind (str): COUNT, TIMING (value in seconds) or GAUGE.
+    value (float): The measured value.
+    tags (Tuple[Tuple[str, str], ...]): Sorted (key, value) labels, e.g. the stage name.
+    """
+    name: str
+    kind: str
+    value: float
+    tags: Tuple[Tuple[str, str], ...] = ()
+
+
+Hook = Callable[[Event], None]
+
+# Hot paths test this list directly, so instrumentation costs one truth test when off.
+_hooks: List[Hook] = []
+
+
+def add_hook(hook: Hook):
+    """
+    Register a callable that receives every Event; this turns instrumentation on.
+
+    Hooks are called synchronously on the thread doing the work, and are
+    per process: worker processes of a pool need their own hooks.
+
+    Parameters:
+    hook (Hook): A callable taking one Event.
+    """
+    if hook not in _hooks:
+        _hooks.append(hook)
+
+
+def remove_hook(hook: Hook):
+    """
+    Unregister a hook; instrumentation turns off when none are left.
+
+    Parameters:
+    hook (Hook): A previously added hook.
+    """
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+def enabled() -> bool:
+    return bool(_hooks)
+
+
+def emit(name: str, value: float = 1, kind: str = COUNT, **tags: str):
+    """
+    Send an event to every registered hook.
+
+    Parameters:
+    name (str): Metric name.
+    value (float): The measured value.
+    kind (str): COUNT, TIMING or GAUGE.
+    **tags (str): Labels attached to the event.
+    """
+    if not _hooks:
+        return
+    event = Event(name, kind, value, tuple(sorted(tags.items())))
+    for hook in list(_hooks):
+        hook(event)
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class _Stage:
+    def __init__(self, name: str):
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        emit("stage_seconds", time.perf_counter() - self.start, TIMING, stage=self.name)
+        if exc_type is not None:
+            emit("errors", 1, COUNT, stage=self.name, error=exc_type.__name__)
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name: str):
+    """
+    Time a block of the pipeline and count the exceptions it raises.
+
+    Parameters:
+    name (str): The stage name, reported in the "stage" tag.
+
+    Returns:
+    A context manager; a shared no-op one when no hooks are registered.
+    """
+    return _Stage(name) if _hooks else _NULL_STAGE
+
+
+class MetricsCollector:
+    """
+    In-process hook that aggregates events and renders them for export.
+
+    Counts are summed, timings keep their count, sum and maximum, and gauges
+    keep their last value and maximum. Keys are (name, tags) pairs.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[Tuple[str, tuple], float] = defaultdict(float)
+        self.timings: Dict[Tuple[str, tuple], List[float]] = {}
+        self.gauges: Dict[Tuple[str, tuple], List[float]] = {}
+
+    def __call__(self, event: Event):
+        key = (event.name, event.tags)
+        with self._lock:
+            if event.kind == COUNT:
+                self.counters[key] += event.value
+            elif event.kind == TIMING:
+                summary = self.timings.setdefault(key, [0, 0.0, 0.0])
+                summary[0] += 1
+                summary[1] += event.value
+                summary[2] = max(summary[2], event.value)
+            else:
+                gauge = self.gauges.setdefault(key, [event.value, event.value])
+                gauge[0] = event.value
+                gauge[1] = max(gauge[1], event.value)
+
+    def count(self, name: str, **tags: str) -> float:
+        """
+        Return a counter's total, summed over every tag set that includes the given tags.
+
+        Parameters:
+        name (str): Metric name.
+        **tags (str): Tags the counted events must carry.
+
+        Returns:
+        float: The total.
+        """
+        wanted = set(tags.items())
+        with self._lock:
+            return sum(value for (key, key_tags), value in self.counters.items()
+                       if key == name and wanted <= set(key_tags))
+
+    def timing(self, name: str, **tags: str) -> Tuple[int, float, float]:
+        """
+        Return the number, total and maximum of the matching timings.
+
+        Parameters:
+        name (str): Metric name.
+        **tags (str): Tags the timed events must carry.
+
+        Returns:
+        Tuple[int, float, float]: Count, sum in seconds and maximum in seconds.
+        """
+        wanted = set(tags.items())
+        count, total, largest = 0, 0.0, 0.0
+        with self._lock:
+            for (key, key_tags), summary in self.timings.items():
+                if key == name and wanted <= set(key_tags):
+                    count += summary[0]
+                    total += summary[1]
+                    largest = max(largest, summary[2])
+        return count, total, largest
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.timings.clear()
+            self.gauges.clear()
+
+    def prometheus_text(self, prefix: str = "query_parser_") -> str:
+        """
+        Render the aggregated metrics in the Prometheus text exposition format.
+
+        Parameters:
+        prefix (str): Prepended to every metric name.
+
+        Returns:
+        str: Counters as *_total, timings as summaries (*_count, *_sum) plus
+        a *_max gauge, and gauges with their last value.
+        """
+        lines = []
+        with self._lock:
+            for name, series in _by_name(self.counters).items():
+                lines.append(f"# TYPE {prefix}{name}_total counter")
+                lines.extend(f"{prefix}{name}_total{_labels(tags)} {_number(value)}" for tags, value in series)
+            for name, series in _by_name(self.timings).items():
+                lines.append(f"# TYPE {prefix}{name} summary")
+                for tags, (count, total, _) in series:
+                    lines.append(f"{prefix}{name}_count{_labels(tags)} {count}")
+                    lines.append(f"{prefix}{name}_sum{_labels(tags)} {_number(total)}")
+                lines.append(f"# TYPE {prefix}{name}_max gauge")
+                lines.extend(f"{prefix}{name}_max{_labels(tags)} {_number(summary[2])}" for tags, summary in series)
+            for name, series in _by_name(self.gauges).items():
+                lines.append(f"# TYPE {prefix}{name} gauge")
+                lines.extend(f"{prefix}{name}{_labels(tags)} {_number(gauge[0])}" for tags, gauge in series)
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+class StatsdSink:
+    """
+    Hook that forwards every event as a StatsD datagram over UDP.
+
+    Tags are sent in the DogStatsD "|#key:value" form; timings are sent in
+    milliseconds.
+    """
+
+    _TYPES = {COUNT: "c", TIMING: "ms", GAUGE: "g"}
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8125, prefix: str = "query_parser",
+                 sock: Optional["socket.socket"] = None):
+        """
+        Initialize the StatsdSink.
+
+        Parameters:
+        host (str): StatsD host.
+        port (int): StatsD UDP port.
+        prefix (str): Prepended to metric names, separated by a dot.
+        sock (Optional[socket.socket]): A UDP socket to send with; one is created if None.
+        """
+        self.address = (host, port)
+        self.prefix = prefix
+        if sock is None:
+            # Imported here: only StatsD export needs sockets.
+            import socket
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket = sock
+
+    def format(self, event: Event) -> str:
+        """
+        Render an event as one StatsD line.
+
+        Parameters:
+        event (Event): The event.
+
+        Returns:
+        str: The StatsD line, e.g. "query_parser.stage_seconds:1.5|ms|#stage:parse".
+        """
+        value = event.value * 1000 if event.kind == TIMING else event.value
+        name = f"{self.prefix}.{event.name}" if self.prefix else event.name
+        line = f"{name}:{_number(value)}|{self._TYPES[event.kind]}"
+        if event.tags:
+            line += "|#" + ",".join(f"{key}:{tag}" for key, tag in event.tags)
+        return line
+
+    def __call__(self, event: Event):
+        try:
+            self._socket.sendto(self.format(event).encode("utf-8"), self.address)
+        except OSError:
+            # Metrics are best effort; a missing agent must not break parsing.
+            pass
+
+    def close(self):
+        self._socket.close()
+
+
+def _by_name(metrics: Dict[Tuple[str, tuple], object]) -> Dict[str, List[Tuple[tuple, object]]]:
+    grouped: Dict[str, List[Tuple[tuple, object]]] = defaultdict(list)
+    for (name, tags), value in sorted(metrics.items()):
+        grouped[name].append((tags, value))
+    return grouped
+
+
+def _labels(tags: Tuple[Tuple[str, str], ...]) -> str:
+    if not tags:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in tags)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(tags, escaped)) + "}"
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
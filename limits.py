@@ -0,0 +1,294 @@
+import tracemalloc
+from typing import List, NamedTuple, Optional, Tuple
+from sqlparse import lexer
+from sqlparse import tokens as T
+import sql_query
+from instrumentation import GAUGE, emit
+
+
+LIST = "list"
+LITERAL = "literal"
+
+# Characters of a long literal kept in its summary, at each end.
+_EXCERPT = 32
+
+
+class LimitExceededError(ValueError):
+    """
+    Raised when a query exceeds one of the configured parse limits.
+
+    Attributes:
+    limit (str): The name of the exceeded limit, e.g. "max_tokens".
+    value (int): The measured value, or the first value over the limit when
+        the scan stopped early.
+    maximum (int): The configured maximum.
+    """
+
+    def __init__(self, limit: str, value: int, maximum: int):
+        super().__init__(f"Query exceeds {limit}: {value} > {maximum}")
+        self.limit = limit
+        self.value = value
+        self.maximum = maximum
+
+
+class ParseLimits(NamedTuple):
+    """
+    Bounds on the queries accepted for parsing.
+
+    Attributes:
+    max_bytes (Optional[int]): Maximum UTF-8 size of the query text.
+    max_tokens (Optional[int]): Maximum number of lexical tokens, whitespace included.
+    max_depth (Optional[int]): Maximum parenthesis nesting.
+    max_literal_length (Optional[int]): Maximum length of a string literal, quotes included.
+    degrade (bool): If True, collapse long literal lists and long string literals
+        into placeholders before checking the other limits, instead of failing.
+    max_list_items (int): In degraded mode, lists of literals longer than this are collapsed.
+    track_memory (bool): If True, measure the peak memory allocated while building the tree.
+    """
+    max_bytes: Optional[int] = None
+    max_tokens: Optional[int] = None
+    max_depth: Optional[int] = None
+    max_literal_length: Optional[int] = None
+    degrade: bool = False
+    max_list_items: int = 1000
+    track_memory: bool = False
+
+
+class Summary(NamedTuple):
+    """
+    A part of the query replaced by a placeholder in degraded mode.
+
+    Attributes:
+    kind (str): LIST for a collapsed list of literals, LITERAL for a long string literal.
+    start (int): Offset where the summarized text starts in the original query.
+    stop (int): Offset where it ends in the original query.
+    new_start (int): Offset where the placeholder starts in the reduced query.
+    new_stop (int): Offset where the placeholder ends in the reduced query.
+    count (int): Number of list elements, or length of the literal.
+    first (str): The first element, or the beginning of the literal.
+    last (str): The last element, or the end of the literal.
+    """
+    kind: str
+    start: int
+    stop: int
+    new_start: int
+    new_stop: int
+    count: int
+    first: str
+    last: str
+
+
+class BoundedQuery(NamedTuple):
+    """
+    A query that passed the parse limits, possibly reduced.
+
+    Attributes:
+    text (str): The query to parse; the original one unless parts were summarized.
+    summaries (Tuple[Summary, ...]): The summarized parts, in document order.
+    tokens (int): Number of lexical tokens in text.
+    depth (int): Maximum parenthesis nesting in text.
+    """
+    text: str
+    summaries: Tuple[Summary, ...]
+    tokens: int
+    depth: int
+
+    def original_offset(self, offset: int) -> int:
+        """
+        Map an offset in the reduced text back to the original query.
+
+        Parameters:
+        offset (int): An offset in text.
+
+        Returns:
+        int: The matching offset in the original query; offsets inside a
+        placeholder map to the start of the summarized part.
+        """
+        shift = 0
+        for summary in self.summaries:
+            if offset < summary.new_start:
+                break
+            if offset < summary.new_stop:
+                return summary.start
+            shift = summary.stop - summary.new_stop
+        return offset + shift
+
+
+def configure_limits(limits: Optional[ParseLimits] = None) -> Optional[ParseLimits]:
+    """
+    Set the process-wide limits applied by SqlQuery.set_query.
+
+    Parameters:
+    limits (Optional[ParseLimits]): The limits; None removes them.
+
+    Returns:
+    Optional[ParseLimits]: The limits now in effect.
+    """
+    sql_query.set_default_limits(limits)
+    return limits
+
+
+def default_limits() -> Optional[ParseLimits]:
+    return sql_query.default_limits()
+
+
+def apply_limits(query: str, limits: ParseLimits) -> BoundedQuery:
+    """
+    Check a query against parse limits, summarizing it first in degraded mode.
+
+    The query is lexed once as a stream, without grouping and without keeping
+    the tokens, so the check itself holds no per-token memory. Outside
+    degraded mode it stops at the first exceeded limit.
+
+    Parameters:
+    query (str): The SQL query.
+    limits (ParseLimits): The limits to enforce.
+
+    Returns:
+    BoundedQuery: The text to parse and what was summarized in it.
+
+    Raises:
+    LimitExceededError: If the query, after any summarizing, still exceeds a limit.
+    """
+    if not limits.degrade:
+        _check_bytes(query, limits)
+        tokens, depth, _ = _scan(query, limits, degrade=False)
+        return BoundedQuery(query, (), tokens, depth)
+
+    tokens, depth, replacements = _scan(query, limits, degrade=True)
+    if not replacements:
+        _check_bytes(query, limits)
+        _check("max_tokens", tokens, limits.max_tokens)
+        return BoundedQuery(query, (), tokens, depth)
+
+    pieces = []
+    summaries = []
+    position = 0
+    length = 0
+    for start, stop, placeholder, summary in replacements:
+        pieces.append(query[position:start])
+        length += start - position
+        pieces.append(placeholder)
+        summaries.append(summary._replace(new_start=length, new_stop=length + len(placeholder)))
+        length += len(placeholder)
+        position = stop
+    pieces.append(query[position:])
+    text = "".join(pieces)
+    _check_bytes(text, limits)
+    tokens, depth, _ = _scan(text, limits, degrade=False)
+    return BoundedQuery(text, tuple(summaries), tokens, depth)
+
+
+def _check(limit: str, value: int, maximum: Optional[int]):
+    if maximum is not None and value > maximum:
+        raise LimitExceededError(limit, value, maximum)
+
+
+def _check_bytes(text: str, limits: ParseLimits):
+    if limits.max_bytes is not None:
+        # Only encode when the character count cannot settle it.
+        if len(text) > limits.max_bytes or not text.isascii():
+            _check("max_bytes", len(text.encode("utf-8", "surrogatepass")), limits.max_bytes)
+
+
+def _scan(text: str, limits: ParseLimits, degrade: bool) -> Tuple[int, int, List[tuple]]:
+    max_tokens = None if degrade else limits.max_tokens
+    max_depth = limits.max_depth
+    max_literal = limits.max_literal_length
+    max_items = limits.max_list_items
+    replacements = []
+
+    tokens = depth = deepest = position = 0
+    # The current run of same-typed value literals separated by commas; quoted
+    # names are String.Symbol literals to the lexer but are not collapsed:
+    # [type, start, first, last_start, last_stop, last, count, expects_comma].
+    run = None
+    for ttype, value in lexer.tokenize(text):
+        start = position
+        position += len(value)
+        tokens += 1
+        if max_tokens is not None and tokens > max_tokens:
+            raise LimitExceededError("max_tokens", tokens, max_tokens)
+        if ttype in T.Whitespace:
+            continue
+
+        if run is not None:
+            if run[7] and ttype is T.Punctuation and value == ",":
+                run[7] = False
+                continue
+            if not run[7] and ttype is run[0] and not _too_long(ttype, value, max_literal):
+                run[3], run[4], run[5] = start, position, value
+                run[6] += 1
+                run[7] = True
+                continue
+            if degrade and run[6] > max(max_items, 2):
+                replacements.append(_collapse(run))
+            run = None
+
+        if ttype is T.Punctuation:
+            if value == "(":
+                depth += 1
+                if max_depth is not None and depth > max_depth:
+                    raise LimitExceededError("max_depth", depth, max_depth)
+                deepest = max(deepest, depth)
+            elif value == ")":
+                depth -= 1
+        elif ttype in T.Literal:
+            if _too_long(ttype, value, max_literal):
+                if not degrade or value[0] != "'":
+                    raise LimitExceededError("max_literal_length", len(value), max_literal)
+                placeholder = f"'' /* {len(value)} chars */"
+                replacements.append((start, position, placeholder, Summary(
+                    LITERAL, start, position, 0, 0, len(value), value[:_EXCERPT], value[-_EXCERPT:])))
+            elif ttype in T.Number or ttype is T.String.Single:
+                run = [ttype, start, value, start, position, value, 1, True]
+    if run is not None and degrade and run[6] > max(max_items, 2):
+        replacements.append(_collapse(run))
+    return tokens, deepest, replacements
+
+
+def _too_long(ttype, value: str, max_literal: Optional[int]) -> bool:
+    return max_literal is not None and len(value) > max_literal and ttype in T.String
+
+
+def _collapse(run: list) -> tuple:
+    ttype, start, first, last_start, stop, last, count, _ = run
+    placeholder = f"{first}, /* {count - 2} more */ {last}"
+    return start, stop, placeholder, Summary(LIST, start, stop, 0, 0, count, first, last)
+
+
+class MemoryTracker:
+    """
+    Measure the peak memory allocated inside a block with tracemalloc.
+
+    Tracing slows allocation-heavy code down noticeably, so it is only
+    turned on for the duration of the block, unless it was already on.
+    Trackers should not be nested: entering one resets the traced peak.
+    """
+
+    def __init__(self, name: str):
+        """
+        Initialize the MemoryTracker.
+
+        Parameters:
+        name (str): Reported in the "stage" tag of the "peak_memory_bytes" gauge.
+        """
+        self.name = name
+        self.peak: Optional[int] = None
+        self._started = False
+        self._baseline = 0
+
+    def __enter__(self):
+        self._started = not tracemalloc.is_tracing()
+        if self._started:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        self._baseline = tracemalloc.get_traced_memory()[0]
+        return self
+
+    def __exit__(self, *exc_info):
+        self.peak = max(tracemalloc.get_traced_memory()[1] - self._baseline, 0)
+        if self._started:
+            tracemalloc.stop()
+        emit("peak_memory_bytes", self.peak, GAUGE, stage=self.name)
+        return False
@@ -0,0 +1,354 @@
+from array import array
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+import sqlparse
+from sqlparse import lexer
+from sqlparse import tokens as T
+from sqlparse.engine import statement_splitter
+from instrumentation import stage
+from query_tree import NodeType, QueryTree
+from serialization import dump_tree, load_tree
+from statement_reader import StatementSplitter
+
+
+STATEMENTS = "statements"
+CTE_PREFIX = "cte_prefix"
+CTE_DEFINITION = "cte_definition"
+CTE_SEPARATOR = "cte_separator"
+CTE_TAIL = "cte_tail"
+
+# Characters lexed after a semicolon to find where sqlparse ends the statement.
+_LOOKAHEAD = 256
+
+
+class ScriptPiece(NamedTuple):
+    """
+    A part of a script parsed on its own.
+
+    Attributes:
+    start (int): Offset of the piece in the script.
+    stop (int): Offset where the piece ends in the script.
+    role (str): STATEMENTS for whole statements; for a WITH statement split at
+        its definitions, CTE_PREFIX, CTE_DEFINITION, CTE_SEPARATOR or CTE_TAIL.
+    """
+    start: int
+    stop: int
+    role: str
+
+
+def split_script(script: str, chunk_size: int = 1 << 16, split_ctes: bool = False) -> List[ScriptPiece]:
+    """
+    Cut a script into pieces that can be parsed independently.
+
+    Pieces are contiguous and cover the whole script. Statements are cut where
+    sqlparse itself would end them, after the semicolon and the whitespace and
+    line comments it keeps with the statement, and consecutive statements are
+    grouped into pieces of about chunk_size characters.
+
+    With split_ctes, a WITH statement of at least two definitions is further
+    cut into its prefix ("WITH "), each definition ("name AS (...)"), the
+    separators between them, and the tail holding the main query.
+
+    Parameters:
+    script (str): The SQL script.
+    chunk_size (int): Approximate number of characters per STATEMENTS piece.
+    split_ctes (bool): If True, split WITH statements at their definitions.
+
+    Returns:
+    List[ScriptPiece]: The pieces, in script order.
+
+    Raises:
+    ValueError: If the script is empty or chunk_size is not positive.
+    """
+    if not isinstance(script, str) or not script:
+        raise ValueError("Script cannot be empty")
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be positive")
+    splitter = StatementSplitter()
+    statements = splitter.feed(script) + splitter.close()
+
+    pieces: List[ScriptPiece] = []
+    piece_start = 0
+    statement_start = 0
+    for number, statement in enumerate(statements):
+        last = number == len(statements) - 1
+        statement_stop = len(script) if last else _statement_end(script, statement.end)
+        cuts = None
+        if split_ctes and statement.text[:4].lower() == "with":
+            cuts = _cte_pieces(script, statement_start, statement_stop)
+        if cuts:
+            if statement_start > piece_start:
+                pieces.append(ScriptPiece(piece_start, statement_start, STATEMENTS))
+            pieces.extend(cuts)
+            piece_start = statement_stop
+        elif last or statement_stop - piece_start >= chunk_size:
+            pieces.append(ScriptPiece(piece_start, statement_stop, STATEMENTS))
+            piece_start = statement_stop
+        statement_start = statement_stop
+    if piece_start < len(script):
+        pieces.append(ScriptPiece(piece_start, len(script), STATEMENTS))
+    return pieces
+
+
+def parse_pieces(texts: List[Tuple[str, str]]) -> List[Tuple[bool, Optional[bytes]]]:
+    """
+    Parse pieces of a script; the unit of work sent to a worker process.
+
+    Parameters:
+    texts (List[Tuple[str, str]]): Pairs of piece role and text.
+
+    Returns:
+    List[Tuple[bool, Optional[bytes]]]: For each piece, whether its last statement
+    is closed, i.e. sqlparse would start a new statement after it, and the
+    serialized tree of its statements, or None if it holds none.
+
+    Raises:
+    ValueError: If a piece cannot be parsed.
+    """
+    results = []
+    for role, text in texts:
+        try:
+            statements = list(sqlparse.parse(text))
+        except Exception as e:
+            raise ValueError(f"Error while parsing the query: {e}")
+        if not statements:
+            results.append((True, None))
+            continue
+        closed = role in (STATEMENTS, CTE_TAIL) and _is_closed(statements[-1])
+        results.append((closed, dump_tree(QueryTree(statements, text))))
+    return results
+
+
+def parse_script(script: str, max_workers: Optional[int] = None, chunk_size: int = 1 << 16,
+                 split_ctes: bool = False, executor: Optional[Executor] = None) -> QueryTree:
+    """
+    Parse every statement of a script across a pool of worker processes.
+
+    The pieces from split_script are parsed in parallel and stitched back into
+    one tree over the script, whose top-level nodes are the Statement groups,
+    so all offsets are global. The tree is the one sqlparse builds for the
+    whole script. When a piece does not end where sqlparse would end a
+    statement, e.g. inside a BEGIN ... END body, it is parsed again together
+    with the pieces after it.
+
+    Parameters:
+    script (str): The SQL script.
+    max_workers (Optional[int]): Size of the process pool; defaults to the CPU
+        count. With 1, pieces are parsed in this process.
+    chunk_size (int): Approximate number of characters per piece and per task.
+    split_ctes (bool): If True, also split WITH statements at their definitions.
+    executor (Optional[Executor]): An existing executor to submit work to
+        instead of creating a process pool.
+
+    Returns:
+    QueryTree: The tree of the script, with the script as its source.
+
+    Raises:
+    ValueError: If the script is empty or cannot be parsed.
+    """
+    with stage("parse_script"):
+        pieces = split_script(script, chunk_size, split_ctes)
+        tasks = list(_tasks(script, pieces, chunk_size))
+        if executor is not None:
+            batches = list(executor.map(parse_pieces, tasks))
+        elif max_workers == 1 or len(tasks) == 1:
+            batches = [parse_pieces(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                batches = list(pool.map(parse_pieces, tasks))
+        results = [result for batch in batches for result in batch]
+        return _stitch(script, pieces, results)
+
+
+def _statement_end(script: str, end: int) -> int:
+    # sqlparse keeps the spaces and line comments following a semicolon with
+    # the statement it ends, but not a bare newline.
+    size = _LOOKAHEAD
+    while True:
+        window = script[end:end + size]
+        position = end
+        for ttype, value in lexer.tokenize(window):
+            if ttype is not T.Whitespace and ttype is not T.Comment.Single:
+                return position
+            position += len(value)
+            if position == end + len(window) and end + size < len(script):
+                # The last token may continue past the window: lex a longer one.
+                break
+        else:
+            return position
+        size *= 4
+
+
+def _cte_pieces(script: str, start: int, stop: int) -> Optional[List[ScriptPiece]]:
+    # Cut "WITH a AS (...), b AS (...) SELECT ..." at its top-level definitions.
+    tokens = lexer.tokenize(script[start:stop])
+    position = start
+    for ttype, value in tokens:
+        position += len(value)
+        if ttype in T.Whitespace or ttype in T.Comment:
+            continue
+        if ttype not in T.Keyword.CTE:
+            return None
+        break
+    else:
+        return None
+
+    definitions: List[Tuple[int, int]] = []
+    definition_start = None
+    definition_stop = None
+    named = False
+    depth = 0
+    for ttype, value in tokens:
+        token_start = position
+        position += len(value)
+        if ttype in T.Whitespace or ttype in T.Comment:
+            continue
+        if definition_start is None:
+            definition_start = token_start
+        if ttype is T.Punctuation and value == "(":
+            depth += 1
+        elif ttype is T.Punctuation and value == ")":
+            depth -= 1
+            if depth == 0 and named:
+                definition_stop = position
+        elif depth == 0 and ttype in T.Keyword and value.upper() == "AS":
+            named = True
+        elif depth == 0 and definition_stop is not None:
+            definitions.append((definition_start, definition_stop))
+            if not (ttype is T.Punctuation and value == ","):
+                break
+            definition_start = definition_stop = None
+            named = False
+    else:
+        return None
+    if len(definitions) < 2:
+        return None
+
+    pieces = [ScriptPiece(start, definitions[0][0], CTE_PREFIX)]
+    for number, (definition_start, definition_stop) in enumerate(definitions):
+        if number:
+            pieces.append(ScriptPiece(pieces[-1].stop, definition_start, CTE_SEPARATOR))
+        pieces.append(ScriptPiece(definition_start, definition_stop, CTE_DEFINITION))
+    pieces.append(ScriptPiece(definitions[-1][1], stop, CTE_TAIL))
+    return pieces
+
+
+def _is_closed(statement) -> bool:
+    # Replay the statement through sqlparse's splitter: it ends at a semicolon
+    # only outside parentheses and BEGIN ... END blocks.
+    splitter = statement_splitter.StatementSplitter()
+    for _ in splitter.process((token.ttype, token.value) for token in statement.flatten()):
+        pass
+    return splitter.consume_ws
+
+
+def _tasks(script: str, pieces: List[ScriptPiece], chunk_size: int) -> Iterator[List[Tuple[str, str]]]:
+    task: List[Tuple[str, str]] = []
+    size = 0
+    for piece in pieces:
+        task.append((piece.role, script[piece.start:piece.stop]))
+        size += piece.stop - piece.start
+        if size >= chunk_size:
+            yield task
+            task = []
+            size = 0
+    if task:
+        yield task
+
+
+class _Assembler:
+    # Collects nodes in document order, in the form QueryTree.from_preorder takes.
+
+    def __init__(self):
+        self.types: List[NodeType] = []
+        self._type_ids: Dict[NodeType, int] = {}
+        self.kinds = array("H")
+        self.flags = bytearray()
+        self.sizes = array("i")
+
+    def group(self, type_name: str, children: int):
+        self.kinds.append(self._type_id(type_name))
+        self.flags.append(2)
+        self.sizes.append(children)
+
+    def tree(self, tree: QueryTree, skip_root: bool = False):
+        remap = [self._type_id(node_type) for node_type in tree.types]
+        counts = self.child_counts(tree)
+        kind, group, keyword, start, stop = tree.kind, tree.group, tree.keyword, tree.start, tree.stop
+        first = 1 if skip_root else 0
+        self.kinds.extend(remap[kind[node]] for node in range(first, len(kind)))
+        self.flags.extend(group[node] << 1 | keyword[node] for node in range(first, len(kind)))
+        self.sizes.extend(counts[node] if group[node] else stop[node] - start[node]
+                          for node in range(first, len(kind)))
+
+    @staticmethod
+    def child_counts(tree: QueryTree) -> List[int]:
+        counts = [0] * len(tree)
+        for parent in tree.parent:
+            if parent >= 0:
+                counts[parent] += 1
+        return counts
+
+    def _type_id(self, node_type: NodeType) -> int:
+        type_id = self._type_ids.get(node_type)
+        if type_id is None:
+            type_id = self._type_ids[node_type] = len(self.types)
+            self.types.append(node_type)
+        return type_id
+
+
+def _stitch(script: str, pieces: List[ScriptPiece], results: List[Tuple[bool, Optional[bytes]]]) -> QueryTree:
+    assembler = _Assembler()
+    index = 0
+    while index < len(pieces):
+        stop = index + 1
+        if pieces[index].role == CTE_PREFIX:
+            while pieces[stop - 1].role != CTE_TAIL:
+                stop += 1
+        closed = results[stop - 1][0]
+        if closed or stop == len(pieces):
+            trees = [load_tree(data) if data is not None else None for _, data in results[index:stop]]
+            if stop - index == 1:
+                if trees[0] is not None:
+                    assembler.tree(trees[0])
+                index = stop
+                continue
+            if _add_cte(assembler, trees):
+                index = stop
+                continue
+        # The pieces do not line up with sqlparse's statements: parse the text
+        # again here, together with what follows, until a statement closes.
+        start = pieces[index].start
+        while True:
+            (closed, data), = parse_pieces([(STATEMENTS, script[start:pieces[stop - 1].stop])])
+            if closed or stop == len(pieces):
+                break
+            stop += 1
+            while pieces[stop - 1].role not in (STATEMENTS, CTE_TAIL):
+                stop += 1
+        if data is not None:
+            assembler.tree(load_tree(data))
+        index = stop
+    if not assembler.kinds:
+        raise ValueError("Failed to parse the query")
+    return QueryTree.from_preorder(assembler.types, script, assembler.kinds,
+                                   assembler.flags, assembler.sizes)
+
+
+def _add_cte(assembler: _Assembler, trees: List[Optional[QueryTree]]) -> bool:
+    # Rebuild the statement sqlparse makes of the whole WITH statement:
+    # Statement[prefix..., IdentifierList[definition, separator..., ...], tail...].
+    if any(tree is None or len(list(tree.roots())) != 1 for tree in trees):
+        return False
+    counts = [_Assembler.child_counts(tree)[0] for tree in trees]
+    for tree in trees[1:-1:2]:
+        children = list(tree.children(0))
+        if len(children) != 1 or tree.type_of(children[0]) != "Identifier":
+            return False
+    assembler.group("Statement", counts[0] + 1 + counts[-1])
+    assembler.tree(trees[0], skip_root=True)
+    assembler.group("IdentifierList", sum(counts[1:-1]))
+    for tree in trees[1:-1]:
+        assembler.tree(tree, skip_root=True)
+    assembler.tree(trees[-1], skip_root=True)
+    return True
@@ -0,0 +1,261 @@
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Hashable, Optional, Tuple
+from instrumentation import emit
+
+if TYPE_CHECKING:
+    from persistent_cache import DiskCache
+
+
+# Rough per-token overhead of a sqlparse Token object, used to size token lists.
+_TOKEN_OVERHEAD = 240
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    entries: int = 0
+    size_bytes: int = 0
+
+
+def query_key(query: str) -> bytes:
+    """
+    Hash the raw text of a query.
+
+    Parameters:
+    query (str): The SQL query.
+
+    Returns:
+    bytes: A 128-bit digest of the query text.
+    """
+    return hashlib.blake2b(query.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+
+def estimate_size(value: Any) -> int:
+    """
+    Estimate the memory held by a cached value.
+
+    Parameters:
+    value (Any): A string, a list of tokens, or a tuple of those.
+
+    Returns:
+    int: The approximate size in bytes.
+    """
+    if isinstance(value, str):
+        return sys.getsizeof(value)
+    if isinstance(value, tuple):
+        return sum(estimate_size(item) for item in value)
+    if isinstance(value, list):
+        size = sys.getsizeof(value)
+        stack = list(value)
+        while stack:
+            item = stack.pop()
+            tokens = getattr(item, "tokens", None)
+            if tokens is not None:
+                stack.extend(tokens)
+                size += _TOKEN_OVERHEAD + sys.getsizeof(tokens)
+            else:
+                size += _TOKEN_OVERHEAD + len(getattr(item, "value", ""))
+        return size
+    return sys.getsizeof(value)
+
+
+class _Tier:
+    def __init__(self):
+        self.entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self.size_bytes = 0
+
+    def pop(self, key: Hashable):
+        _, size = self.entries.pop(key)
+        self.size_bytes -= size
+
+    def pop_oldest(self):
+        _, (_, size) = self.entries.popitem(last=False)
+        self.size_bytes -= size
+
+
+class ParseCache:
+    """
+    Thread-safe LRU cache for parse results, bounded by entries and by bytes.
+
+    Entries are keyed by the kind of result and a hash of the raw query text.
+    """
+
+    def __init__(self, max_entries: int = 4096, max_bytes: int = 64 * 1024 * 1024):
+        """
+        Initialize the ParseCache.
+
+        Parameters:
+        max_entries (int): Maximum number of entries; 0 disables caching.
+        max_bytes (int): Maximum estimated memory held by the entries.
+
+        Raises:
+        ValueError: If a limit is negative.
+        """
+        self._lock = threading.Lock()
+        self._raw = _Tier()
+        self._stats = CacheStats()
+        self.max_entries = 0
+        self.max_bytes = 0
+        self.configure(max_entries, max_bytes)
+
+    def configure(self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None):
+        """
+        Change the cache limits, evicting entries that no longer fit.
+
+        Parameters:
+        max_entries (Optional[int]): New entry limit, or None to keep the current one.
+        max_bytes (Optional[int]): New memory limit, or None to keep the current one.
+
+        Raises:
+        ValueError: If a limit is negative.
+        """
+        if (max_entries is not None and max_entries < 0) or (max_bytes is not None and max_bytes < 0):
+            raise ValueError("Cache limits must be non-negative")
+        with self._lock:
+            if max_entries is not None:
+                self.max_entries = max_entries
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            self._evict(self._raw)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def get(self, kind: str, query: str, default: Any = None) -> Any:
+        """
+        Look up a result for the raw query text.
+
+        Parameters:
+        kind (str): The kind of result, e.g. "parse" or "normalize".
+        query (str): The SQL query.
+        default (Any): Value returned on a miss.
+
+        Returns:
+        Any: The cached result, or default.
+        """
+        return self._get(self._raw, (kind, query_key(query)), default)
+
+    def put(self, kind: str, query: str, value: Any):
+        """
+        Store a result for the raw query text.
+
+        Parameters:
+        kind (str): The kind of result, e.g. "parse" or "normalize".
+        query (str): The SQL query.
+        value (Any): The result to store.
+        """
+        self._put(self._raw, (kind, query_key(query)), value)
+
+    def discard(self, query: str):
+        """
+        Drop every result cached for a query.
+
+        Parameters:
+        query (str): The SQL query.
+        """
+        digest = query_key(query)
+        with self._lock:
+            for key in [key for key in self._raw.entries if key[1] == digest]:
+                self._raw.pop(key)
+
+    def clear(self):
+        """
+        Drop all entries and reset the counters.
+        """
+        with self._lock:
+            self._raw = _Tier()
+            self._stats = CacheStats()
+
+    def stats(self) -> CacheStats:
+        """
+        Snapshot the cache counters.
+
+        Returns:
+        CacheStats: Hits, misses and evictions, plus the
+        current number of entries and their estimated size.
+        """
+        with self._lock:
+            return CacheStats(
+                hits=self._stats.hits,
+                misses=self._stats.misses,
+                evictions=self._stats.evictions,
+                entries=len(self._raw.entries),
+                size_bytes=self._raw.size_bytes,
+            )
+
+    def _get(self, tier: _Tier, key: Hashable, default: Any) -> Any:
+        with self._lock:
+            entry = tier.entries.get(key)
+            if entry is None:
+                self._stats.misses += 1
+            else:
+                tier.entries.move_to_end(key)
+                self._stats.hits += 1
+        emit("cache_misses" if entry is None else "cache_hits", cache=key[0], tier="raw")
+        return default if entry is None else entry[0]
+
+    def _put(self, tier: _Tier, key: Hashable, value: Any):
+        if not self.enabled:
+            return
+        size = estimate_size(value)
+        with self._lock:
+            if key in tier.entries:
+                tier.pop(key)
+            if size > self.max_bytes:
+                return
+            tier.entries[key] = (value, size)
+            tier.size_bytes += size
+            self._evict(tier)
+
+    def _evict(self, tier: _Tier):
+        while tier.entries and (len(tier.entries) > self.max_entries or tier.size_bytes > self.max_bytes):
+            tier.pop_oldest()
+            self._stats.evictions += 1
+
+
+parse_cache = ParseCache()
+
+
+def configure_cache(max_entries: Optional[int] = None, max_bytes: Optional[int] = None):
+    """
+    Configure the process-wide parse cache.
+
+    Parameters:
+    max_entries (Optional[int]): Maximum number of entries; 0 disables caching.
+    max_bytes (Optional[int]): Maximum estimated memory held by the entries.
+    """
+    parse_cache.configure(max_entries, max_bytes)
+
+
+# The persistent cache consulted behind this one, if any. It is registered by
+# persistent_cache.configure_disk_cache, so sqlite3 is only imported by
+# callers that want it.
+_disk_cache: Optional["DiskCache"] = None
+
+
+def set_disk_cache(cache: Optional["DiskCache"]):
+    """
+    Register the persistent cache that parsing consults on a miss.
+
+    Parameters:
+    cache (Optional[DiskCache]): The cache, or None to stop using one.
+    """
+    global _disk_cache
+    _disk_cache = cache
+
+
+def disk_cache() -> Optional["DiskCache"]:
+    """
+    Return the registered persistent cache.
+
+    Returns:
+    Optional[DiskCache]: The cache, or None if none is configured.
+    """
+    return _disk_cache
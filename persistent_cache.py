@@ -0,0 +1,235 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+import sqlparse
+from instrumentation import emit
+from parse_cache import CacheStats, query_key, set_disk_cache
+
+
+# Bump when the normalization options or the stored tree format change.
+FORMAT_VERSION = 1
+PARSER_VERSION = f"sqlparse-{sqlparse.__version__}/format-{FORMAT_VERSION}"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    digest BLOB NOT NULL,
+    kind TEXT NOT NULL,
+    version TEXT NOT NULL,
+    text TEXT,
+    tree BLOB,
+    size INTEGER NOT NULL,
+    used REAL NOT NULL,
+    PRIMARY KEY (digest, kind, version)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_used ON entries (used);
+CREATE TABLE IF NOT EXISTS totals (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    entries INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+    UPDATE totals SET entries = entries + 1, size = size + new.size;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+    UPDATE totals SET entries = entries - 1, size = size - old.size;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF size ON entries BEGIN
+    UPDATE totals SET size = size + new.size - old.size;
+END;
+INSERT OR IGNORE INTO totals (id, entries, size)
+    SELECT 0, COUNT(*), COALESCE(SUM(size), 0) FROM entries WHERE NOT EXISTS (SELECT 1 FROM totals);
+"""
+
+# Entries read within this many seconds are not re-stamped, to keep reads from writing.
+_TOUCH_INTERVAL = 60.0
+
+
+class DiskCache:
+    """
+    Persistent parse cache in a SQLite database shared by processes and restarts.
+
+    Entries are keyed by the kind of result, a hash of the query text and the
+    parser version stamp, so results written by another sqlparse version or
+    tree format are never returned. The database runs in WAL mode, so readers
+    do not block the writer, and each thread and process uses its own
+    connection. Triggers keep the number and total size of the entries in a
+    one-row table, so a write does not have to scan the database; when the
+    stored size exceeds max_bytes, the least recently used entries are
+    deleted.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024, version: str = PARSER_VERSION,
+                 timeout: float = 30.0):
+        """
+        Initialize the DiskCache, creating the database if needed.
+
+        Parameters:
+        path (str): Path of the SQLite database file.
+        max_bytes (int): Maximum total size of the stored results.
+        version (str): Version stamp that entries must match to be returned.
+        timeout (float): Seconds to wait for a lock held by another process.
+
+        Raises:
+        ValueError: If max_bytes is negative.
+        """
+        if max_bytes < 0:
+            raise ValueError("Cache limits must be non-negative")
+        self.path = str(path)
+        self.max_bytes = max_bytes
+        self.version = version
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+        connection = self._connection()
+        with connection:
+            connection.execute("DELETE FROM entries WHERE version != ?", (version,))
+
+    def get(self, kind: str, query: str) -> Optional[Tuple[Optional[str], Optional[bytes]]]:
+        """
+        Look up a stored result.
+
+        Parameters:
+        kind (str): The kind of result, e.g. "normalize" or "process".
+        query (str): The SQL query.
+
+        Returns:
+        Optional[Tuple[Optional[str], Optional[bytes]]]: The stored text and
+        encoded tree, or None on a miss.
+        """
+        key = (query_key(query), kind, self.version)
+        try:
+            connection = self._connection()
+            row = connection.execute(
+                "SELECT text, tree, used FROM entries WHERE digest = ? AND kind = ? AND version = ?", key).fetchone()
+            if row is not None and time.time() - row[2] > _TOUCH_INTERVAL:
+                with connection:
+                    connection.execute(
+                        "UPDATE entries SET used = ? WHERE digest = ? AND kind = ? AND version = ?",
+                        (time.time(),) + key)
+        except sqlite3.Error:
+            # A busy or damaged cache must not break parsing.
+            row = None
+        with self._lock:
+            if row is None:
+                self._stats.misses += 1
+            else:
+                self._stats.hits += 1
+        emit("cache_misses" if row is None else "cache_hits", cache=kind, tier="disk")
+        return None if row is None else (row[0], row[1])
+
+    def put(self, kind: str, query: str, text: Optional[str] = None, tree: Optional[bytes] = None):
+        """
+        Store a result, evicting the least recently used entries if over budget.
+
+        Parameters:
+        kind (str): The kind of result.
+        query (str): The SQL query.
+        text (Optional[str]): Text part of the result, e.g. the normalized query.
+        tree (Optional[bytes]): Encoded tree part of the result.
+        """
+        size = len(text.encode("utf-8", "surrogatepass")) if text is not None else 0
+        size += len(tree) if tree is not None else 0
+        if size > self.max_bytes:
+            return
+        try:
+            connection = self._connection()
+            with connection:
+                # An upsert rather than INSERT OR REPLACE, whose deletes skip the triggers.
+                connection.execute(
+                    "INSERT INTO entries (digest, kind, version, text, tree, size, used) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (digest, kind, version) DO UPDATE SET "
+                    "text = excluded.text, tree = excluded.tree, size = excluded.size, used = excluded.used",
+                    (query_key(query), kind, self.version, text, tree, size, time.time()))
+                total = connection.execute("SELECT size FROM totals").fetchone()[0]
+                if total > self.max_bytes:
+                    self._evict(connection, total)
+        except sqlite3.Error:
+            pass
+
+    def clear(self):
+        """
+        Delete every entry and reset the counters.
+        """
+        connection = self._connection()
+        with connection:
+            connection.execute("DELETE FROM entries")
+        with self._lock:
+            self._stats = CacheStats()
+
+    def stats(self) -> CacheStats:
+        """
+        Snapshot the counters of this process and the size of the database.
+
+        Returns:
+        CacheStats: Hits, misses and evictions seen by this process, plus the
+        number of stored entries and their total size.
+        """
+        entries, size = self._connection().execute("SELECT entries, size FROM totals").fetchone()
+        with self._lock:
+            return CacheStats(hits=self._stats.hits, misses=self._stats.misses,
+                              evictions=self._stats.evictions, entries=entries, size_bytes=size)
+
+    def close(self):
+        """
+        Close the connection of the calling thread.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def _connection(self) -> sqlite3.Connection:
+        local = self._local
+        # Connections must not cross a fork, so they are tied to the process id.
+        if getattr(local, "connection", None) is None or local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.isolation_level = "DEFERRED"
+            connection.executescript(f"BEGIN IMMEDIATE; {_SCHEMA} COMMIT;")
+            local.connection = connection
+            local.pid = os.getpid()
+        return local.connection
+
+    def _evict(self, connection: sqlite3.Connection, total: int):
+        while total > self.max_bytes:
+            rows = connection.execute(
+                "SELECT digest, kind, version, size FROM entries ORDER BY used LIMIT 64").fetchall()
+            if not rows:
+                return
+            for digest, kind, version, size in rows:
+                connection.execute(
+                    "DELETE FROM entries WHERE digest = ? AND kind = ? AND version = ?", (digest, kind, version))
+                total -= size
+                with self._lock:
+                    self._stats.evictions += 1
+                if total <= self.max_bytes:
+                    return
+
+
+disk_cache: Optional[DiskCache] = None
+
+
+def configure_disk_cache(path: Optional[str] = None, max_bytes: int = 256 * 1024 * 1024) -> Optional[DiskCache]:
+    """
+    Enable the process-wide persistent cache, or disable it when path is None.
+
+    The cache is registered with parse_cache.set_disk_cache, which is where
+    QueryProcessor looks it up.
+
+    Parameters:
+    path (Optional[str]): Path of the SQLite database file shared by workers.
+    max_bytes (int): Maximum total size of the stored results.
+
+    Returns:
+    Optional[DiskCache]: The cache now in use.
+    """
+    global disk_cache
+    if disk_cache is not None:
+        disk_cache.close()
+    disk_cache = DiskCache(path, max_bytes=max_bytes) if path is not None else None
+    set_disk_cache(disk_cache)
+    return disk_cache
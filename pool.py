@@ -0,0 +1,130 @@
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Generic, Iterator, NamedTuple, Optional, TypeVar
+
+
+Item = TypeVar("Item")
+
+
+class PoolStats(NamedTuple):
+    """
+    Counters of an ObjectPool.
+
+    Attributes:
+    created (int): Objects built by the factory because none was idle.
+    reused (int): Acquisitions served by an idle object.
+    contended (int): Acquisitions or releases that had to wait for the pool's lock.
+    idle (int): Objects currently waiting in the pool.
+    """
+    created: int
+    reused: int
+    contended: int
+    idle: int
+
+
+class ObjectPool(Generic[Item]):
+    """
+    Thread-safe pool of reusable objects.
+
+    An object is used by one thread at a time: acquire takes an idle one or
+    builds a new one, and release resets it and keeps it for the next caller,
+    up to max_idle objects. The pool never blocks waiting for an object.
+    """
+
+    def __init__(self, factory: Callable[[], Item], reset: Optional[Callable[[Item], None]] = None,
+                 max_idle: int = 16):
+        """
+        Initialize the ObjectPool.
+
+        Parameters:
+        factory (Callable[[], Item]): Builds a new object.
+        reset (Optional[Callable[[Item], None]]): Clears an object's state on release.
+        max_idle (int): Maximum number of idle objects kept; extra ones are dropped.
+
+        Raises:
+        ValueError: If max_idle is negative.
+        """
+        if max_idle < 0:
+            raise ValueError("max_idle must not be negative")
+        self._factory = factory
+        self._reset = reset
+        self.max_idle = max_idle
+        self._idle: deque = deque()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._reused = 0
+        self._contended = 0
+
+    def _enter(self):
+        # Counts the times another thread held the lock, as a measure of contention.
+        if self._lock.acquire(blocking=False):
+            return
+        self._lock.acquire()
+        self._contended += 1
+
+    def acquire(self) -> Item:
+        """
+        Take an idle object, or build one if none is idle.
+
+        Returns:
+        Item: An object for the caller's exclusive use until it is released.
+        """
+        self._enter()
+        try:
+            if self._idle:
+                self._reused += 1
+                return self._idle.pop()
+            self._created += 1
+        finally:
+            self._lock.release()
+        return self._factory()
+
+    def release(self, item: Item):
+        """
+        Reset an object and return it to the pool.
+
+        Parameters:
+        item (Item): An object obtained from acquire.
+        """
+        if self._reset is not None:
+            self._reset(item)
+        self._enter()
+        try:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(item)
+        finally:
+            self._lock.release()
+
+    @contextmanager
+    def borrow(self) -> Iterator[Item]:
+        """
+        Acquire an object for the duration of a with block.
+
+        An object whose block raised is dropped instead of returned, since
+        its state may be inconsistent.
+
+        Returns:
+        Iterator[Item]: Yields the object.
+        """
+        item = self.acquire()
+        yield item
+        self.release(item)
+
+    def stats(self) -> PoolStats:
+        """
+        Return the pool's counters.
+
+        Returns:
+        PoolStats: Counts since the pool was built or last cleared.
+        """
+        with self._lock:
+            return PoolStats(self._created, self._reused, self._contended, len(self._idle))
+
+    def clear(self):
+        """
+        Drop the idle objects and reset the counters.
+        """
+        with self._lock:
+            self._idle.clear()
+            self._created = self._reused = self._contended = 0
@@ -1,6 +1,34 @@
+import re
 import sqlparse
-from sqlparse.sql import Token
-from typing import List
+from sqlparse import engine, filters, formatter, lexer
+from sqlparse import tokens as T
+from sqlparse.sql import Token, TokenList, Where
+from typing import List, Optional, Tuple
+from parse_cache import disk_cache as _disk_cache, parse_cache
+from instrumentation import stage
+from pool import ObjectPool
+
+
+_NORMALIZE_OPTIONS = dict(reindent=True, keyword_case='upper', strip_whitespace=True)
+_WHITESPACE_PIECES = re.compile(r'\r\n|\r|\n|\s')
+_SERIALIZER = filters.SerializerUnicode()
+
+
+def _new_format_stack() -> engine.FilterStack:
+    return formatter.build_filter_stack(engine.FilterStack(), formatter.validate_options(dict(_NORMALIZE_OPTIONS)))
+
+
+def _reset_format_stack(stack: engine.FilterStack):
+    # The reindent filter remembers the previous statement to separate the next
+    # one from it; forgetting it also lets the idle stack drop the tree.
+    for stmt_filter in stack.stmtprocess:
+        if hasattr(stmt_filter, "_last_stmt"):
+            stmt_filter._last_stmt = None
+            stmt_filter._curr_stmt = None
+
+
+# Filter stacks are stateful while they run, so each thread borrows its own.
+format_stacks: ObjectPool[engine.FilterStack] = ObjectPool(_new_format_stack, reset=_reset_format_stack)
 
 
 class QueryProcessor:
@@ -22,31 +50,285 @@ class QueryProcessor:
         """
         Normalize the SQL query.
 
+        Results are shared through the process-wide parse cache and, when one
+        is configured, the persistent cache.
+
         Returns:
         str: The normalized SQL query.
 
         Raises:
         ValueError: If there's an error during normalization.
         """
-        try:
-            return sqlparse.format(self.query, reindent=True, keyword_case='upper', strip_whitespace=True)
-        except Exception as e:
-            raise ValueError(f"Error while normalizing the query: {e}")
+        normalized = parse_cache.get("normalize", self.query)
+        if normalized is not None:
+            return normalized
+        disk_cache = _disk_cache()
+        stored = disk_cache.get("normalize", self.query) if disk_cache is not None else None
+        if stored is not None and stored[0] is not None:
+            normalized = stored[0]
+        else:
+            try:
+                with stage("normalize"):
+                    normalized = sqlparse.format(self.query, **_NORMALIZE_OPTIONS)
+            except Exception as e:
+                raise ValueError(f"Error while normalizing the query: {e}")
+            if disk_cache is not None:
+                disk_cache.put("normalize", self.query, text=normalized)
+        parse_cache.put("normalize", self.query, normalized)
+        return normalized
 
     def parse_query(self) -> List[Token]:
         """
         Parse the SQL query.
 
+        Results are shared through the process-wide parse cache, so the
+        returned tokens must be treated as read-only. Trees loaded from the
+        persistent cache are rebuilt without running sqlparse.
+
         Returns:
         List[Token]: A list of tokens obtained from parsing the query.
 
         Raises:
         ValueError: If there's an error during parsing or if the query is empty.
         """
+        tokens = parse_cache.get("parse", self.query)
+        if tokens is not None:
+            return tokens
+        tokens = _load_tree("parse", self.query)
+        if tokens is None:
+            try:
+                with stage("parse"):
+                    parsed = sqlparse.parse(self.query)
+                if not parsed:
+                    raise ValueError("Failed to parse the query")
+                tokens = parsed[0].tokens
+            except Exception as e:
+                raise ValueError(f"Error while parsing the query: {e}")
+            _store_tree("parse", self.query, None, tokens, self.query)
+        parse_cache.put("parse", self.query, tokens)
+        return tokens
+
+    def lex_query(self) -> List[Token]:
+        """
+        Split the SQL query into its lexical tokens, without grouping them.
+
+        This skips sqlparse's grouping pass, the most expensive part of
+        parsing; the tokens are the leaves parse_query would produce.
+
+        Returns:
+        List[Token]: The leaf tokens of the query, in order.
+
+        Raises:
+        ValueError: If there's an error during lexing.
+        """
+        tokens = parse_cache.get("lex", self.query)
+        if tokens is not None:
+            return tokens
+        try:
+            with stage("lex"):
+                tokens = [Token(ttype, value) for ttype, value in lexer.tokenize(self.query)]
+        except Exception as e:
+            raise ValueError(f"Error while lexing the query: {e}")
+        parse_cache.put("lex", self.query, tokens)
+        return tokens
+
+    def process_query(self) -> Tuple[str, List[Token]]:
+        """
+        Normalize and parse the SQL query in a single lexing pass.
+
+        The query is lexed and grouped once; keyword upper-casing, whitespace
+        stripping and reindenting are applied to that token stream, and the
+        resulting statement serves both as the normalized text and as the tree.
+        The tree matches what parse_query would return for the normalized text;
+        statements with comments are parsed again from the normalized text.
+
+        Returns:
+        Tuple[str, List[Token]]: The normalized SQL query and the tokens of its
+        first statement.
+
+        Raises:
+        ValueError: If there's an error during normalization or parsing.
+        """
+        result = parse_cache.get("process", self.query)
+        if result is None:
+            result = _load_processed(self.query)
+            if result is None:
+                with stage("process_query"):
+                    result = self._process_query()
+                _store_tree("process", self.query, result[0], result[1], result[0])
+            parse_cache.put("process", self.query, result)
+            parse_cache.put("normalize", self.query, result[0])
+        return result
+
+    def _process_query(self) -> Tuple[str, List[Token]]:
         try:
-            parsed = sqlparse.parse(self.query)
-            if not parsed:
-                raise ValueError("Failed to parse the query")
-            return parsed[0].tokens
+            with format_stacks.borrow() as stack:
+                statements = list(stack.run(self.query))
+            texts = [_SERIALIZER.process(stmt) for stmt in statements]
         except Exception as e:
-            raise ValueError(f"Error while parsing the query: {e}")
+            raise ValueError(f"Error while normalizing the query: {e}")
+        if not statements:
+            raise ValueError("Error while parsing the query: Failed to parse the query")
+
+        normalized = "".join(texts)
+        if not _align_with_text(statements[0], texts[0]):
+            # The filters left the tree in a shape that no longer matches its
+            # serialized text; fall back to parsing the normalized query.
+            return normalized, QueryProcessor(normalized).parse_query()
+        return normalized, statements[0].tokens
+
+
+def _load_tree(kind: str, query: str) -> Optional[List[Token]]:
+    disk_cache = _disk_cache()
+    stored = disk_cache.get(kind, query) if disk_cache is not None else None
+    if stored is None or stored[1] is None:
+        return None
+    import serialization
+    try:
+        return serialization.load_tree(stored[1]).to_tokens()
+    except ValueError:
+        return None
+
+
+def _load_processed(query: str) -> Optional[Tuple[str, List[Token]]]:
+    disk_cache = _disk_cache()
+    stored = disk_cache.get("process", query) if disk_cache is not None else None
+    if stored is None or stored[0] is None or stored[1] is None:
+        return None
+    import serialization
+    try:
+        tree = serialization.load_tree(stored[1])
+    except ValueError:
+        return None
+    if not stored[0].startswith(tree.source):
+        return None
+    return stored[0], tree.to_tokens()
+
+
+def _store_tree(kind: str, query: str, text: Optional[str], tokens: List[Token], source: str):
+    disk_cache = _disk_cache()
+    if disk_cache is None or not tokens:
+        return
+    import serialization
+    from query_tree import QueryTree
+    try:
+        tree = QueryTree(tokens, source)
+    except ValueError:
+        return
+    disk_cache.put(kind, query, text=text, tree=serialization.dump_tree(tree))
+
+
+def _align_with_text(statement: TokenList, text: str) -> bool:
+    """
+    Rewrite a filtered statement so it lexes the same way as its serialized text.
+
+    Whitespace inserted by the reindent filter is split into the single
+    newline/whitespace tokens the lexer produces, emptied tokens and whitespace
+    trailing a line are dropped, whitespace is moved across group boundaries
+    to where the grouper puts it, and group values are recomputed bottom-up.
+
+    Parameters:
+    statement (TokenList): A statement that went through the format filters.
+    text (str): The serialized text of that statement.
+
+    Returns:
+    bool: True if the rewritten tree spells out exactly the given text; False
+    if it does not or if the statement holds comments, whose placement is not
+    reproduced.
+    """
+    groups = []
+    leaves = []
+    stack = [statement]
+    while stack:
+        group = stack.pop()
+        groups.append(group)
+        rewritten = []
+        for token in group.tokens:
+            if isinstance(token, TokenList):
+                stack.append(token)
+                rewritten.append(token)
+            elif token.is_whitespace:
+                for piece in _WHITESPACE_PIECES.findall(token.value):
+                    ttype = T.Newline if piece in ('\r\n', '\r', '\n') else T.Whitespace
+                    rewritten.append(Token(ttype, piece))
+                    rewritten[-1].parent = group
+            else:
+                rewritten.append(token)
+        group.tokens[:] = rewritten
+
+    iterators = [iter(statement.tokens)]
+    while iterators:
+        token = next(iterators[-1], None)
+        if token is None:
+            iterators.pop()
+        elif isinstance(token, TokenList):
+            iterators.append(iter(token.tokens))
+        elif token.ttype in T.Comment:
+            # Comments are grouped with the line breaks around them and then
+            # attached to neighbouring groups; rather than replay that, let
+            # the caller parse the text.
+            return False
+        else:
+            leaves.append(token)
+
+    # Serialization strips whitespace at the end of every line.
+    dropped = set()
+    trailing = []
+    for token in leaves:
+        if token.ttype is T.Whitespace:
+            trailing.append(id(token))
+            continue
+        if token.ttype is T.Newline:
+            dropped.update(trailing)
+        trailing = []
+    dropped.update(trailing)
+
+    # Children come before their parents here, so whitespace moved out of a
+    # group can move on out of its parent.
+    for group in reversed(groups):
+        if dropped:
+            group.tokens[:] = [token for token in group.tokens if id(token) not in dropped]
+        if group is not statement:
+            _hoist_leading_whitespace(group)
+        _extend_where_clauses(group)
+        group.value = "".join(token.value for token in group.tokens)
+        group.normalized = group.value
+    return statement.value == text
+
+
+def _hoist_leading_whitespace(group: TokenList):
+    # Reindenting inserts line breaks before the first token of groups such as
+    # Where, but sqlparse never starts a group with whitespace: the lexer and
+    # grouper would leave the break in the parent, before the group.
+    count = 0
+    while count < len(group.tokens) and group.tokens[count].is_whitespace:
+        count += 1
+    if not count or count == len(group.tokens):
+        return
+    parent = group.parent
+    position = next(index for index, token in enumerate(parent.tokens) if token is group)
+    for token in group.tokens[:count]:
+        token.parent = parent
+    parent.tokens[position:position] = group.tokens[:count]
+    del group.tokens[:count]
+
+
+def _extend_where_clauses(group: TokenList):
+    # The grouper extends a Where clause up to the keyword that closes it, such
+    # as ORDER BY, so the line break reindenting puts before that keyword
+    # belongs to the Where.
+    tokens = group.tokens
+    for index, token in enumerate(tokens):
+        if not isinstance(token, Where):
+            continue
+        stop = index + 1
+        while stop < len(tokens) and tokens[stop].is_whitespace:
+            stop += 1
+        if stop == index + 1:
+            continue
+        for moved in tokens[index + 1:stop]:
+            moved.parent = token
+        token.tokens.extend(tokens[index + 1:stop])
+        del tokens[index + 1:stop]
+        token.value = "".join(child.value for child in token.tokens)
+        token.normalized = token.value
@@ -0,0 +1,479 @@
+from array import array
+from collections.abc import Mapping, Sequence
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+from sqlparse import sql
+from sqlparse.sql import Token
+from sqlparse.tokens import _TokenType
+
+
+NodeType = Union[str, _TokenType]
+
+
+class QueryTree:
+    """
+    Compact, columnar representation of a sqlparse token tree.
+
+    Nodes are numbered in document (pre-order) order and described by parallel
+    arrays, so the subtree of node i is the contiguous range [i, end[i]).
+    Token text is not copied: every node is a (start, stop) span into one
+    shared source string, and values are sliced out only when asked for.
+
+    Attributes:
+    source (str): The text the tree spells out, possibly followed by more text.
+    text_length (int): Length of the prefix of source spelled out by the tree.
+    types (List[NodeType]): Type table; group class names and leaf token types.
+    kind (array): Index into the type table for each node.
+    parent (array): Parent node of each node, or -1 for top-level nodes.
+    first_child (array): First child of each node, or -1.
+    next_sibling (array): Next sibling of each node, or -1.
+    end (array): One past the last node of each node's subtree.
+    start (array): Offset in source where each node's text starts.
+    stop (array): Offset in source where each node's text ends.
+    group (bytearray): 1 for group nodes, 0 for leaves.
+    keyword (bytearray): 1 for leaves whose normalized form is upper-cased.
+    """
+
+    def __init__(self, tokens: List[Token], source: Optional[str] = None):
+        """
+        Build the compact tree from sqlparse tokens.
+
+        Parameters:
+        tokens (List[Token]): The top-level tokens of the tree.
+        source (Optional[str]): Text that starts with the concatenated token
+            values, e.g. the query the tokens were parsed from. If None, the
+            token values are joined into a new string.
+
+        Raises:
+        ValueError: If the tokens list is empty or not a list, or if source
+            does not spell out the tokens.
+        """
+        if not isinstance(tokens, list) or not tokens:
+            raise ValueError("Tokens must be a non-empty list")
+
+        self._init_columns([])
+        type_ids: Dict[NodeType, int] = {}
+        pieces: Optional[List[str]] = [] if source is None else None
+        position = 0
+        # Each frame holds the children iterator, the parent node and its last child so far.
+        stack = [[iter(tokens), -1, -1]]
+        while stack:
+            frame = stack[-1]
+            for token in frame[0]:
+                node = len(self.kind)
+                type_key = type(token).__name__ if token.is_group else token.ttype
+                type_id = type_ids.get(type_key)
+                if type_id is None:
+                    type_id = type_ids[type_key] = len(self.types)
+                    self.types.append(type_key)
+                self.kind.append(type_id)
+                self.parent.append(frame[1])
+                self.first_child.append(-1)
+                self.next_sibling.append(-1)
+                self.end.append(node + 1)
+                self.start.append(position)
+                if frame[2] >= 0:
+                    self.next_sibling[frame[2]] = node
+                elif frame[1] >= 0:
+                    self.first_child[frame[1]] = node
+                frame[2] = node
+                if token.is_group:
+                    self.stop.append(position)
+                    self.group.append(1)
+                    self.keyword.append(0)
+                    stack.append([iter(token.tokens), node, -1])
+                    break
+                value = token.value
+                if pieces is not None:
+                    pieces.append(value)
+                elif not source.startswith(value, position):
+                    raise ValueError("Source text does not match the tokens")
+                position += len(value)
+                self.stop.append(position)
+                self.group.append(0)
+                self.keyword.append(token.normalized != value)
+            else:
+                stack.pop()
+                if frame[1] >= 0:
+                    self.end[frame[1]] = len(self.kind)
+                    self.stop[frame[1]] = position
+        self.source: str = "".join(pieces) if pieces is not None else source
+        self.text_length = position
+
+    def _init_columns(self, types: List[NodeType]):
+        self.types: List[NodeType] = types
+        self.kind = array("H")
+        self.parent = array("i")
+        self.first_child = array("i")
+        self.next_sibling = array("i")
+        self.end = array("i")
+        self.start = array("i")
+        self.stop = array("i")
+        self.group = bytearray()
+        self.keyword = bytearray()
+        self.first_root = 0
+
+    @classmethod
+    def from_preorder(cls, types: List[NodeType], source: str, kinds: Sequence[int],
+                      flags: Sequence[int], sizes: Sequence[int]) -> "QueryTree":
+        """
+        Rebuild a tree from its nodes listed in document order, e.g. when deserializing.
+
+        Parameters:
+        types (List[NodeType]): The type table.
+        source (str): Text that starts with the text spelled out by the tree.
+        kinds (Sequence[int]): The type id of each node.
+        flags (Sequence[int]): 2 for groups, 1 for upper-cased keyword leaves, else 0.
+        sizes (Sequence[int]): The number of children of a group or the text
+            length of a leaf.
+
+        Returns:
+        QueryTree: The rebuilt tree.
+
+        Raises:
+        ValueError: If the nodes do not describe a complete tree over source.
+        """
+        count = len(kinds)
+        if not count or len(flags) != count or len(sizes) != count:
+            raise ValueError("Serialized tree is incomplete")
+        if max(kinds) >= len(types) or min(sizes) < 0:
+            raise ValueError("Invalid node in serialized tree")
+        tree = cls.__new__(cls)
+        tree._init_columns(types)
+        tree.kind = array("H", kinds)
+        tree.group = bytearray(flag >> 1 for flag in flags)
+        tree.keyword = bytearray(flag & 1 for flag in flags)
+        parent = tree.parent = array("i", [-1]) * count
+        first_child = tree.first_child = array("i", [-1]) * count
+        next_sibling = tree.next_sibling = array("i", [-1]) * count
+        end = tree.end = array("i", range(1, count + 1))
+        start = tree.start = array("i", bytes(4 * count))
+        stop = tree.stop = array("i", bytes(4 * count))
+        # Each frame holds a group node, its children still to come and its last child so far.
+        stack = []
+        last_root = -1
+        position = 0
+        for node in range(count):
+            start[node] = position
+            if stack:
+                frame = stack[-1]
+                parent[node] = frame[0]
+                if frame[2] >= 0:
+                    next_sibling[frame[2]] = node
+                else:
+                    first_child[frame[0]] = node
+                frame[1] -= 1
+                frame[2] = node
+            else:
+                if last_root >= 0:
+                    next_sibling[last_root] = node
+                last_root = node
+            if flags[node] & 2:
+                stack.append([node, sizes[node], -1])
+            else:
+                position += sizes[node]
+            stop[node] = position
+            while stack and stack[-1][1] == 0:
+                finished = stack.pop()[0]
+                end[finished] = node + 1
+                stop[finished] = position
+        if stack or position > len(source):
+            raise ValueError("Serialized tree is incomplete")
+        tree.source = source
+        tree.text_length = position
+        return tree
+
+    def __len__(self) -> int:
+        return len(self.kind)
+
+    def roots(self) -> Iterator[int]:
+        """
+        Iterate over the top-level nodes.
+
+        Returns:
+        Iterator[int]: The top-level node indices, in order.
+        """
+        node = self.first_root if len(self.kind) else -1
+        while node >= 0:
+            yield node
+            node = self.next_sibling[node]
+
+    def children(self, node: int) -> Iterator[int]:
+        """
+        Iterate over the children of a node.
+
+        Parameters:
+        node (int): The node index.
+
+        Returns:
+        Iterator[int]: The child node indices, in order.
+        """
+        child = self.first_child[node]
+        while child >= 0:
+            yield child
+            child = self.next_sibling[child]
+
+    def type_of(self, node: int) -> NodeType:
+        return self.types[self.kind[node]]
+
+    def is_group(self, node: int) -> bool:
+        return self.group[node] == 1
+
+    def span(self, node: int) -> Tuple[int, int]:
+        """
+        Return the offsets of a node's text in the source.
+
+        Parameters:
+        node (int): The node index.
+
+        Returns:
+        Tuple[int, int]: The start and stop offsets.
+        """
+        return self.start[node], self.stop[node]
+
+    def text(self, node: int) -> str:
+        """
+        Return the raw text covered by a node.
+
+        Parameters:
+        node (int): The node index.
+
+        Returns:
+        str: The slice of the source spanned by the node.
+        """
+        return self.source[self.start[node]:self.stop[node]]
+
+    def value(self, node: int) -> str:
+        """
+        Return the value reported for a node in the dict form.
+
+        Parameters:
+        node (int): The node index.
+
+        Returns:
+        str: The normalized text of a leaf, or the raw text of a group.
+        """
+        value = self.source[self.start[node]:self.stop[node]]
+        return value.upper() if self.keyword[node] else value
+
+    def find_tokens(self, token_type: NodeType) -> List[int]:
+        """
+        Find all nodes of a given type.
+
+        Parameters:
+        token_type (NodeType): A group class name such as "Identifier", or a
+            sqlparse token type; leaf types match their sub-types as well.
+
+        Returns:
+        List[int]: The matching node indices, in document order.
+        """
+        if isinstance(token_type, str):
+            matching = {i for i, node_type in enumerate(self.types) if node_type == token_type}
+        else:
+            matching = {i for i, node_type in enumerate(self.types)
+                        if isinstance(node_type, _TokenType) and node_type in token_type}
+        if not matching:
+            return []
+        return [node for node, type_id in enumerate(self.kind) if type_id in matching]
+
+    def get_depth(self) -> int:
+        """
+        Calculate the maximum depth of the tree; top-level nodes have depth 1.
+
+        Returns:
+        int: The depth of the deepest node, or 0 for an empty tree.
+        """
+        depth = array("i", bytes(4 * len(self.kind)))
+        deepest = 0
+        for node, parent in enumerate(self.parent):
+            # Parents precede their children in pre-order.
+            depth[node] = 1 if parent < 0 else depth[parent] + 1
+            if depth[node] > deepest:
+                deepest = depth[node]
+        return deepest
+
+    def count_nodes(self) -> int:
+        """
+        Count the nodes of the tree.
+
+        Returns:
+        int: The number of tokens and groups in the tree.
+        """
+        return len(self.kind)
+
+    def to_tokens(self) -> List[Token]:
+        """
+        Rebuild sqlparse tokens from the compact tree without lexing or grouping.
+
+        Groups are rebuilt as instances of the sqlparse.sql class they were
+        recorded with, so their values are the full text of their leaves.
+
+        Returns:
+        List[Token]: The top-level tokens.
+        """
+        kind, group, types = self.kind, self.group, self.types
+        classes = [getattr(sql, node_type, sql.TokenList) if isinstance(node_type, str) else None
+                   for node_type in types]
+        built: List[Optional[Token]] = [None] * len(kind)
+        # Children come after their parent in pre-order, so build back to front.
+        for node in range(len(kind) - 1, -1, -1):
+            if group[node]:
+                built[node] = classes[kind[node]]([built[child] for child in self.children(node)])
+            else:
+                built[node] = Token(types[kind[node]], self.source[self.start[node]:self.stop[node]])
+        # Top-level tokens hang off a Statement, as they do after sqlparse.parse.
+        return sql.Statement([built[node] for node in self.roots()]).tokens
+
+    def node_dict(self, node: int, type_names: bool = False, spans: bool = False) -> Dict:
+        """
+        Materialize the dict form of a subtree.
+
+        Parameters:
+        node (int): The node index.
+        type_names (bool): If True, report token types as strings.
+        spans (bool): If True, report a "span" of [start, stop] source offsets
+            instead of the "value" text.
+
+        Returns:
+        Dict: The same structure TokenProcessor.process produces for the token.
+        """
+        types = [str(node_type) for node_type in self.types] if type_names else self.types
+        kind, parent, group, keyword = self.kind, self.parent, self.group, self.keyword
+        start, stop, source = self.start, self.stop, self.source
+        # Pre-order numbering means a parent's dict always exists before its children's.
+        children: Dict[int, List[Dict]] = {}
+        result = None
+        for current in range(node, self.end[node]):
+            entry = {"type": types[kind[current]]}
+            if spans:
+                entry["span"] = [start[current], stop[current]]
+            else:
+                value = source[start[current]:stop[current]]
+                entry["value"] = value.upper() if keyword[current] else value
+            entry["is_group"] = group[current] == 1
+            if group[current]:
+                entry["children"] = children[current] = []
+            if current == node:
+                result = entry
+            else:
+                children[parent[current]].append(entry)
+        return result
+
+    def to_dict(self, type_names: bool = False, spans: bool = False) -> Dict:
+        """
+        Materialize the dict form of the whole tree.
+
+        Parameters:
+        type_names (bool): If True, report token types as strings.
+        spans (bool): If True, report source offsets instead of text; the
+            source itself is then included once under "source".
+
+        Returns:
+        Dict: A {"type": "ROOT", "children": [...]} dictionary of plain dicts.
+        """
+        result = {"type": "ROOT", "children": [self.node_dict(node, type_names, spans) for node in self.roots()]}
+        if spans:
+            result["source"] = self.source[:self.text_length]
+        return result
+
+    def view(self) -> "TreeView":
+        """
+        Return a lazy, read-only dict view of the tree.
+
+        Returns:
+        TreeView: A mapping equal to the dict form, built on access.
+        """
+        return TreeView(self)
+
+
+class ChildrenView(Sequence):
+    """
+    Lazy sequence of the child nodes of a QueryTree node.
+    """
+
+    def __init__(self, tree: QueryTree, nodes: List[int]):
+        self._tree = tree
+        self._nodes = nodes
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [NodeView(self._tree, node) for node in self._nodes[index]]
+        return NodeView(self._tree, self._nodes[index])
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (list, tuple, ChildrenView)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
+class NodeView(Mapping):
+    """
+    Lazy, read-only view of one node in the dict form of a QueryTree.
+    """
+
+    def __init__(self, tree: QueryTree, node: int):
+        self._tree = tree
+        self.node = node
+
+    def __getitem__(self, key: str):
+        tree, node = self._tree, self.node
+        if key == "type":
+            return tree.type_of(node)
+        if key == "value":
+            return tree.value(node)
+        if key == "is_group":
+            return tree.group[node] == 1
+        if key == "children" and tree.group[node]:
+            return ChildrenView(tree, list(tree.children(node)))
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        yield from ("type", "value", "is_group")
+        if self._tree.group[self.node]:
+            yield "children"
+
+    def __len__(self) -> int:
+        return 4 if self._tree.group[self.node] else 3
+
+    @property
+    def span(self) -> Tuple[int, int]:
+        return self._tree.span(self.node)
+
+    def to_dict(self, type_names: bool = False, spans: bool = False) -> Dict:
+        return self._tree.node_dict(self.node, type_names, spans)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class TreeView(Mapping):
+    """
+    Lazy, read-only view of the ROOT dict of a QueryTree.
+    """
+
+    def __init__(self, tree: QueryTree):
+        self._tree = tree
+
+    def __getitem__(self, key: str):
+        if key == "type":
+            return "ROOT"
+        if key == "children":
+            return ChildrenView(self._tree, list(self._tree.roots()))
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        yield from ("type", "children")
+
+    def __len__(self) -> int:
+        return 2
+
+    def to_dict(self, type_names: bool = False, spans: bool = False) -> Dict:
+        return self._tree.to_dict(type_names, spans)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
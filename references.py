@@ -0,0 +1,493 @@
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+from sqlparse import sql
+from sqlparse import tokens as T
+from sqlparse.sql import Token
+from sqlparse.utils import remove_quotes
+from query_tree import QueryTree
+
+
+READ = "read"
+WRITE = "write"
+
+# Keywords after which a table name is expected.
+_TABLE_CLAUSES = {"FROM", "UPDATE", "INTO"}
+_DDL_VERBS = {"CREATE", "ALTER", "DROP", "TRUNCATE"}
+_SET_OPERATORS = ("UNION", "INTERSECT", "EXCEPT", "MINUS")
+# Modifiers that may sit between a table clause and the table name.
+_TABLE_MODIFIERS = {"IF", "NOT", "EXISTS", "IF EXISTS", "IF NOT EXISTS", "ONLY", "LATERAL"}
+
+
+class Scope(NamedTuple):
+    """
+    A query block: the statement itself, a subquery or a CTE body.
+
+    Attributes:
+    id (int): Index of the scope in ReferenceIndex.scopes; the statement is 0.
+    parent (int): The enclosing scope, or -1 for the statement.
+    kind (str): "statement", "subquery" or "cte".
+    name (Optional[str]): The CTE name or the subquery alias, if any.
+    start (int): Offset where the scope's text starts.
+    stop (int): Offset where the scope's text ends.
+    """
+    id: int
+    parent: int
+    kind: str
+    name: Optional[str]
+    start: int
+    stop: int
+
+
+class TableRef(NamedTuple):
+    """
+    A table named in the query.
+
+    Attributes:
+    name (str): The table name, without quotes.
+    schema (Optional[str]): The qualifying schema, if any.
+    alias (Optional[str]): The alias given to the table, if any.
+    role (str): WRITE for tables the statement modifies, READ otherwise.
+    scope (int): The scope the reference appears in.
+    start (int): Offset where the (qualified) name starts.
+    stop (int): Offset where the (qualified) name ends.
+    cte (bool): True if the name refers to a CTE rather than a table.
+    """
+    name: str
+    schema: Optional[str]
+    alias: Optional[str]
+    role: str
+    scope: int
+    start: int
+    stop: int
+    cte: bool = False
+
+
+class ColumnRef(NamedTuple):
+    """
+    A column named in the query.
+
+    Attributes:
+    name (str): The column name without quotes, or "*" for a wildcard.
+    qualifier (Optional[str]): The table or alias written before the name, if any.
+    table (Optional[str]): The table, CTE or subquery alias the column was
+        resolved to, or None if it is ambiguous.
+    clause (str): The keyword of the clause the column appears in, e.g. "SELECT" or "WHERE".
+    scope (int): The scope the reference appears in.
+    start (int): Offset where the (qualified) name starts.
+    stop (int): Offset where the (qualified) name ends.
+    """
+    name: str
+    qualifier: Optional[str]
+    table: Optional[str]
+    clause: str
+    scope: int
+    start: int
+    stop: int
+
+
+class CteDef(NamedTuple):
+    """
+    A common table expression defined by a WITH clause.
+
+    Attributes:
+    name (str): The CTE name.
+    scope (int): The scope of the CTE body.
+    start (int): Offset where the definition starts.
+    stop (int): Offset where the definition ends.
+    """
+    name: str
+    scope: int
+    start: int
+    stop: int
+
+
+Reference = Union[TableRef, ColumnRef, CteDef, Scope]
+
+
+class ReferenceIndex:
+    """
+    Tables, columns, CTEs and scopes referenced by a query, indexed for lookup.
+
+    The index is built by one pass over the tree; every lookup afterwards is a
+    dictionary access. Names are matched case-insensitively, and all offsets
+    point into source, the text the tree was parsed from.
+
+    Attributes:
+    source (str): The query text the offsets refer to.
+    scopes (List[Scope]): All scopes, the statement first.
+    tables (List[TableRef]): All table references, CTE references included, in order.
+    columns (List[ColumnRef]): All column references, in order.
+    ctes (Dict[str, CteDef]): CTE definitions keyed by lower-cased name.
+    """
+
+    def __init__(self, source: str, scopes: List[Scope], tables: List[TableRef],
+                 columns: List[ColumnRef], ctes: Dict[str, CteDef]):
+        self.source = source
+        self.scopes = scopes
+        self.tables = tables
+        self.columns = columns
+        self.ctes = ctes
+        self._by_role = _group(tables, lambda table: None if table.cte else table.role)
+        self._tables_by_name = _group(tables, lambda table: table.name.lower())
+        self._tables_by_scope = _group(tables, lambda table: table.scope)
+        self._columns_by_table = _group(columns, lambda column: column.table and column.table.lower())
+        self._columns_by_qualifier = _group(columns, lambda column: column.qualifier and column.qualifier.lower())
+        self._columns_by_scope = _group(columns, lambda column: column.scope)
+        self._aliases = {(table.scope, table.alias.lower()): table for table in tables if table.alias}
+
+    def tables_with_role(self, role: str) -> Tuple[TableRef, ...]:
+        """
+        Return the references to real tables (not CTEs) with a given role.
+
+        Parameters:
+        role (str): READ or WRITE.
+
+        Returns:
+        Tuple[TableRef, ...]: The matching references, in order.
+        """
+        return self._by_role.get(role, ())
+
+    def table_references(self, name: str) -> Tuple[TableRef, ...]:
+        """
+        Return every reference to a table or CTE name.
+
+        Parameters:
+        name (str): The table name, without schema.
+
+        Returns:
+        Tuple[TableRef, ...]: The matching references, in order.
+        """
+        return self._tables_by_name.get(name.lower(), ())
+
+    def columns_of(self, table: str) -> Tuple[ColumnRef, ...]:
+        """
+        Return the columns resolved to a table, CTE or subquery alias.
+
+        Parameters:
+        table (str): The table name as it appears in TableRef.name, or a subquery alias.
+
+        Returns:
+        Tuple[ColumnRef, ...]: The matching references, in order.
+        """
+        return self._columns_by_table.get(table.lower(), ())
+
+    def columns_qualified_by(self, qualifier: str) -> Tuple[ColumnRef, ...]:
+        """
+        Return the columns written with a given qualifier, e.g. "u" for u.id.
+
+        Parameters:
+        qualifier (str): The table name or alias used as qualifier.
+
+        Returns:
+        Tuple[ColumnRef, ...]: The matching references, in order.
+        """
+        return self._columns_by_qualifier.get(qualifier.lower(), ())
+
+    def alias(self, alias: str, scope: int = 0) -> Optional[TableRef]:
+        """
+        Return the table an alias stands for, looking outwards from a scope.
+
+        Parameters:
+        alias (str): The alias.
+        scope (int): The scope the alias is used in.
+
+        Returns:
+        Optional[TableRef]: The aliased table reference, or None.
+        """
+        alias = alias.lower()
+        while scope >= 0:
+            table = self._aliases.get((scope, alias))
+            if table is not None:
+                return table
+            scope = self.scopes[scope].parent
+        return None
+
+    def cte(self, name: str) -> Optional[CteDef]:
+        return self.ctes.get(name.lower())
+
+    def scope_tables(self, scope: int) -> Tuple[TableRef, ...]:
+        return self._tables_by_scope.get(scope, ())
+
+    def scope_columns(self, scope: int) -> Tuple[ColumnRef, ...]:
+        return self._columns_by_scope.get(scope, ())
+
+    def text(self, reference: Reference) -> str:
+        """
+        Return the source text a reference spans.
+
+        Parameters:
+        reference (Reference): A table, column, CTE or scope.
+
+        Returns:
+        str: The slice of the source between its offsets.
+        """
+        return self.source[reference.start:reference.stop]
+
+
+def build_index(tokens: List[Token], tree: Optional[QueryTree] = None) -> ReferenceIndex:
+    """
+    Extract the table, column, CTE and scope references of a parsed query.
+
+    Parameters:
+    tokens (List[Token]): The top-level tokens of the query, as returned by create_tree.
+    tree (Optional[QueryTree]): The compact form of the same tokens, for its
+        offsets; built from the tokens if None.
+
+    Returns:
+    ReferenceIndex: The references, with offsets into tree.source.
+    """
+    if tree is None:
+        tree = QueryTree(tokens)
+    return _Extractor(tree).run(tokens)
+
+
+class _State:
+    """
+    What the tokens seen so far in one query block say about the next one.
+    """
+
+    def __init__(self, block: int):
+        self.clause = ""
+        self.expect_table = False
+        self.role = READ
+        self.block = block
+
+
+class _Extractor:
+    def __init__(self, tree: QueryTree):
+        self.tree = tree
+        self.scopes: List[Scope] = []
+        self.ctes: Dict[str, CteDef] = {}
+        self.statement: Optional[str] = None
+        self.blocks = 0
+        # Resolution needs every alias first, so tables and columns are kept
+        # as (reference, block) and columns are resolved at the end.
+        self.tables: List[TableRef] = []
+        self.columns: List[Tuple[tuple, int]] = []
+        # Names of the tables each block reads from, for unqualified columns.
+        self.block_tables: Dict[int, set] = defaultdict(set)
+
+    def run(self, tokens: List[Token]) -> ReferenceIndex:
+        tree = self.tree
+        self.scopes.append(Scope(0, -1, "statement", None, 0, tree.text_length))
+        state = _State(self._new_block())
+        for token, node in zip(tokens, tree.roots()):
+            self._visit(token, node, 0, state)
+        return ReferenceIndex(tree.source, self.scopes, self.tables, self._resolve_columns(), self.ctes)
+
+    def _new_block(self) -> int:
+        self.blocks += 1
+        return self.blocks - 1
+
+    def _visit(self, token: Token, node: int, scope: int, state: _State):
+        if token.is_whitespace or token.ttype in T.Comment or token.ttype in T.Punctuation:
+            return
+        if not token.is_group:
+            self._visit_leaf(token, node, scope, state)
+        elif isinstance(token, sql.Parenthesis) and _is_subquery(token):
+            self._open_scope(token, node, scope, "subquery", None)
+        elif isinstance(token, sql.Identifier):
+            if state.clause in ("WITH", "RECURSIVE"):
+                self._add_cte(token, node, scope)
+            elif state.expect_table:
+                self._add_table(token, node, scope, state)
+            else:
+                self._add_column(token, node, scope, state)
+        elif isinstance(token, sql.Function):
+            self._visit_function(token, node, scope, state)
+        else:
+            self._visit_children(token, node, scope, state)
+
+    def _visit_children(self, token: Token, node: int, scope: int, state: _State):
+        for child, child_node in zip(token.tokens, self.tree.children(node)):
+            self._visit(child, child_node, scope, state)
+
+    def _visit_leaf(self, token: Token, node: int, scope: int, state: _State):
+        ttype = token.ttype
+        is_keyword = ttype in T.Keyword
+        word = token.normalized.upper() if is_keyword else token.value
+        if state.expect_table and (_is_name(ttype) or (is_keyword and state.clause == "UPDATE")):
+            if word in _TABLE_MODIFIERS:
+                return
+            name = remove_quotes(token.value)
+            self._append_table(TableRef(name, None, None, state.role, scope, self.tree.start[node],
+                                        self.tree.stop[node], name.lower() in self.ctes), state)
+            return
+        if is_keyword:
+            self._enter_clause(word, ttype, scope, state)
+        elif _is_name(ttype):
+            self._append_column(remove_quotes(token.value), None, state, scope, node, node)
+        elif ttype in T.Wildcard and not self._in_function_arguments(node):
+            self._append_column("*", None, state, scope, node, node)
+
+    def _enter_clause(self, word: str, ttype, scope: int, state: _State):
+        if word in _TABLE_MODIFIERS and state.expect_table:
+            return
+        if scope == 0 and self.statement is None and (ttype in T.DML or ttype in T.DDL):
+            self.statement = word
+        if word.startswith(_SET_OPERATORS):
+            state.block = self._new_block()
+        elif word == "SELECT" and ttype in T.DML and scope == 0 and self.statement not in (None, "SELECT"):
+            # INSERT INTO t (a, b) SELECT c, d FROM s: the query reads its own tables.
+            state.block = self._new_block()
+        writes = scope == 0 and self.statement != "SELECT"
+        state.clause = word
+        if word in _TABLE_CLAUSES or word.endswith("JOIN"):
+            state.expect_table = True
+            state.role = WRITE if writes and (word != "FROM" or self.statement == "DELETE") \
+                and not word.endswith("JOIN") else READ
+        elif word == "TABLE" and self.statement in _DDL_VERBS:
+            state.expect_table = True
+            state.role = WRITE
+        else:
+            state.expect_table = False
+
+    def _visit_function(self, token: sql.Function, node: int, scope: int, state: _State):
+        children = list(zip(token.tokens, self.tree.children(node)))
+        if state.expect_table:
+            # INSERT INTO t (a, b): the table and the columns written to.
+            name_token, name_node = children[0]
+            self._visit(name_token, name_node, scope, state)
+            state.expect_table = False
+            columns = _State(self._new_block())
+            columns.clause = state.clause
+            if self.tables and self.tables[-1].start == self.tree.start[name_node]:
+                self.block_tables[columns.block].add(self.tables[-1].name)
+            for child, child_node in children[1:]:
+                self._visit(child, child_node, scope, columns)
+            return
+        # The first child is the function name, not a column.
+        for child, child_node in children[1:]:
+            self._visit(child, child_node, scope, state)
+
+    def _add_table(self, token: sql.Identifier, node: int, scope: int, state: _State):
+        expression = self._expression(token, node)
+        first, first_node = expression[0]
+        if isinstance(first, sql.Parenthesis):
+            # A derived table: its alias names the subquery scope.
+            alias = token.get_alias()
+            if _is_subquery(first):
+                self._open_scope(first, first_node, scope, "subquery", alias)
+            if alias:
+                self.block_tables[state.block].add(alias)
+            return
+        if isinstance(first, sql.Function):
+            self._visit_function(first, first_node, scope, _State(state.block))
+            return
+        names = [child for child, _ in expression if _is_name(child.ttype) or child.ttype in T.Keyword]
+        if not names:
+            self._visit_children(token, node, scope, state)
+            return
+        name = remove_quotes(names[-1].value)
+        schema = ".".join(remove_quotes(child.value) for child in names[:-1]) or None
+        cte = schema is None and name.lower() in self.ctes
+        self._append_table(TableRef(name, schema, token.get_alias(), state.role, scope,
+                                    self.tree.start[first_node], self.tree.stop[expression[-1][1]], cte), state)
+
+    def _append_table(self, table: TableRef, state: _State):
+        self.tables.append(table)
+        self.block_tables[state.block].add(table.name)
+        # Only FROM takes a list of tables; the others name a single one.
+        if state.clause != "FROM":
+            state.expect_table = False
+
+    def _add_column(self, token: sql.Identifier, node: int, scope: int, state: _State):
+        expression = self._expression(token, node)
+        parts = [child for child, _ in expression if child.ttype not in T.Punctuation]
+        if parts and all(_is_name(part.ttype) or part.ttype in T.Wildcard for part in parts):
+            qualifier = ".".join(remove_quotes(part.value) for part in parts[:-1]) or None
+            last = parts[-1]
+            name = "*" if last.ttype in T.Wildcard else remove_quotes(last.value)
+            self._append_column(name, qualifier, state, scope, expression[0][1], expression[-1][1])
+            return
+        # An expression with an alias, such as a subquery or a function call.
+        alias = token.get_alias()
+        for child, child_node in expression:
+            if isinstance(child, sql.Parenthesis) and _is_subquery(child):
+                self._open_scope(child, child_node, scope, "subquery", alias)
+            else:
+                self._visit(child, child_node, scope, state)
+
+    def _append_column(self, name: str, qualifier: Optional[str], state: _State, scope: int,
+                       first_node: int, last_node: int):
+        column = (name, qualifier, state.clause, scope, self.tree.start[first_node], self.tree.stop[last_node])
+        self.columns.append((column, state.block))
+
+    def _add_cte(self, token: sql.Identifier, node: int, scope: int):
+        children = list(zip(token.tokens, self.tree.children(node)))
+        head = children[0][0]
+        name = head.get_name() if isinstance(head, sql.Function) else remove_quotes(head.value)
+        if not name:
+            return
+        # Registered before the body is walked, so recursive references resolve.
+        self.ctes[name.lower()] = CteDef(name, len(self.scopes), self.tree.start[node], self.tree.stop[node])
+        for child, child_node in children[1:]:
+            if isinstance(child, sql.Parenthesis):
+                self._open_scope(child, child_node, scope, "cte", name)
+                return
+
+    def _open_scope(self, token: sql.Parenthesis, node: int, parent: int, kind: str, name: Optional[str]) -> int:
+        scope = len(self.scopes)
+        # Reindenting can leave line breaks inside the brackets' group; they are not part of the scope.
+        edges = [child for child, child_token in zip(self.tree.children(node), token.tokens)
+                 if not child_token.is_whitespace]
+        start, stop = (self.tree.start[edges[0]], self.tree.stop[edges[-1]]) if edges else self.tree.span(node)
+        self.scopes.append(Scope(scope, parent, kind, name, start, stop))
+        self._visit_children(token, node, scope, _State(self._new_block()))
+        return scope
+
+    def _expression(self, token: Token, node: int) -> List[Tuple[Token, int]]:
+        # The children of an identifier before its alias.
+        expression = []
+        for child, child_node in zip(token.tokens, self.tree.children(node)):
+            if child.is_whitespace or (child.ttype in T.Keyword and child.normalized.upper() == "AS"):
+                break
+            expression.append((child, child_node))
+        return expression
+
+    def _in_function_arguments(self, node: int) -> bool:
+        parent = self.tree.parent[node]
+        grandparent = self.tree.parent[parent] if parent >= 0 else -1
+        return grandparent >= 0 and self.tree.type_of(grandparent) == "Function"
+
+    def _resolve_columns(self) -> List[ColumnRef]:
+        names: Dict[Tuple[int, str], str] = {}
+        for table in self.tables:
+            names.setdefault((table.scope, table.name.lower()), table.name)
+            if table.alias:
+                names[(table.scope, table.alias.lower())] = table.name
+        for scope in self.scopes:
+            if scope.kind == "subquery" and scope.name and scope.parent >= 0:
+                names[(scope.parent, scope.name.lower())] = scope.name
+
+        columns = []
+        for (name, qualifier, clause, scope, start, stop), block in self.columns:
+            table = None
+            if qualifier:
+                key = qualifier.rsplit(".", 1)[-1].lower()
+                current = scope
+                while current >= 0 and table is None:
+                    table = names.get((current, key))
+                    current = self.scopes[current].parent
+            elif len(self.block_tables[block]) == 1:
+                table = next(iter(self.block_tables[block]))
+            columns.append(ColumnRef(name, qualifier, table, clause, scope, start, stop))
+        return columns
+
+
+def _is_name(ttype) -> bool:
+    # Quoted identifiers are lexed as symbols.
+    return ttype is not None and (ttype in T.Name or ttype in T.String.Symbol)
+
+
+def _is_subquery(token: sql.Parenthesis) -> bool:
+    return any(child.ttype in T.DML for child in token.tokens)
+
+
+def _group(items: list, key) -> Dict:
+    grouped = defaultdict(list)
+    for item in items:
+        value = key(item)
+        if value is not None:
+            grouped[value].append(item)
+    return {value: tuple(group) for value, group in grouped.items()}
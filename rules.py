@@ -0,0 +1,414 @@
+import time
+from array import array
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from sqlparse import tokens as T
+from sqlparse.tokens import _TokenType
+from instrumentation import TIMING, emit, enabled
+from query_tree import NodeType, QueryTree
+
+
+BLOCK = "block"
+WARN = "warn"
+
+# Keywords after which an identifier names a table.
+_TABLE_KEYWORDS = frozenset(("FROM", "INTO", "UPDATE", "TABLE", "JOIN"))
+
+
+class Violation(NamedTuple):
+    """
+    A rule that matched a node of the query.
+
+    Attributes:
+    rule (str): The rule name.
+    severity (str): BLOCK or WARN.
+    message (str): What is wrong, with the offending text filled in.
+    node (int): The matching node of the tree.
+    start (int): Offset where the node starts in the tree's source.
+    stop (int): Offset where the node ends.
+    """
+    rule: str
+    severity: str
+    message: str
+    node: int
+    start: int
+    stop: int
+
+
+class RuleReport(NamedTuple):
+    """
+    The outcome of checking one query against a rule set.
+
+    Attributes:
+    violations (List[Violation]): The violations found, in document order.
+    blocked (bool): True if any violation has BLOCK severity.
+    nodes_visited (int): Nodes visited before the traversal ended.
+    timings (Dict[str, float]): Seconds spent in each rule's check, if timing was requested.
+    """
+    violations: List[Violation]
+    blocked: bool
+    nodes_visited: int
+    timings: Dict[str, float]
+
+
+class RuleContext:
+    """
+    What a rule's check can look at while the tree is being traversed.
+
+    Lookups cover the neighbourhood of a node only, so a check costs little
+    compared with the single traversal that calls it.
+    """
+
+    def __init__(self, tree: QueryTree):
+        self.tree = tree
+        # Last keyword leaf seen among the children of each node, indexed by node + 1.
+        self._last_keyword = array("i", [-1]) * (len(tree) + 1)
+
+    def keyword_before(self, node: int) -> Optional[str]:
+        """
+        Return the keyword that introduces a node, e.g. FROM for a table name.
+
+        Items of a list are introduced by the keyword before the list.
+
+        Parameters:
+        node (int): A node at or before the traversal position.
+
+        Returns:
+        Optional[str]: The upper-cased keyword, with internal whitespace collapsed, or None.
+        """
+        tree = self.tree
+        parent = tree.parent[node]
+        if parent >= 0 and tree.types[tree.kind[parent]] == "IdentifierList":
+            parent = tree.parent[parent]
+        keyword = self._last_keyword[parent + 1]
+        return _words(tree.value(keyword)) if keyword >= 0 else None
+
+    def inside(self, node: int, group_type: str) -> bool:
+        """
+        Return True if a node lies within a group of the given type.
+
+        Parameters:
+        node (int): The node.
+        group_type (str): A group class name such as "Function".
+        """
+        tree = self.tree
+        node = tree.parent[node]
+        while node >= 0:
+            if tree.types[tree.kind[node]] == group_type:
+                return True
+            node = tree.parent[node]
+        return False
+
+    def leads_statement(self, node: int) -> bool:
+        """
+        Return True if a node is the first of its type in a statement or a
+        parenthesized query, e.g. the DML keyword that makes the statement
+        an UPDATE.
+
+        Parameters:
+        node (int): The node.
+        """
+        tree = self.tree
+        parent = tree.parent[node]
+        if parent >= 0 and tree.types[tree.kind[parent]] not in ("Statement", "Parenthesis"):
+            return False
+        for sibling in (tree.children(parent) if parent >= 0 else tree.roots()):
+            if sibling == node:
+                return True
+            if tree.kind[sibling] == tree.kind[node]:
+                return False
+        return True
+
+    def followed_by(self, node: int, group_type: str) -> bool:
+        """
+        Return True if a later sibling of the node is a group of the given type.
+
+        Parameters:
+        node (int): The node.
+        group_type (str): A group class name such as "Where".
+        """
+        tree = self.tree
+        node = tree.next_sibling[node]
+        while node >= 0:
+            if tree.types[tree.kind[node]] == group_type:
+                return True
+            node = tree.next_sibling[node]
+        return False
+
+
+Check = Callable[[RuleContext, int], bool]
+
+
+class Rule:
+    """
+    A policy declared as the node types it applies to, plus an optional check.
+
+    The rule matches a node when the node's type is one of types (leaf token
+    types also match their sub-types), its normalized value is one of values
+    when those are given, and check returns True when there is one.
+    """
+
+    def __init__(self, name: str, types: Iterable[NodeType], values: Optional[Iterable[str]] = None,
+                 check: Optional[Check] = None, severity: str = BLOCK, message: Optional[str] = None):
+        """
+        Initialize the Rule.
+
+        Parameters:
+        name (str): Identifies the rule in violations and timings.
+        types (Iterable[NodeType]): Group class names and sqlparse token types the rule looks at.
+        values (Optional[Iterable[str]]): Upper-case values the node must have, e.g. ("DELETE",).
+        check (Optional[Check]): Called with the context and the node; a violation if it returns True.
+        severity (str): BLOCK to reject the query, WARN to only report it.
+        message (Optional[str]): Violation message; "{text}" is replaced by the node text.
+
+        Raises:
+        ValueError: If no types are given or the severity is unknown.
+        """
+        self.name = name
+        self.types = tuple(types)
+        if not self.types:
+            raise ValueError("A rule needs at least one node type")
+        if severity not in (BLOCK, WARN):
+            raise ValueError(f"Unknown severity: {severity}")
+        self.values = frozenset(_words(value) for value in values) if values is not None else None
+        self.check = check
+        self.severity = severity
+        self.message = message or f"Query violates {name}: {{text}}"
+
+    def applies_to(self, node_type: NodeType) -> bool:
+        for rule_type in self.types:
+            if node_type == rule_type:
+                return True
+            if isinstance(node_type, _TokenType) and isinstance(rule_type, _TokenType) and node_type in rule_type:
+                return True
+        return False
+
+    def __repr__(self) -> str:
+        return f"Rule({self.name!r}, severity={self.severity!r})"
+
+
+class RuleSet:
+    """
+    Rules compiled into one dispatch table, checked in a single traversal.
+
+    The table maps every node type to the rules that apply to it, with rules
+    that require particular values further keyed by value, so a node costs
+    one or two lookups however many rules there are, and nodes no rule looks
+    at cost nothing more. Entries are computed once per type and shared by
+    every tree checked with the set.
+    """
+
+    def __init__(self, rules: Iterable[Rule]):
+        """
+        Initialize the RuleSet.
+
+        Parameters:
+        rules (Iterable[Rule]): The rules, checked in this order at each node.
+
+        Raises:
+        ValueError: If two rules have the same name.
+        """
+        self.rules = list(rules)
+        names = [rule.name for rule in self.rules]
+        if len(set(names)) != len(names):
+            raise ValueError("Rule names must be unique")
+        self._order = {rule.name: number for number, rule in enumerate(self.rules)}
+        self._table: Dict[NodeType, Optional[_Entry]] = {}
+
+    def _entry_for(self, node_type: NodeType) -> Optional["_Entry"]:
+        if node_type in self._table:
+            return self._table[node_type]
+        always: List[Rule] = []
+        by_value: Dict[str, Tuple[Rule, ...]] = {}
+        for rule in self.rules:
+            if not rule.applies_to(node_type):
+                continue
+            if rule.values is None:
+                always.append(rule)
+            else:
+                for value in rule.values:
+                    by_value[value] = by_value.get(value, ()) + (rule,)
+        entry = _Entry(tuple(always), by_value) if always or by_value else None
+        self._table[node_type] = entry
+        return entry
+
+    def check(self, tree: QueryTree, stop_on_block: bool = True, timings: bool = False) -> RuleReport:
+        """
+        Check a query tree against every rule in one traversal.
+
+        Parameters:
+        tree (QueryTree): The tree of the query.
+        stop_on_block (bool): If True, stop at the first violation with BLOCK severity.
+        timings (bool): If True, time each rule's check. The totals are returned
+            and, when instrumentation is on, emitted as "rule_seconds" timings.
+
+        Returns:
+        RuleReport: The violations and, if requested, the time spent per rule.
+        """
+        table = [self._entry_for(node_type) for node_type in tree.types]
+        keyword_kinds = bytearray(1 if isinstance(node_type, _TokenType) and node_type in T.Keyword else 0
+                                  for node_type in tree.types)
+        context = RuleContext(tree)
+        last_keyword = context._last_keyword
+        kind, parent, group = tree.kind, tree.parent, tree.group
+        spent: Dict[str, float] = dict.fromkeys((rule.name for rule in self.rules), 0.0) if timings else {}
+        violations = []
+        blocked = False
+        visited = 0
+        for node in range(len(tree)):
+            visited += 1
+            node_kind = kind[node]
+            entry = table[node_kind]
+            if entry is not None:
+                rules = entry.always
+                if entry.by_value:
+                    keyed = entry.by_value.get(_words(tree.value(node)))
+                    if keyed:
+                        rules = sorted(rules + keyed, key=lambda rule: self._order[rule.name]) if rules else keyed
+                for rule in rules:
+                    if timings:
+                        started = time.perf_counter()
+                        matched = _matches(rule, context, node)
+                        spent[rule.name] += time.perf_counter() - started
+                    else:
+                        matched = _matches(rule, context, node)
+                    if matched:
+                        violations.append(Violation(
+                            rule.name, rule.severity, rule.message.replace("{text}", tree.text(node)),
+                            node, tree.start[node], tree.stop[node]))
+                        blocked = blocked or rule.severity == BLOCK
+                if blocked and stop_on_block:
+                    break
+            if keyword_kinds[node_kind] and not group[node]:
+                last_keyword[parent[node] + 1] = node
+        if timings and enabled():
+            for name, seconds in spent.items():
+                emit("rule_seconds", seconds, TIMING, rule=name)
+        return RuleReport(violations, blocked, visited, spent)
+
+
+class _Entry(NamedTuple):
+    # The rules for one node type: those checked at every node, and those keyed by value.
+    always: Tuple[Rule, ...]
+    by_value: Dict[str, Tuple[Rule, ...]]
+
+
+def _matches(rule: Rule, context: RuleContext, node: int) -> bool:
+    return rule.check is None or rule.check(context, node)
+
+
+def _words(value: str) -> str:
+    value = value.upper()
+    return value if value.isalpha() else " ".join(value.split())
+
+
+def no_select_star(severity: str = BLOCK) -> Rule:
+    """
+    Reject wildcards in select lists; COUNT(*) and other function arguments are allowed.
+
+    Parameters:
+    severity (str): BLOCK or WARN.
+
+    Returns:
+    Rule: The rule, named "no_select_star".
+    """
+    return Rule("no_select_star", [T.Wildcard], check=lambda context, node: not context.inside(node, "Function"),
+                severity=severity, message="SELECT * is not allowed: {text}")
+
+
+def require_where(severity: str = BLOCK) -> Rule:
+    """
+    Reject UPDATE and DELETE statements without a WHERE clause.
+
+    Only the DML keyword that leads a statement or a parenthesized query
+    counts, so the UPDATE of "SELECT ... FOR UPDATE" does not.
+
+    Parameters:
+    severity (str): BLOCK or WARN.
+
+    Returns:
+    Rule: The rule, named "require_where".
+    """
+    return Rule("require_where", [T.Keyword.DML], values=("UPDATE", "DELETE"),
+                check=lambda context, node: context.leads_statement(node) and not context.followed_by(node, "Where"),
+                severity=severity, message="{text} without WHERE is not allowed")
+
+
+def no_cross_join(severity: str = BLOCK) -> Rule:
+    """
+    Reject CROSS JOIN, and comma-separated FROM lists in statements without WHERE.
+
+    A comma join with a WHERE clause usually carries its join condition
+    there, so it is left alone.
+
+    Parameters:
+    severity (str): BLOCK or WARN.
+
+    Returns:
+    Rule: The rule, named "no_cross_join".
+    """
+    def check(context: RuleContext, node: int) -> bool:
+        if context.tree.types[context.tree.kind[node]] != "IdentifierList":
+            return _words(context.tree.value(node)) == "CROSS JOIN"
+        return context.keyword_before(node) == "FROM" and not context.followed_by(node, "Where")
+
+    return Rule("no_cross_join", [T.Keyword, "IdentifierList"], check=check,
+                severity=severity, message="Cross join is not allowed: {text}")
+
+
+def blocked_tables(tables: Iterable[str], severity: str = BLOCK) -> Rule:
+    """
+    Reject queries that read or write any of the given tables.
+
+    Parameters:
+    tables (Iterable[str]): Table names, optionally schema-qualified; matched case-insensitively.
+    severity (str): BLOCK or WARN.
+
+    Returns:
+    Rule: The rule, named "blocked_tables".
+    """
+    blocked = frozenset(table.lower() for table in tables)
+
+    def check(context: RuleContext, node: int) -> bool:
+        tree = context.tree
+        position = node
+        parent = tree.parent[node]
+        if parent >= 0 and tree.types[tree.kind[parent]] == "Function" and tree.first_child[parent] == node:
+            # "INSERT INTO t (a, b)" groups the table name with the column list as a Function.
+            position = parent
+        keyword = context.keyword_before(position)
+        if keyword is None or not (keyword in _TABLE_KEYWORDS or keyword.endswith(" JOIN")):
+            return False
+        name = _table_name(tree, node)
+        return name is not None and (name in blocked or name.rsplit(".", 1)[-1] in blocked)
+
+    return Rule("blocked_tables", ["Identifier"], check=check,
+                severity=severity, message="Table is blocked: {text}")
+
+
+def _table_name(tree: QueryTree, node: int) -> Optional[str]:
+    # The dotted name at the start of an Identifier, without quotes, or None for subqueries.
+    parts = []
+    child = tree.first_child[node]
+    while child >= 0:
+        node_type = tree.types[tree.kind[child]]
+        if tree.group[child]:
+            if node_type in ("Function", "Identifier"):
+                # The name ends in a group in "s.t (a, b)" and similar column lists.
+                parts.append(_table_name(tree, child) or "")
+            break
+        if node_type in T.Whitespace or node_type in T.Keyword:
+            break
+        parts.append(tree.text(child).strip('"`[]'))
+        child = tree.next_sibling[child]
+    name = "".join(parts).lower()
+    return name or None
+
+
+def default_rules() -> RuleSet:
+    """
+    Return the gateway's standard policy: no SELECT *, no unfiltered UPDATE or DELETE, no cross joins.
+
+    Returns:
+    RuleSet: The compiled rules.
+    """
+    return RuleSet([no_select_star(), require_where(), no_cross_join()])
@@ -0,0 +1,391 @@
+import json
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, TextIO, Union
+from sqlparse import tokens as T
+from sqlparse.tokens import _TokenType
+from query_tree import NodeType, QueryTree
+
+
+TREE_MAGIC = b"QPT\x01"
+DICT_MAGIC = b"QPD\x01"
+
+_TYPE_NAME = 0
+_TOKEN_TYPE = 1
+
+
+def dump_tree(tree: QueryTree) -> bytes:
+    """
+    Encode a QueryTree in the compact binary format.
+
+    The encoding holds the type table, the source text once, and one varint
+    word per node in document order, followed by the child count of a group
+    or the text length of a leaf, from which all offsets are recovered.
+
+    Parameters:
+    tree (QueryTree): The tree to encode.
+
+    Returns:
+    bytes: The encoded tree.
+    """
+    out = bytearray(TREE_MAGIC)
+    _write_types(out, tree.types)
+    _write_str(out, tree.source[:tree.text_length])
+    kind, group, keyword, start, stop = tree.kind, tree.group, tree.keyword, tree.start, tree.stop
+    first_child, next_sibling = tree.first_child, tree.next_sibling
+    _write_varint(out, len(kind))
+    for node in range(len(kind)):
+        _write_varint(out, kind[node] << 2 | group[node] << 1 | keyword[node])
+        if group[node]:
+            count = 0
+            child = first_child[node]
+            while child >= 0:
+                count += 1
+                child = next_sibling[child]
+            _write_varint(out, count)
+        else:
+            _write_varint(out, stop[node] - start[node])
+    return bytes(out)
+
+
+def load_tree(data: bytes) -> QueryTree:
+    """
+    Decode a QueryTree encoded by dump_tree.
+
+    Parameters:
+    data (bytes): The encoded tree.
+
+    Returns:
+    QueryTree: The decoded tree, with its own copy of the source text.
+
+    Raises:
+    ValueError: If the data is not a valid encoded tree.
+    """
+    reader = _Reader(data, TREE_MAGIC)
+    types = reader.types()
+    source = reader.text()
+    count = reader.varint()
+    values = reader.varints(2 * count)
+    words = values[0::2]
+    tree = QueryTree.from_preorder(types, source, [word >> 2 for word in words],
+                                   [word & 3 for word in words], values[1::2])
+    reader.finish()
+    return tree
+
+
+def dump_dict(tree: Mapping) -> bytes:
+    """
+    Encode a dict-form tree, such as tree_to_dict output or a test fixture.
+
+    Values are stored once in an interned string table and referenced by
+    varint index; types are stored once in a type table.
+
+    Parameters:
+    tree (Mapping): A {"type": "ROOT", "children": [...]} tree whose nodes
+        have "type", "value" and "is_group" keys and, for groups, "children".
+
+    Returns:
+    bytes: The encoded tree.
+
+    Raises:
+    ValueError: If a node lacks one of the expected keys.
+    """
+    try:
+        type_ids: Dict[NodeType, int] = {tree["type"]: 0}
+        children = tree["children"]
+    except (KeyError, TypeError):
+        raise ValueError("The tree needs type and children keys")
+    string_ids: Dict[str, int] = {}
+    body = bytearray()
+    _write_varint(body, len(children))
+    stack = [iter(children)]
+    while stack:
+        for node in stack[-1]:
+            try:
+                node_type, value = node["type"], node["value"]
+                children = node["children"] if node["is_group"] else None
+            except (KeyError, TypeError):
+                raise ValueError("Tree nodes need type, value and is_group keys")
+            type_id = type_ids.setdefault(node_type, len(type_ids))
+            string_id = string_ids.setdefault(value, len(string_ids))
+            _write_varint(body, type_id << 1 | (children is not None))
+            _write_varint(body, string_id)
+            if children is not None:
+                _write_varint(body, len(children))
+                stack.append(iter(children))
+                break
+        else:
+            stack.pop()
+
+    out = bytearray(DICT_MAGIC)
+    _write_types(out, list(type_ids))
+    _write_varint(out, len(string_ids))
+    for value in string_ids:
+        _write_str(out, value)
+    out += body
+    return bytes(out)
+
+
+def load_dict(data: bytes) -> Dict:
+    """
+    Decode a dict-form tree encoded by dump_dict.
+
+    Parameters:
+    data (bytes): The encoded tree.
+
+    Returns:
+    Dict: The tree as plain dictionaries; token types come back as sqlparse
+    token types and group names as strings, as they were dumped.
+
+    Raises:
+    ValueError: If the data is not a valid encoded tree.
+    """
+    reader = _Reader(data, DICT_MAGIC)
+    types = reader.types()
+    strings = [reader.text() for _ in range(reader.varint())]
+    if not types:
+        raise ValueError("Serialized tree has no root type")
+    root = {"type": types[0], "children": []}
+    # Each frame holds a children list being filled and how many children it still needs.
+    stack: List[List] = [[root["children"], reader.varint()]]
+    try:
+        while stack:
+            if stack[-1][1] == 0:
+                stack.pop()
+                continue
+            word = reader.varint()
+            node = {"type": types[word >> 1], "value": strings[reader.varint()], "is_group": bool(word & 1)}
+            frame = stack[-1]
+            frame[0].append(node)
+            frame[1] -= 1
+            if word & 1:
+                node["children"] = []
+                stack.append([node["children"], reader.varint()])
+    except IndexError:
+        raise ValueError("Invalid index in serialized tree")
+    reader.finish()
+    return root
+
+
+def iter_json(tree: Union[QueryTree, Mapping], spans: bool = False) -> Iterator[str]:
+    """
+    Stream the JSON text of a tree node by node, without building the dict form.
+
+    Parameters:
+    tree (Union[QueryTree, Mapping]): A QueryTree, or a dict-form tree such as
+        the view returned by tree_to_dict. Token types are written as strings.
+    spans (bool): For a QueryTree, write "span": [start, stop] instead of
+        "value", with the source text once on the root.
+
+    Returns:
+    Iterator[str]: Pieces of JSON text that concatenate to the whole document.
+    """
+    if isinstance(tree, QueryTree):
+        yield from _iter_tree_json(tree, spans)
+    else:
+        yield from _iter_dict_json(tree)
+
+
+def write_json(tree: Union[QueryTree, Mapping], fp: TextIO, spans: bool = False, buffer_size: int = 1 << 16):
+    """
+    Write the JSON text of a tree to a text stream, in buffered pieces.
+
+    Parameters:
+    tree (Union[QueryTree, Mapping]): A QueryTree or a dict-form tree.
+    fp (TextIO): The stream to write to.
+    spans (bool): For a QueryTree, write source offsets instead of values.
+    buffer_size (int): Approximate number of characters written at once.
+    """
+    pending: List[str] = []
+    size = 0
+    for piece in iter_json(tree, spans=spans):
+        pending.append(piece)
+        size += len(piece)
+        if size >= buffer_size:
+            fp.write("".join(pending))
+            pending, size = [], 0
+    if pending:
+        fp.write("".join(pending))
+
+
+def dumps_json(tree: Union[QueryTree, Mapping], spans: bool = False) -> str:
+    """
+    Return the JSON text of a tree as one string.
+
+    Parameters:
+    tree (Union[QueryTree, Mapping]): A QueryTree or a dict-form tree.
+    spans (bool): For a QueryTree, write source offsets instead of values.
+
+    Returns:
+    str: The JSON document.
+    """
+    return "".join(iter_json(tree, spans=spans))
+
+
+def _iter_tree_json(tree: QueryTree, spans: bool) -> Iterator[str]:
+    encode = json.encoder.encode_basestring_ascii
+    type_names = [encode(str(node_type)) for node_type in tree.types]
+    kind, group, keyword, start, stop, parent = tree.kind, tree.group, tree.keyword, tree.start, tree.stop, tree.parent
+    source = tree.source
+    yield '{"type": "ROOT", "children": ['
+    # Parents of the currently open groups, innermost last.
+    open_groups = [-1]
+    first = True
+    for node in range(len(kind)):
+        while parent[node] != open_groups[-1]:
+            open_groups.pop()
+            first = False
+            yield "]}"
+        prefix = "" if first else ", "
+        if spans:
+            text = f'"span": [{start[node]}, {stop[node]}]'
+        else:
+            value = source[start[node]:stop[node]]
+            text = '"value": ' + encode(value.upper() if keyword[node] else value)
+        if group[node]:
+            yield f'{prefix}{{"type": {type_names[kind[node]]}, {text}, "is_group": true, "children": ['
+            open_groups.append(node)
+            first = True
+        else:
+            yield f'{prefix}{{"type": {type_names[kind[node]]}, {text}, "is_group": false}}'
+            first = False
+    for _ in open_groups[1:]:
+        yield "]}"
+    if spans:
+        yield '], "source": ' + encode(source[:tree.text_length]) + "}"
+    else:
+        yield "]}"
+
+
+def _iter_dict_json(tree: Mapping) -> Iterator[str]:
+    encode = json.encoder.encode_basestring_ascii
+    yield '{"type": ' + encode(str(tree["type"])) + ', "children": ['
+    stack = [iter(tree["children"])]
+    first = True
+    while stack:
+        for node in stack[-1]:
+            prefix = "" if first else ", "
+            head = (f'{prefix}{{"type": {encode(str(node["type"]))}, "value": {encode(node["value"])}, '
+                    f'"is_group": {"true" if node["is_group"] else "false"}')
+            if node["is_group"]:
+                yield head + ', "children": ['
+                stack.append(iter(node["children"]))
+                first = True
+                break
+            yield head + "}"
+            first = False
+        else:
+            stack.pop()
+            first = False
+            yield "]}"
+
+
+def _write_varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _write_str(out: bytearray, value: str):
+    encoded = value.encode("utf-8", "surrogatepass")
+    _write_varint(out, len(encoded))
+    out += encoded
+
+
+def _write_types(out: bytearray, types: List[NodeType]):
+    _write_varint(out, len(types))
+    for node_type in types:
+        if isinstance(node_type, _TokenType):
+            out.append(_TOKEN_TYPE)
+            _write_str(out, str(node_type))
+        else:
+            out.append(_TYPE_NAME)
+            _write_str(out, node_type)
+
+
+def _token_type(name: str) -> _TokenType:
+    parts = name.split(".")
+    if parts[0] != "Token":
+        raise ValueError(f"Unknown token type: {name}")
+    ttype = T.Token
+    for part in parts[1:]:
+        ttype = getattr(ttype, part)
+    return ttype
+
+
+class _Reader:
+    def __init__(self, data: bytes, magic: bytes):
+        if not isinstance(data, (bytes, bytearray, memoryview)) or bytes(data[:len(magic)]) != magic:
+            raise ValueError("Data is not a serialized tree")
+        self.data = memoryview(data)
+        self.position = len(magic)
+
+    def varint(self) -> int:
+        data, position = self.data, self.position
+        try:
+            byte = data[position]
+            if byte < 0x80:
+                self.position = position + 1
+                return byte
+            value = 0
+            shift = 0
+            while byte >= 0x80:
+                value |= (byte & 0x7F) << shift
+                shift += 7
+                position += 1
+                byte = data[position]
+        except IndexError:
+            raise ValueError("Serialized tree is truncated")
+        self.position = position + 1
+        return value | byte << shift
+
+    def varints(self, count: int) -> List[int]:
+        data = self.data
+        position = self.position
+        values = []
+        append = values.append
+        try:
+            for _ in range(count):
+                byte = data[position]
+                position += 1
+                if byte < 0x80:
+                    append(byte)
+                    continue
+                value = byte & 0x7F
+                shift = 7
+                byte = data[position]
+                position += 1
+                while byte >= 0x80:
+                    value |= (byte & 0x7F) << shift
+                    shift += 7
+                    byte = data[position]
+                    position += 1
+                append(value | byte << shift)
+        except IndexError:
+            raise ValueError("Serialized tree is truncated")
+        self.position = position
+        return values
+
+    def text(self) -> str:
+        length = self.varint()
+        end = self.position + length
+        if end > len(self.data):
+            raise ValueError("Serialized tree is truncated")
+        value = str(self.data[self.position:end], "utf-8", "surrogatepass")
+        self.position = end
+        return value
+
+    def types(self) -> List[NodeType]:
+        types: List[NodeType] = []
+        for _ in range(self.varint()):
+            if self.position >= len(self.data):
+                raise ValueError("Serialized tree is truncated")
+            tag = self.data[self.position]
+            self.position += 1
+            name = self.text()
+            types.append(_token_type(name) if tag == _TOKEN_TYPE else name)
+        return types
+
+    def finish(self):
+        if self.position != len(self.data):
+            raise ValueError("Unexpected data after serialized tree")
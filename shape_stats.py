@@ -0,0 +1,510 @@
+import heapq
+import json
+import os
+from array import array
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple, Union
+from sqlparse import tokens as T
+from bulk_lexer import LexedCorpus, lex_many
+from fingerprint import Fingerprint, fingerprint_pairs, fingerprint_tokens
+from sketches import CountMinSketch, HyperLogLog, TDigest
+from sql_query import SqlQuery
+
+
+STATS_VERSION = 1
+
+# Token-count histogram buckets: bucket b holds queries of 2**(b - 1) to 2**b - 1 tokens.
+HISTOGRAM_BUCKETS = 32
+
+
+class ShapeSummary(NamedTuple):
+    """
+    Statistics of one query shape, i.e. one fingerprint.
+
+    Attributes:
+    fingerprint (str): The canonical text of the shape.
+    hash (int): The 64-bit fingerprint hash.
+    count (int): Estimated number of queries of this shape, from the count-min
+        sketch; never below the true count.
+    tracked (int): Queries counted since the shape was last admitted to the
+        tracked set; the statistics below cover those.
+    token_histogram (Tuple[int, ...]): Query counts per token-count bucket,
+        see HISTOGRAM_BUCKETS.
+    min_tokens (int): Fewest significant tokens in a query of this shape.
+    max_tokens (int): Most significant tokens in a query of this shape.
+    max_depth (int): Deepest nesting of the parsed tree.
+    tables (Tuple[str, ...]): Tables the shape touches, lower-cased and schema-qualified,
+        without CTE names; at most max_tables of them.
+    """
+    fingerprint: str
+    hash: int
+    count: int
+    tracked: int
+    token_histogram: Tuple[int, ...]
+    min_tokens: int
+    max_tokens: int
+    max_depth: int
+    tables: Tuple[str, ...]
+
+
+class _Shape:
+    __slots__ = ("text", "count", "histogram", "min_tokens", "max_tokens", "max_depth", "tables")
+
+    def __init__(self, text: str, max_depth: int, tables: Set[str]):
+        self.text = text
+        self.count = 0
+        self.histogram = array("Q", bytes(8 * HISTOGRAM_BUCKETS))
+        self.min_tokens = 0
+        self.max_tokens = 0
+        self.max_depth = max_depth
+        self.tables = tables
+
+    def add(self, tokens: int):
+        self.histogram[min(tokens.bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+        if not self.count or tokens < self.min_tokens:
+            self.min_tokens = tokens
+        if tokens > self.max_tokens:
+            self.max_tokens = tokens
+        self.count += 1
+
+    def merge(self, other: "_Shape", max_tables: int):
+        for bucket, value in enumerate(other.histogram):
+            self.histogram[bucket] += value
+        if other.count:
+            self.min_tokens = min(self.min_tokens, other.min_tokens) if self.count else other.min_tokens
+            self.max_tokens = max(self.max_tokens, other.max_tokens)
+        self.count += other.count
+        self.max_depth = max(self.max_depth, other.max_depth)
+        for table in sorted(other.tables - self.tables)[:max(max_tables - len(self.tables), 0)]:
+            self.tables.add(table)
+
+
+class ShapeStats:
+    """
+    Streaming per-fingerprint statistics of a query log, in bounded memory.
+
+    Every query is lexed once for its fingerprint and token count; sqlparse's
+    grouping pass, needed for the nesting depth and the tables, only runs the
+    first time a shape enters the tracked set, since queries that share a
+    fingerprint share their structure and identifiers. Frequencies go to a
+    count-min sketch, distinct shapes to a HyperLogLog, and token counts and
+    query lengths to t-digests. Detailed statistics are kept for the
+    max_shapes most frequent shapes: a new shape replaces the least frequent
+    tracked one once its estimated count exceeds that shape's.
+
+    Instances built with the same parameters can be merged, e.g. across
+    worker processes, and dumped to and loaded from a JSON file.
+
+    Attributes:
+    queries (int): Number of queries added.
+    errors (int): Number of queries that could not be processed.
+    frequencies (CountMinSketch): Query counts per fingerprint hash.
+    distinct (HyperLogLog): Distinct fingerprint hashes.
+    token_counts (TDigest): Distribution of significant tokens per query.
+    lengths (TDigest): Distribution of query lengths in characters.
+    """
+
+    def __init__(self, max_shapes: int = 1000, width: int = 2048, depth: int = 4, precision: int = 12,
+                 compression: int = 100, max_tables: int = 32):
+        """
+        Initialize the ShapeStats.
+
+        Parameters:
+        max_shapes (int): Number of shapes tracked in detail.
+        width (int): Counters per row of the count-min sketch.
+        depth (int): Rows of the count-min sketch.
+        precision (int): Index bits of the HyperLogLog.
+        compression (int): Compression of the t-digests.
+        max_tables (int): Tables kept per shape.
+
+        Raises:
+        ValueError: If a parameter is out of range.
+        """
+        if max_shapes < 1 or max_tables < 0:
+            raise ValueError("max_shapes must be positive and max_tables not negative")
+        self.max_shapes = max_shapes
+        self.max_tables = max_tables
+        self.queries = 0
+        self.errors = 0
+        self.frequencies = CountMinSketch(width, depth)
+        self.distinct = HyperLogLog(precision)
+        self.token_counts = TDigest(compression)
+        self.lengths = TDigest(compression)
+        self._shapes: Dict[int, _Shape] = {}
+        # Min-heap of (estimated count, hash) of the tracked shapes. Estimates
+        # only grow, so a stored count is a lower bound, refreshed when it
+        # reaches the top; entries of shapes no longer tracked are skipped.
+        self._heap: List[Tuple[int, int]] = []
+        self._sql_query = SqlQuery()
+
+    def _parameters(self) -> Tuple:
+        return (self.max_shapes, self.max_tables, self.frequencies.width, self.frequencies.depth,
+                self.distinct.precision, self.token_counts.compression)
+
+    def add(self, query: str) -> Optional[int]:
+        """
+        Add one query.
+
+        Parameters:
+        query (str): The SQL query, e.g. a line of a query log.
+
+        Returns:
+        Optional[int]: The fingerprint hash of the query, or None if it could
+        not be processed and was counted in errors.
+        """
+        self.queries += 1
+        try:
+            self._sql_query.set_query(query, normalize=False)
+            leaves = self._sql_query.tokens()
+        except ValueError:
+            self.errors += 1
+            return None
+        tokens = sum(1 for token in leaves if not _insignificant(token.ttype))
+        return self._record(query, fingerprint_tokens(leaves), tokens)
+
+    def update(self, queries: Iterable[str], batch_size: int = 1024) -> "ShapeStats":
+        """
+        Add every query of an iterable, e.g. the lines of a log file.
+
+        Queries are lexed in batches with the bulk lexer. Surrounding
+        whitespace is stripped and blank lines are skipped.
+
+        Parameters:
+        queries (Iterable[str]): The SQL queries.
+        batch_size (int): Number of queries lexed at once.
+
+        Returns:
+        ShapeStats: This instance.
+        """
+        items = iter(queries)
+        while True:
+            chunk = list(islice(items, batch_size))
+            if not chunk:
+                return self
+            batch = []
+            for query in chunk:
+                if not isinstance(query, str):
+                    self.queries += 1
+                    self.errors += 1
+                    continue
+                query = query.strip()
+                if query:
+                    batch.append(query)
+            if batch:
+                self._add_lexed(lex_many(batch))
+
+    def _add_lexed(self, corpus: LexedCorpus):
+        skipped = bytearray(_insignificant(ttype) for ttype in corpus.types)
+        kind = corpus.kind
+        for query in range(corpus.query_count):
+            self.queries += 1
+            tokens = sum(1 for token in corpus.tokens_of(query) if not skipped[kind[token]])
+            self._record(corpus.query_text(query), fingerprint_pairs(corpus.pairs(query, normalized=True)), tokens)
+
+    def _record(self, query: str, fingerprint: Fingerprint, tokens: int) -> int:
+        key = fingerprint.hash
+        estimate = self.frequencies.add(key)
+        self.distinct.add(key)
+        self.token_counts.add(tokens)
+        self.lengths.add(len(query))
+        shape = self._shapes.get(key)
+        if shape is None and (len(self._shapes) < self.max_shapes or self._displaces(estimate)):
+            shape = self._admit(key, fingerprint.text, query, estimate)
+        if shape is not None:
+            shape.add(tokens)
+        return key
+
+    def _admit(self, key: int, text: str, query: str, estimate: int) -> _Shape:
+        # The first query of a shape is grouped for the statistics that need the tree.
+        sql_query = self._sql_query
+        try:
+            sql_query.set_query(query, normalize=False)
+            max_depth = sql_query.get_depth()
+            tables = {_table_name(table) for table in sql_query.references().tables if not table.cte}
+        except ValueError:
+            max_depth, tables = 0, set()
+        if len(tables) > self.max_tables:
+            tables = set(sorted(tables)[:self.max_tables])
+        if len(self._shapes) >= self.max_shapes:
+            self._evict()
+        shape = self._shapes[key] = _Shape(text, max_depth, tables)
+        heapq.heappush(self._heap, (estimate, key))
+        if len(self._heap) > 2 * self.max_shapes:
+            self._rebuild_heap()
+        return shape
+
+    def _displaces(self, estimate: int) -> bool:
+        # Whether a shape with this estimate is more frequent than the least
+        # frequent tracked one, which is then at the top of the heap.
+        heap = self._heap
+        while heap and estimate > heap[0][0]:
+            stored, key = heap[0]
+            if key not in self._shapes:
+                heapq.heappop(heap)
+                continue
+            current = self.frequencies.estimate(key)
+            if current == stored:
+                return True
+            heapq.heapreplace(heap, (current, key))
+        return False
+
+    def _evict(self):
+        heap = self._heap
+        while heap:
+            stored, key = heapq.heappop(heap)
+            if key not in self._shapes:
+                continue
+            current = self.frequencies.estimate(key)
+            if current == stored:
+                del self._shapes[key]
+                return
+            heapq.heappush(heap, (current, key))
+
+    def _rebuild_heap(self):
+        self._heap = [(self.frequencies.estimate(key), key) for key in self._shapes]
+        heapq.heapify(self._heap)
+
+    def estimate(self, fingerprint_hash: int) -> int:
+        """
+        Estimate how many queries of a shape were added.
+
+        Parameters:
+        fingerprint_hash (int): The fingerprint hash, e.g. from SqlQuery.fingerprint().hash.
+
+        Returns:
+        int: An upper bound on the count.
+        """
+        return self.frequencies.estimate(fingerprint_hash)
+
+    def distinct_shapes(self) -> int:
+        """
+        Estimate the number of distinct shapes added.
+
+        Returns:
+        int: The HyperLogLog estimate.
+        """
+        return self.distinct.estimate()
+
+    def top(self, count: Optional[int] = None) -> List[ShapeSummary]:
+        """
+        Return the tracked shapes, most frequent first.
+
+        Parameters:
+        count (Optional[int]): Maximum number of shapes returned; all tracked ones if None.
+
+        Returns:
+        List[ShapeSummary]: The shape statistics.
+        """
+        summaries = [ShapeSummary(shape.text, key, self.frequencies.estimate(key), shape.count,
+                                  tuple(shape.histogram), shape.min_tokens, shape.max_tokens,
+                                  shape.max_depth, tuple(sorted(shape.tables)))
+                     for key, shape in self._shapes.items()]
+        summaries.sort(key=lambda summary: (-summary.count, summary.fingerprint))
+        return summaries[:count] if count is not None else summaries
+
+    def merge(self, other: "ShapeStats") -> "ShapeStats":
+        """
+        Add the statistics of another instance built with the same parameters.
+
+        Parameters:
+        other (ShapeStats): The statistics to merge in.
+
+        Returns:
+        ShapeStats: This instance.
+
+        Raises:
+        ValueError: If the parameters differ.
+        """
+        if other._parameters() != self._parameters():
+            raise ValueError("Cannot merge shape statistics built with different parameters")
+        self.queries += other.queries
+        self.errors += other.errors
+        self.frequencies.merge(other.frequencies)
+        self.distinct.merge(other.distinct)
+        self.token_counts.merge(other.token_counts)
+        self.lengths.merge(other.lengths)
+        for key, other_shape in other._shapes.items():
+            shape = self._shapes.get(key)
+            if shape is None:
+                shape = self._shapes[key] = _Shape(other_shape.text, 0, set())
+            shape.merge(other_shape, self.max_tables)
+        if len(self._shapes) > self.max_shapes:
+            estimates = {key: self.frequencies.estimate(key) for key in self._shapes}
+            kept = sorted(estimates, key=lambda key: (-estimates[key], key))[:self.max_shapes]
+            self._shapes = {key: self._shapes[key] for key in kept}
+        self._rebuild_heap()
+        return self
+
+    def to_dict(self) -> Dict:
+        """
+        Convert the statistics into JSON-compatible dictionaries.
+
+        Returns:
+        Dict: The parameters, counters, sketches and tracked shapes.
+        """
+        return {
+            "version": STATS_VERSION,
+            "max_shapes": self.max_shapes,
+            "max_tables": self.max_tables,
+            "queries": self.queries,
+            "errors": self.errors,
+            "frequencies": self.frequencies.to_dict(),
+            "distinct": self.distinct.to_dict(),
+            "token_counts": self.token_counts.to_dict(),
+            "lengths": self.lengths.to_dict(),
+            "shapes": [
+                {"hash": key, "fingerprint": shape.text, "count": shape.count,
+                 "histogram": list(shape.histogram), "min_tokens": shape.min_tokens,
+                 "max_tokens": shape.max_tokens, "max_depth": shape.max_depth,
+                 "tables": sorted(shape.tables)}
+                for key, shape in self._shapes.items()
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ShapeStats":
+        """
+        Rebuild statistics converted by to_dict.
+
+        Parameters:
+        data (Dict): The dictionary form.
+
+        Returns:
+        ShapeStats: The statistics.
+
+        Raises:
+        ValueError: If the data is not valid statistics of this version.
+        """
+        try:
+            if data.get("version") != STATS_VERSION:
+                raise ValueError(f"Unsupported statistics version: {data.get('version')}")
+            stats = cls(data["max_shapes"], max_tables=data["max_tables"])
+            stats.queries = data["queries"]
+            stats.errors = data["errors"]
+            stats.frequencies = CountMinSketch.from_dict(data["frequencies"])
+            stats.distinct = HyperLogLog.from_dict(data["distinct"])
+            stats.token_counts = TDigest.from_dict(data["token_counts"])
+            stats.lengths = TDigest.from_dict(data["lengths"])
+            for entry in data["shapes"]:
+                shape = _Shape(entry["fingerprint"], entry["max_depth"], set(entry["tables"]))
+                shape.count = entry["count"]
+                shape.histogram = array("Q", entry["histogram"])
+                shape.min_tokens = entry["min_tokens"]
+                shape.max_tokens = entry["max_tokens"]
+                if len(shape.histogram) != HISTOGRAM_BUCKETS:
+                    raise ValueError("Invalid token histogram")
+                stats._shapes[entry["hash"]] = shape
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Invalid shape statistics: {e}")
+        stats._rebuild_heap()
+        return stats
+
+    def dump(self, path: Union[str, "os.PathLike[str]"]):
+        """
+        Write the statistics to a JSON file.
+
+        Parameters:
+        path (Union[str, os.PathLike]): The file to write.
+        """
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.to_dict(), file)
+
+    @classmethod
+    def load(cls, path: Union[str, "os.PathLike[str]"]) -> "ShapeStats":
+        """
+        Read statistics written by dump.
+
+        Parameters:
+        path (Union[str, os.PathLike]): The file to read.
+
+        Returns:
+        ShapeStats: The statistics.
+
+        Raises:
+        ValueError: If the file does not hold valid statistics.
+        """
+        with open(path, "r", encoding="utf-8") as file:
+            try:
+                data = json.load(file)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid shape statistics: {e}")
+        return cls.from_dict(data)
+
+    def __getstate__(self):
+        # The scratch SqlQuery holds parsed trees; workers send back only the statistics.
+        state = self.__dict__.copy()
+        del state["_sql_query"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._sql_query = SqlQuery()
+
+
+def shape_stats_for_chunk(queries: List[str], options: Dict) -> ShapeStats:
+    """
+    Compute the statistics of a chunk of queries; the unit of work sent to a worker process.
+
+    Parameters:
+    queries (List[str]): The SQL queries.
+    options (Dict): Keyword arguments for ShapeStats.
+
+    Returns:
+    ShapeStats: The statistics of the chunk.
+    """
+    return ShapeStats(**options).update(queries)
+
+
+def collect_shape_stats(queries: Iterable[str], chunk_size: int = 4096, max_workers: Optional[int] = None,
+                        **options) -> ShapeStats:
+    """
+    Compute shape statistics across a pool of worker processes.
+
+    The input is consumed lazily with a bounded number of chunks in flight,
+    and each worker's statistics are merged as they complete.
+
+    Parameters:
+    queries (Iterable[str]): The SQL queries, e.g. the lines of a log file.
+    chunk_size (int): Number of queries sent to a worker at once.
+    max_workers (Optional[int]): Size of the process pool; defaults to the CPU
+        count. With 1, the queries are processed in this process.
+    **options: Keyword arguments for ShapeStats.
+
+    Returns:
+    ShapeStats: The merged statistics.
+
+    Raises:
+    ValueError: If chunk_size is not positive.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be positive")
+    stats = ShapeStats(**options)
+    if max_workers == 1:
+        return stats.update(queries)
+    workers = max_workers or os.cpu_count() or 1
+    max_in_flight = 2 * workers
+    items = iter(queries)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < max_in_flight:
+                chunk = list(islice(items, chunk_size))
+                if chunk:
+                    pending.add(pool.submit(shape_stats_for_chunk, chunk, options))
+                exhausted = not chunk
+            if not pending:
+                return stats
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stats.merge(future.result())
+
+
+def _insignificant(ttype) -> bool:
+    return ttype in T.Whitespace or ttype in T.Comment
+
+
+def _table_name(table) -> str:
+    name = f"{table.schema}.{table.name}" if table.schema else table.name
+    return name.lower()
@@ -0,0 +1,403 @@
+import base64
+import math
+from array import array
+from bisect import bisect_right
+from typing import Dict, List, Tuple
+
+
+_MASK = (1 << 64) - 1
+
+
+def mix64(key: int) -> int:
+    """
+    Scramble a 64-bit integer (the splitmix64 finalizer).
+
+    Parameters:
+    key (int): The key; only its low 64 bits are used.
+
+    Returns:
+    int: A well-distributed unsigned 64-bit hash of the key.
+    """
+    key = (key + 0x9E3779B97F4A7C15) & _MASK
+    key = ((key ^ (key >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+    key = ((key ^ (key >> 27)) * 0x94D049BB133111EB) & _MASK
+    return key ^ (key >> 31)
+
+
+class CountMinSketch:
+    """
+    Approximate frequencies of integer keys in fixed memory.
+
+    Estimates never undercount; with width w and depth d they overcount by
+    at most e/w of the total count with probability 1 - exp(-d).
+    """
+
+    def __init__(self, width: int = 2048, depth: int = 4):
+        """
+        Initialize the CountMinSketch.
+
+        Parameters:
+        width (int): Counters per row.
+        depth (int): Number of rows, each with its own hash.
+
+        Raises:
+        ValueError: If width or depth is not positive.
+        """
+        if width < 1 or depth < 1:
+            raise ValueError("width and depth must be positive")
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        self.counters = array("Q", bytes(8 * width * depth))
+
+    def _cells(self, key: int) -> List[int]:
+        hashed = mix64(key)
+        low, high = hashed & 0xFFFFFFFF, hashed >> 32 | 1
+        width = self.width
+        return [row * width + (low + row * high) % width for row in range(self.depth)]
+
+    def add(self, key: int, count: int = 1) -> int:
+        """
+        Count occurrences of a key.
+
+        Parameters:
+        key (int): The key, e.g. a fingerprint hash.
+        count (int): Number of occurrences to add.
+
+        Returns:
+        int: The new estimate for the key.
+        """
+        counters = self.counters
+        estimate = None
+        for cell in self._cells(key):
+            counters[cell] += count
+            if estimate is None or counters[cell] < estimate:
+                estimate = counters[cell]
+        self.total += count
+        return estimate
+
+    def estimate(self, key: int) -> int:
+        """
+        Estimate how often a key was counted.
+
+        Parameters:
+        key (int): The key.
+
+        Returns:
+        int: An upper bound on the key's count.
+        """
+        counters = self.counters
+        return min(counters[cell] for cell in self._cells(key))
+
+    def merge(self, other: "CountMinSketch") -> "CountMinSketch":
+        """
+        Add the counts of another sketch with the same dimensions.
+
+        Parameters:
+        other (CountMinSketch): The sketch to merge in.
+
+        Returns:
+        CountMinSketch: This sketch.
+
+        Raises:
+        ValueError: If the dimensions differ.
+        """
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("Cannot merge count-min sketches of different dimensions")
+        counters = self.counters
+        for cell, value in enumerate(other.counters):
+            if value:
+                counters[cell] += value
+        self.total += other.total
+        return self
+
+    def to_dict(self) -> Dict:
+        return {"width": self.width, "depth": self.depth, "total": self.total,
+                "counters": _encode(self.counters)}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "CountMinSketch":
+        sketch = cls(data["width"], data["depth"])
+        sketch.total = data["total"]
+        sketch.counters = _decode("Q", data["counters"], sketch.width * sketch.depth)
+        return sketch
+
+
+class HyperLogLog:
+    """
+    Approximate number of distinct 64-bit hashes in fixed memory.
+
+    With precision p the sketch holds 2**p one-byte registers and its
+    relative standard error is about 1.04 / sqrt(2**p).
+    """
+
+    def __init__(self, precision: int = 12):
+        """
+        Initialize the HyperLogLog.
+
+        Parameters:
+        precision (int): Number of index bits, from 4 to 18.
+
+        Raises:
+        ValueError: If precision is out of range.
+        """
+        if not 4 <= precision <= 18:
+            raise ValueError("precision must be between 4 and 18")
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, hashed: int):
+        """
+        Record a hash. Callers pass uniformly distributed hashes, such as
+        fingerprint hashes; other keys should be scrambled with mix64 first.
+
+        Parameters:
+        hashed (int): An unsigned 64-bit hash.
+        """
+        precision = self.precision
+        index = hashed >> (64 - precision)
+        rest = hashed & ((1 << (64 - precision)) - 1)
+        rank = 64 - precision - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def estimate(self) -> int:
+        """
+        Estimate the number of distinct hashes recorded.
+
+        Returns:
+        int: The estimated cardinality.
+        """
+        registers = self.registers
+        size = len(registers)
+        alpha = 0.7213 / (1 + 1.079 / size) if size >= 128 else {16: 0.673, 32: 0.697, 64: 0.709}[size]
+        raw = alpha * size * size / sum(2.0 ** -register for register in registers)
+        zeros = registers.count(0)
+        if raw <= 2.5 * size and zeros:
+            # Linear counting is more accurate for small cardinalities.
+            return round(size * math.log(size / zeros))
+        return round(raw)
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        """
+        Combine with another sketch of the same precision, as if it had seen both streams.
+
+        Parameters:
+        other (HyperLogLog): The sketch to merge in.
+
+        Returns:
+        HyperLogLog: This sketch.
+
+        Raises:
+        ValueError: If the precisions differ.
+        """
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches of different precisions")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def to_dict(self) -> Dict:
+        return {"precision": self.precision, "registers": base64.b64encode(self.registers).decode("ascii")}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "HyperLogLog":
+        sketch = cls(data["precision"])
+        registers = base64.b64decode(data["registers"])
+        if len(registers) != len(sketch.registers):
+            raise ValueError("Invalid HyperLogLog registers")
+        sketch.registers = bytearray(registers)
+        return sketch
+
+
+class TDigest:
+    """
+    Approximate quantiles of a stream of numbers in bounded memory.
+
+    Values are buffered and periodically merged into at most about
+    compression centroids, kept small near the tails so that extreme
+    quantiles such as p99 stay accurate.
+    """
+
+    def __init__(self, compression: int = 100):
+        """
+        Initialize the TDigest.
+
+        Parameters:
+        compression (int): Accuracy parameter; roughly the number of centroids kept.
+
+        Raises:
+        ValueError: If compression is below 20.
+        """
+        if compression < 20:
+            raise ValueError("compression must be at least 20")
+        self.compression = compression
+        self.means: List[float] = []
+        self.weights: List[float] = []
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._buffer: List[Tuple[float, float]] = []
+
+    def add(self, value: float, weight: float = 1):
+        """
+        Record a value.
+
+        Parameters:
+        value (float): The value.
+        weight (float): How many times the value occurred.
+        """
+        self._buffer.append((value, weight))
+        self.count += weight
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if len(self._buffer) >= 5 * self.compression:
+            self._compress()
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        items = sorted(list(zip(self.means, self.weights)) + self._buffer)
+        self._buffer = []
+        total = sum(weight for _, weight in items)
+        scale = self.compression / (2 * math.pi)
+        means: List[float] = []
+        weights: List[float] = []
+        mean, weight = items[0]
+        merged = 0.0
+        # A centroid may grow while it spans at most one unit of the k1 scale function.
+        limit = total * _k_to_q(_q_to_k(0.0, scale) + 1, scale)
+        for value, value_weight in items[1:]:
+            if merged + weight + value_weight <= limit:
+                weight += value_weight
+                mean += (value - mean) * value_weight / weight
+            else:
+                merged += weight
+                means.append(mean)
+                weights.append(weight)
+                limit = total * _k_to_q(_q_to_k(merged / total, scale) + 1, scale)
+                mean, weight = value, value_weight
+        means.append(mean)
+        weights.append(weight)
+        self.means, self.weights = means, weights
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate a quantile of the recorded values.
+
+        Parameters:
+        q (float): The quantile, between 0 and 1.
+
+        Returns:
+        float: The estimated value, or NaN if nothing was recorded.
+
+        Raises:
+        ValueError: If q is outside [0, 1].
+        """
+        if not 0 <= q <= 1:
+            raise ValueError("q must be between 0 and 1")
+        self._compress()
+        means, weights = self.means, self.weights
+        if not means:
+            return math.nan
+        if len(means) == 1:
+            return means[0]
+        index = q * self.count
+        if index <= weights[0] / 2:
+            return self.min + (means[0] - self.min) * index / (weights[0] / 2) if weights[0] > 1 else means[0]
+        position = weights[0] / 2
+        for i in range(len(means) - 1):
+            step = (weights[i] + weights[i + 1]) / 2
+            if index <= position + step:
+                return means[i] + (means[i + 1] - means[i]) * (index - position) / step
+            position += step
+        tail = self.count - position
+        if weights[-1] > 1 and tail > 0:
+            return means[-1] + (self.max - means[-1]) * min((index - position) / tail, 1.0)
+        return means[-1]
+
+    def cdf(self, value: float) -> float:
+        """
+        Estimate the fraction of recorded values at or below a value.
+
+        Parameters:
+        value (float): The value.
+
+        Returns:
+        float: A fraction between 0 and 1, or NaN if nothing was recorded.
+        """
+        self._compress()
+        if not self.means:
+            return math.nan
+        if value < self.min:
+            return 0.0
+        if value >= self.max:
+            return 1.0
+        index = bisect_right(self.means, value)
+        below = sum(self.weights[:index]) - (self.weights[index - 1] / 2 if index else 0)
+        return min(max(below / self.count, 0.0), 1.0)
+
+    def merge(self, other: "TDigest") -> "TDigest":
+        """
+        Add the values recorded by another digest.
+
+        Parameters:
+        other (TDigest): The digest to merge in.
+
+        Returns:
+        TDigest: This digest.
+        """
+        other._compress()
+        self._buffer.extend(zip(other.means, other.weights))
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def to_dict(self) -> Dict:
+        self._compress()
+        return {"compression": self.compression, "count": self.count,
+                "min": self.min if self.means else None, "max": self.max if self.means else None,
+                "means": self.means, "weights": self.weights}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "TDigest":
+        digest = cls(data["compression"])
+        if len(data["means"]) != len(data["weights"]):
+            raise ValueError("Invalid t-digest centroids")
+        digest.means = [float(mean) for mean in data["means"]]
+        digest.weights = [float(weight) for weight in data["weights"]]
+        digest.count = data["count"]
+        if digest.means:
+            digest.min, digest.max = data["min"], data["max"]
+        return digest
+
+
+def _q_to_k(q: float, scale: float) -> float:
+    return scale * math.asin(2 * min(max(q, 0.0), 1.0) - 1)
+
+
+def _k_to_q(k: float, scale: float) -> float:
+    if k >= scale * math.pi / 2:
+        return 1.0
+    return (math.sin(k / scale) + 1) / 2
+
+
+def _encode(values: array) -> str:
+    # Little-endian on every platform, so dumps can move between machines.
+    data = array(values.typecode, values)
+    if data.itemsize > 1 and array("H", [1]).tobytes()[0] != 1:
+        data.byteswap()
+    return base64.b64encode(data.tobytes()).decode("ascii")
+
+
+def _decode(typecode: str, text: str, length: int) -> array:
+    values = array(typecode)
+    values.frombytes(base64.b64decode(text))
+    if values.itemsize > 1 and array("H", [1]).tobytes()[0] != 1:
+        values.byteswap()
+    if len(values) != length:
+        raise ValueError("Invalid sketch counters")
+    return values
@@ -0,0 +1,153 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from sqlparse.sql import Token
+from instrumentation import stage
+from limits import ParseLimits, Summary, apply_limits
+from query_processor import QueryProcessor
+from query_tree import NodeType, NodeView, QueryTree
+from token_processor import iter_leaves
+
+
+@dataclass(frozen=True)
+class ParseResult:
+    """
+    The immutable outcome of parsing one query.
+
+    Results may be shared freely between threads: nothing on them changes
+    after they are built, and derived forms are computed on each call.
+
+    Attributes:
+    query (str): The query that was parsed; reduced if the limits summarized parts of it.
+    normalized_query (Optional[str]): The normalized query, if normalization was requested.
+    tokens (Tuple[Token, ...]): The top-level tokens of the tree. They may be shared
+        through the parse cache and must be treated as read-only.
+    tree (QueryTree): The compact form of the token tree.
+    summaries (Tuple[Summary, ...]): What the limits collapsed in degraded mode.
+    """
+    query: str
+    normalized_query: Optional[str]
+    tokens: Tuple[Token, ...]
+    tree: QueryTree
+    summaries: Tuple[Summary, ...] = ()
+
+    def flatten_tree(self) -> List[str]:
+        """
+        Return the normalized strings of the leaf tokens, in document order.
+
+        Returns:
+        List[str]: A list of token strings.
+        """
+        return [token.normalized for token in iter_leaves(self.tokens)]
+
+    def tree_to_dict(self, spans: bool = False) -> Dict:
+        """
+        Convert the tree into plain dictionaries.
+
+        Parameters:
+        spans (bool): If True, give nodes [start, stop] offsets instead of their text.
+
+        Returns:
+        Dict: A dictionary representation of the token tree.
+        """
+        return self.tree.to_dict(spans=spans)
+
+    def find_tokens(self, token_type: NodeType) -> List[NodeView]:
+        """
+        Find all tokens of a specific type in the tree.
+
+        Parameters:
+        token_type (NodeType): A group class name or a sqlparse token type.
+
+        Returns:
+        List[NodeView]: Dict views of the matching nodes, in document order.
+        """
+        return [NodeView(self.tree, node) for node in self.tree.find_tokens(token_type)]
+
+    def get_depth(self) -> int:
+        return self.tree.get_depth()
+
+    def count_nodes(self) -> int:
+        return self.tree.count_nodes()
+
+
+class Parser:
+    """
+    Stateless, thread-safe parser facade.
+
+    A Parser holds only its configuration, so one instance can serve every
+    thread of a process. Each call returns a new ParseResult; repeated queries
+    are served from the process-wide parse cache, and the sqlparse filter
+    stacks used for normalizing are pooled and reused across calls.
+    """
+
+    def __init__(self, normalize: bool = True, tokens_only: bool = False,
+                 limits: Optional[ParseLimits] = None):
+        """
+        Initialize the Parser.
+
+        Parameters:
+        normalize (bool): If True, build the tree from the normalized query.
+        tokens_only (bool): If True, skip grouping: the tree is the flat lexical token stream.
+        limits (Optional[ParseLimits]): Limits checked before each parse.
+        """
+        self._normalize = normalize
+        self._tokens_only = tokens_only
+        self._limits = limits
+
+    @property
+    def normalize(self) -> bool:
+        return self._normalize
+
+    @property
+    def tokens_only(self) -> bool:
+        return self._tokens_only
+
+    @property
+    def limits(self) -> Optional[ParseLimits]:
+        return self._limits
+
+    def parse(self, query: str) -> ParseResult:
+        """
+        Parse one query.
+
+        Parameters:
+        query (str): The SQL query.
+
+        Returns:
+        ParseResult: The immutable result.
+
+        Raises:
+        ValueError: If the query is empty or cannot be parsed.
+        LimitExceededError: If the query exceeds the limits.
+        """
+        with stage("parser"):
+            if not query:
+                raise ValueError("Query cannot be empty")
+            summaries: Tuple[Summary, ...] = ()
+            if self._limits is not None:
+                bounded = apply_limits(query, self._limits)
+                query, summaries = bounded.text, bounded.summaries
+
+            processor = QueryProcessor(query)
+            normalized = None
+            if self._tokens_only:
+                if self._normalize:
+                    normalized = processor.normalize_query()
+                tokens = processor.lex_query()
+            elif self._normalize:
+                normalized, tokens = processor.process_query()
+            else:
+                tokens = processor.parse_query()
+            return ParseResult(query, normalized, tuple(tokens),
+                               _build_tree(tokens, normalized, query), summaries)
+
+
+def _build_tree(tokens: List[Token], normalized: Optional[str], query: str) -> QueryTree:
+    # Share the query text as the span source instead of copying every token.
+    for source in (normalized, query):
+        if source:
+            try:
+                return QueryTree(tokens, source)
+            except ValueError:
+                pass
+    return QueryTree(tokens)
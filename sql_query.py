@@ -1,7 +1,17 @@
-from typing import List, Dict, Optional
-from query_processor import QueryProcessor
-from token_processor import TokenProcessor
-from sqlparse.sql import Token, TokenList
+from __future__ import annotations
+from typing import TYPE_CHECKING, List, Dict, Iterable, Iterator, Optional, Tuple
+from instrumentation import GAUGE, emit, enabled, stage
+
+# Everything that pulls in sqlparse is imported where it is first needed, so
+# importing this module stays cheap for callers that never parse anything.
+if TYPE_CHECKING:
+    from sqlparse.sql import Token
+    from query_tree import NodeType, NodeView, QueryTree
+    from references import ReferenceIndex
+    from tree_diff import Change
+    from limits import ParseLimits, Summary
+    from rules import RuleReport, RuleSet
+    from fingerprint import Fingerprint
 
 
 class SqlQuery:
@@ -10,80 +20,515 @@ class SqlQuery:
         Initialize the SqlQuery class.
         """
         self.raw_query = None
-        self.normalized_query = None
-        self.tree: Optional[List[Token]] = None
+        self._normalized: Optional[str] = None
+        self._tree: Optional[List[Token]] = None
+        self._pending_tree: Optional[List[Token]] = None
+        self._lexical: Optional[List[Token]] = None
+        self._query_tree: Optional[QueryTree] = None
+        self._references: Optional[ReferenceIndex] = None
+        self._incremental = None
+        # Whether normalized_query is available, and whether the tree is built from it.
+        self._normalize = False
+        self._tree_from_normalized = False
+        self._tokens_only = False
+        self.limits: Optional[ParseLimits] = None
+        self.summaries: Tuple[Summary, ...] = ()
+        self.peak_memory: Optional[int] = None
 
-    def set_query(self, query: str, normalize: bool = True):
+    def set_query(self, query: str, normalize: bool = True, tokens_only: bool = False,
+                  limits: Optional[ParseLimits] = None):
         """
         Set the SQL query for processing.
 
+        Nothing is computed here: the normalized text, the token tree, the
+        lexical token stream and the dict form are each built on first access
+        and then kept on the instance.
+
         Parameters:
         query (str): The SQL query to be set.
         normalize (bool): If True, normalize the query; otherwise, parse it directly.
+            Normalization also parses the query in the same pass, and the
+            resulting tree is handed out by create_tree. Queries seen before
+            are served from the process-wide parse cache.
+        tokens_only (bool): If True, skip sqlparse's grouping pass: the tree is
+            the flat lexical token stream of the raw query.
+        limits (Optional[ParseLimits]): Limits checked here, with one streaming
+            lexer pass, before anything is built; defaults to the process-wide
+            limits set with configure_limits. In degraded mode raw_query holds
+            the reduced query and summaries what was collapsed in it.
 
         Raises:
         ValueError: If the query is empty.
+        LimitExceededError: If the query exceeds the limits.
+        """
+        with stage("set_query"):
+            if not query:
+                raise ValueError("Query cannot be empty")
+
+            self.limits = limits if limits is not None else _default_limits
+            self.summaries = ()
+            self.peak_memory = None
+            if self.limits is not None:
+                from limits import apply_limits
+                bounded = apply_limits(query, self.limits)
+                query, self.summaries = bounded.text, bounded.summaries
+
+            self.raw_query = query
+            self._normalized = None
+            self._tree = None
+            self._pending_tree = None
+            self._lexical = None
+            self._query_tree = None
+            self._references = None
+            self._incremental = None
+            self._normalize = normalize
+            self._tree_from_normalized = normalize and not tokens_only
+            self._tokens_only = tokens_only
+
+    @property
+    def normalized_query(self) -> Optional[str]:
+        """
+        The normalized query, computed on first access; None if normalization was not requested.
         """
-        if not query:
-            raise ValueError("Query cannot be empty")
-        
-        self.raw_query = query
-        processor = QueryProcessor(query)
+        if self._normalized is None and self._normalize and self.raw_query:
+            from query_processor import QueryProcessor
+            processor = QueryProcessor(self.raw_query)
+            if self._tree_from_normalized and self._tree is None:
+                # Normalizing groups the query anyway; keep the tree for create_tree.
+                self._normalized, self._pending_tree = processor.process_query()
+            else:
+                self._normalized = processor.normalize_query()
+        return self._normalized
 
-        if normalize:
-            self.normalized_query = processor.normalize_query()
-            self.tree = None
-        else:
-            self.tree = processor.parse_query()
-            self.normalized_query = None
+    @normalized_query.setter
+    def normalized_query(self, value: Optional[str]):
+        self._normalized = value
+
+    @property
+    def tree(self) -> Optional[List[Token]]:
+        """
+        The token tree. Without normalization it is built on first access;
+        with normalization it stays None until create_tree is called.
+        """
+        if self._tree is None and not self._tree_from_normalized and self.raw_query:
+            self._tree = self._build_tree()
+        return self._tree
+
+    @tree.setter
+    def tree(self, value: Optional[List[Token]]):
+        self._tree = value
+        self._query_tree = None
+        self._references = None
+
+    def tokens(self) -> List[Token]:
+        """
+        Return the lexical token stream of the raw query, without grouping.
+
+        Returns:
+        List[Token]: The leaf tokens produced by the lexer, in order.
+
+        Raises:
+        ValueError: If no query is set.
+        """
+        if not self.raw_query:
+            raise ValueError("No query set")
+        if self._lexical is None:
+            from query_processor import QueryProcessor
+            self._lexical = QueryProcessor(self.raw_query).lex_query()
+        return self._lexical
+
+    def clear_cache(self):
+        """
+        Forget the results computed for the current query.
+
+        The query's entries are also dropped from the process-wide parse cache,
+        so the next create_tree call parses it again.
+        """
+        from parse_cache import parse_cache
+        if self.raw_query:
+            parse_cache.discard(self.raw_query)
+        if self._normalized:
+            parse_cache.discard(self._normalized)
+        self._normalized = None
+        self._tree = None
+        self._pending_tree = None
+        self._lexical = None
+        self._query_tree = None
+        self._references = None
+        self._incremental = None
+        self._tree_from_normalized = self._normalize and not self._tokens_only
+
+    def apply_edit(self, offset: int, deleted: int, inserted: str) -> List[Token]:
+        """
+        Edit the raw query and update the token tree incrementally.
+
+        Only the innermost parenthesized expression or the statements touched by
+        the edit are re-lexed and re-grouped; the rest of the tree is reused.
+        The tree describes the raw query, as with set_query(normalize=False),
+        and normalized_query is reset until create_tree recomputes it.
+
+        Parameters:
+        offset (int): Character offset in raw_query where the edit starts.
+        deleted (int): Number of characters removed at offset.
+        inserted (str): Text inserted at offset.
+
+        Returns:
+        List[Token]: The updated tokens of the first statement.
+
+        Raises:
+        ValueError: If no query is set or the edit falls outside the query.
+        """
+        if not self.raw_query:
+            raise ValueError("No query set")
+        # Imported here: incremental depends on statement_reader, which imports this module.
+        from incremental import IncrementalParser
+        if self._incremental is None or self._incremental.text is not self.raw_query:
+            self._incremental = IncrementalParser(self.raw_query)
+        tree = self._incremental.apply_edit(offset, deleted, inserted)
+        self.raw_query = self._incremental.text
+        self._tree = tree
+        self._normalized = None
+        self._pending_tree = None
+        self._lexical = None
+        self._query_tree = None
+        self._references = None
+        self._normalize = False
+        self._tree_from_normalized = False
+        self._tokens_only = False
+        return tree
 
     def create_tree(self) -> List[Token]:
         """
         Create a tree structure from the SQL query.
 
+        The tree is built once and kept; afterwards normalized_query is also
+        available, and is computed on first access. When the limits ask for
+        it, the peak memory allocated while building is kept in peak_memory.
+
         Returns:
         List[Token]: A list of tokens representing the tree structure of the query.
 
         Raises:
         ValueError: If no query is set.
         """
-        if not self.raw_query:
-            raise ValueError("No query set")
-        if not self.normalized_query:
-            processor = QueryProcessor(self.raw_query)
-            self.normalized_query = processor.normalize_query()
-        if self.tree is None:
-            processor = QueryProcessor(self.normalized_query)
-            self.tree = processor.parse_query()
-        return self.tree
+        with stage("create_tree"):
+            if not self.raw_query:
+                raise ValueError("No query set")
+            if self._tree is None:
+                if self.limits is not None and self.limits.track_memory:
+                    from limits import MemoryTracker
+                    with MemoryTracker("create_tree") as tracker:
+                        self._tree = self._build_tree()
+                    self.peak_memory = tracker.peak
+                else:
+                    self._tree = self._build_tree()
+            self._normalize = True
+        if enabled() and self._tree:
+            self._emit_tree_metrics()
+        return self._tree
+
+    def _build_tree(self) -> List[Token]:
+        if self._tokens_only:
+            return self.tokens()
+        from query_processor import QueryProcessor
+        if not self._tree_from_normalized:
+            return QueryProcessor(self.raw_query).parse_query()
+        if self._pending_tree is None and self._normalized is None:
+            self._normalized, self._pending_tree = QueryProcessor(self.raw_query).process_query()
+        if self._pending_tree is not None:
+            tree, self._pending_tree = self._pending_tree, None
+            return tree
+        return QueryProcessor(self._normalized).parse_query()
+
+    def _emit_tree_metrics(self):
+        if self._query_tree is None:
+            self._query_tree = self._build_query_tree(self._tree)
+        emit("tree_tokens", self._query_tree.count_nodes(), GAUGE)
+        emit("tree_depth", self._query_tree.get_depth(), GAUGE)
+
+    def iter_flat_tokens(self, tokens: Optional[List[Token]] = None) -> Iterator[str]:
+        """
+        Lazily yield the normalized strings of the leaf tokens of the tree.
+
+        Parameters:
+        tokens (Optional[List[Token]]): The list of tokens to flatten. If None, uses
+            the tree of the query, creating it if needed.
 
-    def flatten_tree(self) -> List[str]:
+        Returns:
+        Iterator[str]: The token strings in document order.
+        """
+        from token_processor import iter_leaves
+        if tokens is None:
+            tokens = self.create_tree()
+        for token in iter_leaves(tokens):
+            yield token.normalized
+
+    def flatten_tree(self, tokens: Optional[List[Token]] = None) -> List[str]:
         """
         Flatten the tree structure into a list of token strings.
 
         Parameters:
-        tokens (Optional[List[Token]]): The list of tokens to flatten. If None, uses the current tree.
+        tokens (Optional[List[Token]]): The list of tokens to flatten. If None, uses
+            the tree of the query, creating it if needed.
 
         Returns:
         List[str]: A list of token strings.
         """
+        if tokens is None:
+            tokens = self.create_tree()
         flat_tokens = []
-        for token in self.tree:
-            if isinstance(token, TokenList):
-                flat_tokens.extend(self.flatten_tree(token.tokens))
+        append = flat_tokens.append
+        stack = [iter(tokens)]
+        while stack:
+            for token in stack[-1]:
+                if token.is_group:
+                    stack.append(iter(token.tokens))
+                    break
+                append(token.normalized)
             else:
-                flat_tokens.append(token.normalized)
+                stack.pop()
         return flat_tokens
 
-    def tree_to_dict(self) -> Dict:
+    def query_tree(self) -> QueryTree:
+        """
+        Return the compact form of the token tree, building it on first use.
+
+        Returns:
+        QueryTree: The columnar tree for the current query.
+
+        Raises:
+        ValueError: If no query is set.
+        """
+        if self._query_tree is None:
+            self._query_tree = self._build_query_tree(self.create_tree())
+        return self._query_tree
+
+    def _build_query_tree(self, tokens: List[Token]) -> QueryTree:
+        from query_tree import QueryTree
+        # Share the query text as the span source instead of copying every token.
+        for source in (self._normalized, self.raw_query):
+            if source:
+                try:
+                    return QueryTree(tokens, source)
+                except ValueError:
+                    pass
+        return QueryTree(tokens)
+
+    def tree_to_dict(self, spans: bool = False) -> Dict:
         """
         Convert the token tree into a dictionary format.
 
+        The result is a read-only view over the compact tree; nodes are turned
+        into mappings only when they are accessed. Use to_dict() on it to get
+        plain dictionaries.
+
         Parameters:
-        tokens (Optional[List[Token]]): The list of tokens to convert. If None, uses the current tree.
+        spans (bool): If True, return plain dictionaries where each node has a
+            "span" of [start, stop] offsets instead of its text, and the root
+            holds the "source" text once.
 
         Returns:
         Dict: A dictionary representation of the token tree.
         """
-        token_processor = TokenProcessor()
-        return {"type": "ROOT", "children": token_processor.process(self.tree)}
+        if spans:
+            return self.query_tree().to_dict(spans=True)
+        return self.query_tree().view()
+
+    def references(self) -> ReferenceIndex:
+        """
+        Return the tables, columns, CTEs and scopes the query references.
+
+        The index is extracted once per query and kept; its offsets point into
+        the text the tree was built from, the normalized query by default.
+
+        Returns:
+        ReferenceIndex: The reference index.
+
+        Raises:
+        ValueError: If no query is set.
+        """
+        if self._references is None:
+            from references import build_index
+            with stage("references"):
+                self._references = build_index(self.create_tree(), self.query_tree())
+        return self._references
+
+    def diff(self, other: "SqlQuery") -> List[Change]:
+        """
+        Report the structural differences from this query to another one.
+
+        Both trees are hashed once per subtree, so identical clauses are
+        skipped without being walked. Whitespace and keyword case are ignored.
+
+        Parameters:
+        other (SqlQuery): The changed query.
+
+        Returns:
+        List[Change]: The inserted, deleted and modified nodes, with their paths,
+            clauses and offsets in each query.
+
+        Raises:
+        ValueError: If either instance has no query set.
+        """
+        from tree_diff import diff_trees
+        with stage("diff"):
+            return diff_trees(self.query_tree(), other.query_tree())
+
+    def check_rules(self, rules: RuleSet, stop_on_block: bool = True, timings: bool = False) -> RuleReport:
+        """
+        Check the query against a set of lint or policy rules in one traversal of its tree.
+
+        Parameters:
+        rules (RuleSet): The compiled rules.
+        stop_on_block (bool): If True, stop at the first blocking violation.
+        timings (bool): If True, report the time spent in each rule.
+
+        Returns:
+        RuleReport: The violations, with offsets into the text the tree was built from.
+
+        Raises:
+        ValueError: If no query is set.
+        """
+        with stage("rules"):
+            return rules.check(self.query_tree(), stop_on_block=stop_on_block, timings=timings)
+
+    def find_tokens(self, token_type: NodeType) -> List[NodeView]:
+        """
+        Find all tokens of a specific type in the tree.
+
+        Parameters:
+        token_type (NodeType): A group class name such as "Identifier", or a
+            sqlparse token type such as Token.Keyword.
+
+        Returns:
+        List[NodeView]: Dict views of the matching nodes, in document order.
+        """
+        from query_tree import NodeView
+        tree = self.query_tree()
+        return [NodeView(tree, node) for node in tree.find_tokens(token_type)]
+
+    def select(self, selector: NodeType, within: Optional[str] = None, first: bool = False,
+               spans: bool = False) -> List[Dict]:
+        """
+        Select subtrees by type, e.g. select("Where") or select("Identifier", within="Function").
+
+        The selector is evaluated on the token tree itself: the compact tree is
+        not built, the walk stops at the first match when asked, and only the
+        matched subtrees are converted into dictionaries.
+
+        Parameters:
+        selector (NodeType): A group class name such as "Where", a path of group
+            class names such as "Where/Comparison", or a sqlparse token type.
+        within (Optional[str]): A group class name required among the ancestors.
+        first (bool): If True, return at most the first match.
+        spans (bool): If True, give nodes a "span" of [start, stop] offsets into
+            the text the tree was built from instead of a "value".
+
+        Returns:
+        List[Dict]: The matched subtrees in the format of tree_to_dict, in document order.
+
+        Raises:
+        ValueError: If no query is set or the selector is malformed.
+        """
+        from tree_select import Selector
+        compiled = Selector(selector, within)
+        with stage("select"):
+            return compiled.select(self.create_tree(), first=first, spans=spans)
+
+    def get_depth(self) -> int:
+        """
+        Calculate the maximum nesting depth of the tree.
+
+        Returns:
+        int: The depth of the deepest token; top-level tokens have depth 1.
+        """
+        return self.query_tree().get_depth()
+
+    def count_nodes(self) -> int:
+        """
+        Count the tokens and groups in the tree.
+
+        Returns:
+        int: The number of nodes, not counting the root.
+        """
+        return self.query_tree().count_nodes()
+
+    def fingerprint(self) -> Fingerprint:
+        """
+        Compute the literal-independent fingerprint of the query.
+
+        Literals are replaced with placeholders, IN-lists are collapsed and
+        whitespace and keyword case are normalized, so queries that only differ
+        in literal values share a fingerprint. The tree is used when it has
+        already been built; otherwise only the lexer runs. Results are cached
+        by the raw query text in the process-wide parse cache.
+
+        Returns:
+        Fingerprint: The canonical text and its 64-bit hash.
+
+        Raises:
+        ValueError: If no query is set.
+        """
+        if not self.raw_query:
+            raise ValueError("No query set")
+        from parse_cache import parse_cache
+        from fingerprint import fingerprint_query, fingerprint_tokens
+        result = parse_cache.get("fingerprint", self.raw_query)
+        if result is None:
+            if self._tree is not None:
+                result = fingerprint_tokens(self._tree)
+            else:
+                result = fingerprint_query(self.raw_query)
+            parse_cache.put("fingerprint", self.raw_query, result)
+        return result
+
+    @staticmethod
+    def parse_many(queries: Iterable[str], chunk_size: int = 64, max_workers: Optional[int] = None,
+                   ordered: bool = True, flat: bool = False, normalize: bool = True) -> Iterator["BatchResult"]:
+        """
+        Parse many queries in parallel across a process pool.
+
+        Workers return compact results (the dict tree with string token types,
+        or the flattened token strings) instead of sqlparse objects, and a query
+        that fails carries its error message instead of aborting the batch.
+
+        Parameters:
+        queries (Iterable[str]): The SQL queries to parse; consumed lazily.
+        chunk_size (int): Number of queries sent to a worker at once.
+        max_workers (Optional[int]): Size of the process pool; defaults to the CPU count.
+        ordered (bool): If True, yield results in input order; otherwise as they complete.
+        flat (bool): If True, return flattened token strings instead of the dict tree.
+        normalize (bool): If True, normalize queries before building the tree.
+
+        Returns:
+        Iterator[BatchResult]: One result per query.
+        """
+        from batch import parse_many
+        return parse_many(queries, chunk_size=chunk_size, max_workers=max_workers,
+                          ordered=ordered, flat=flat, normalize=normalize)
+
+
+# The limits set_query applies when none are given. They are registered by
+# limits.configure_limits, so limits is only imported by callers that use it.
+_default_limits: Optional[ParseLimits] = None
+
+
+def set_default_limits(limits: Optional[ParseLimits]):
+    """
+    Set the limits SqlQuery.set_query applies when none are given.
+
+    Parameters:
+    limits (Optional[ParseLimits]): The limits, or None for none.
+    """
+    global _default_limits
+    _default_limits = limits
+
+
+def default_limits() -> Optional[ParseLimits]:
+    """
+    Return the registered process-wide limits.
+
+    Returns:
+    Optional[ParseLimits]: The limits, or None if none are configured.
+    """
+    return _default_limits
@@ -0,0 +1,260 @@
+import codecs
+import io
+import mmap
+import os
+import re
+import stat
+from typing import BinaryIO, Iterator, List, NamedTuple, Optional, TextIO, Union
+from sql_query import SqlQuery
+
+
+Source = Union[str, "os.PathLike[str]", BinaryIO, TextIO]
+
+_NORMAL, _SINGLE_QUOTE, _DOUBLE_QUOTE, _BACKTICK, _LINE_COMMENT, _BLOCK_COMMENT, _DOLLAR_QUOTE = range(7)
+
+_NORMAL_EVENTS = re.compile(r";|'|\"|`|--|/\*|\$|[-/]\Z")
+_DOLLAR_TAG = re.compile(r"\$(?:[^\W\d]\w*)?\$")
+_PARTIAL_DOLLAR_TAG = re.compile(r"\$(?:[^\W\d]\w*)?\Z")
+_QUOTE_EVENTS = {
+    _SINGLE_QUOTE: (re.compile(r"['\\]"), "'"),
+    _DOUBLE_QUOTE: (re.compile(r'["\\]'), '"'),
+    _BACKTICK: (re.compile(r"`"), "`"),
+}
+_OPENERS = {"'": _SINGLE_QUOTE, '"': _DOUBLE_QUOTE, "`": _BACKTICK, "--": _LINE_COMMENT, "/*": _BLOCK_COMMENT}
+_LINE_END = re.compile(r"[\r\n]")
+
+
+class SplitStatement(NamedTuple):
+    """
+    A statement cut out of a stream, with its character offsets in the stream.
+    """
+    text: str
+    start: int
+    end: int
+
+
+class StatementSplitter:
+    """
+    Incrementally split SQL text into statements at top-level semicolons.
+
+    Semicolons inside quoted strings and identifiers, line and block comments,
+    and dollar-quoted bodies do not end a statement. Only the current statement
+    and a few characters of lookahead are held in memory, however the input is
+    fed in.
+    """
+
+    def __init__(self):
+        """
+        Initialize the StatementSplitter.
+        """
+        self._state = _NORMAL
+        self._dollar_tag = ""
+        self._parts: List[str] = []
+        self._buffer = ""
+        self._offset = 0
+        self._statement_start = 0
+        self._previous_char = ""
+
+    @property
+    def in_literal(self) -> bool:
+        """
+        Whether the text fed so far ends inside a string, identifier, comment or
+        dollar-quoted body.
+        """
+        return self._state != _NORMAL
+
+    def feed(self, text: str) -> List[SplitStatement]:
+        """
+        Feed the next piece of SQL text.
+
+        Parameters:
+        text (str): The next chunk of the script.
+
+        Returns:
+        List[SplitStatement]: The statements completed by this chunk.
+        """
+        return list(self._scan(self._buffer + text, final=False))
+
+    def close(self) -> List[SplitStatement]:
+        """
+        Signal the end of the input.
+
+        Returns:
+        List[SplitStatement]: The trailing statement, if it holds any text.
+        """
+        statements = list(self._scan(self._buffer, final=True))
+        statements.extend(self._emit("".join(self._parts)))
+        self._parts = []
+        return statements
+
+    def _scan(self, buf: str, final: bool) -> Iterator[SplitStatement]:
+        pos = 0
+        segment = 0
+        keep = len(buf)
+        while pos < len(buf):
+            if self._state == _NORMAL:
+                match = _NORMAL_EVENTS.search(buf, pos)
+                if match is None:
+                    break
+                event, i = match.group(), match.start()
+                if event == ";":
+                    text = "".join(self._parts) + buf[segment:i + 1]
+                    self._parts = []
+                    yield from self._emit(text)
+                    segment = pos = i + 1
+                    self._statement_start = self._offset + segment
+                elif event == "$":
+                    previous = buf[i - 1] if i else self._previous_char
+                    tag = _DOLLAR_TAG.match(buf, i)
+                    if previous and (previous.isalnum() or previous in "_$"):
+                        pos = i + 1
+                    elif tag:
+                        self._state = _DOLLAR_QUOTE
+                        self._dollar_tag = tag.group()
+                        pos = tag.end()
+                    elif not final and _PARTIAL_DOLLAR_TAG.match(buf, i):
+                        keep = i
+                        break
+                    else:
+                        pos = i + 1
+                elif event in _OPENERS:
+                    self._state = _OPENERS[event]
+                    pos = match.end()
+                elif final:
+                    pos = i + 1
+                else:
+                    # A trailing "-" or "/" may open a comment in the next chunk.
+                    keep = i
+                    break
+            elif self._state in _QUOTE_EVENTS:
+                pattern, quote = _QUOTE_EVENTS[self._state]
+                match = pattern.search(buf, pos)
+                if match is None:
+                    break
+                i = match.start()
+                if i + 1 == len(buf) and not final:
+                    keep = i
+                    break
+                if buf[i] == "\\":
+                    pos = i + 2
+                elif buf[i + 1:i + 2] == quote:
+                    pos = i + 2
+                else:
+                    self._state = _NORMAL
+                    pos = i + 1
+            elif self._state == _LINE_COMMENT:
+                match = _LINE_END.search(buf, pos)
+                if match is None:
+                    break
+                self._state = _NORMAL
+                pos = match.end()
+            else:
+                closer = "*/" if self._state == _BLOCK_COMMENT else self._dollar_tag
+                i = buf.find(closer, pos)
+                if i < 0:
+                    if not final:
+                        keep = max(pos, len(buf) - len(closer) + 1)
+                    break
+                self._state = _NORMAL
+                pos = i + len(closer)
+
+        if keep > segment:
+            self._parts.append(buf[segment:keep])
+        if keep:
+            self._previous_char = buf[keep - 1]
+        self._offset += keep
+        self._buffer = buf[keep:]
+
+    def _emit(self, text: str) -> Iterator[SplitStatement]:
+        stripped = text.strip()
+        if stripped and stripped != ";":
+            start = self._statement_start + len(text) - len(text.lstrip())
+            yield SplitStatement(stripped, start, start + len(stripped))
+
+
+def iter_statements(source: Source, encoding: str = "utf-8",
+                    chunk_size: int = 1 << 20) -> Iterator[SplitStatement]:
+    """
+    Stream the statements of a SQL script without reading it into memory.
+
+    Regular files are memory-mapped and decoded chunk by chunk; other binary
+    or text file objects are read in chunks.
+
+    Parameters:
+    source (Source): A file path, or a binary or text file object.
+    encoding (str): Encoding used to decode binary input.
+    chunk_size (int): Number of bytes or characters decoded at a time.
+
+    Returns:
+    Iterator[SplitStatement]: The statements of the script, in order.
+
+    Raises:
+    ValueError: If chunk_size is not positive.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be positive")
+    splitter = StatementSplitter()
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as file:
+            for chunk in _iter_chunks(file, encoding, chunk_size):
+                yield from splitter.feed(chunk)
+    else:
+        for chunk in _iter_chunks(source, encoding, chunk_size):
+            yield from splitter.feed(chunk)
+    yield from splitter.close()
+
+
+def read_queries(source: Source, normalize: bool = True, encoding: str = "utf-8",
+                 chunk_size: int = 1 << 20) -> Iterator[SqlQuery]:
+    """
+    Stream a SQL script as one SqlQuery per statement.
+
+    Parameters:
+    source (Source): A file path, or a binary or text file object.
+    normalize (bool): Passed on to SqlQuery.set_query.
+    encoding (str): Encoding used to decode binary input.
+    chunk_size (int): Number of bytes or characters decoded at a time.
+
+    Returns:
+    Iterator[SqlQuery]: A query holder for each statement, in order.
+
+    Raises:
+    ValueError: If a statement cannot be processed.
+    """
+    for statement in iter_statements(source, encoding=encoding, chunk_size=chunk_size):
+        sql_query = SqlQuery()
+        sql_query.set_query(statement.text, normalize=normalize)
+        yield sql_query
+
+
+def _iter_chunks(file: Union[BinaryIO, TextIO], encoding: str, chunk_size: int) -> Iterator[str]:
+    if isinstance(file, io.TextIOBase):
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    decoder = codecs.getincrementaldecoder(encoding)()
+    mapped = _map_file(file)
+    if mapped is not None:
+        with mapped:
+            for start in range(file.tell(), len(mapped), chunk_size):
+                yield decoder.decode(mapped[start:start + chunk_size])
+    else:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            yield decoder.decode(chunk)
+    yield decoder.decode(b"", final=True)
+
+
+def _map_file(file: BinaryIO) -> Optional[mmap.mmap]:
+    try:
+        fileno = file.fileno()
+        if not stat.S_ISREG(os.fstat(fileno).st_mode) or os.fstat(fileno).st_size == 0:
+            return None
+        return mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        return None
@@ -0,0 +1,138 @@
+import unittest
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+import sys
+
+path_to_append: Path = Path.cwd().resolve().parent
+sys.path.append(str(path_to_append))
+
+from async_api import AsyncParser, parse_async, parse_stream_async
+from sql_query import SqlQuery
+
+
+class CountingExecutor(ThreadPoolExecutor):
+
+    def __init__(self):
+        super().__init__(max_workers=2)
+        self.calls = 0
+
+    def submit(self, *args, **kwargs):
+        self.calls += 1
+        return super().submit(*args, **kwargs)
+
+
+def large_query(seed: int) -> str:
+    columns = ", ".join(f"f(c{i} + (c{i} * {seed}))" for i in range(200))
+    return f"SELECT {columns} FROM t WHERE x IN (1, 2, 3)"
+
+
+class TestAsyncApi(unittest.TestCase):
+
+    def test_parse_async(self):
+        async def run():
+            async with AsyncParser(executor=ThreadPoolExecutor(max_workers=1)) as parser:
+                ok = await parse_async("select a from t", flat=True, parser=parser)
+                failed = await parse_async("", parser=parser)
+            return ok, failed
+
+        ok, failed = asyncio.run(run())
+        self.assertEqual(ok.flat_tokens, ["SELECT", " ", "a", "\n", "FROM", " ", "t"])
+        self.assertEqual(ok.normalized_query, "SELECT a\nFROM t")
+        self.assertEqual(failed.error, "Query cannot be empty")
+
+    def test_small_queries_are_batched(self):
+        executor = CountingExecutor()
+
+        async def run():
+            async with AsyncParser(executor=executor, batch_size=16) as parser:
+                return await asyncio.gather(*(parser.parse(f"SELECT {i}", flat=True) for i in range(40)))
+
+        results = asyncio.run(run())
+        executor.shutdown()
+        self.assertEqual([result.flat_tokens[-1] for result in results], [str(i) for i in range(40)])
+        self.assertEqual(executor.calls, 3)
+
+    def test_parse_stream_async(self):
+        async def source():
+            for i in range(30):
+                yield f"SELECT col{i} FROM t"
+
+        async def run(queries, ordered):
+            async with AsyncParser(executor=ThreadPoolExecutor(max_workers=2), max_in_flight=2) as parser:
+                return [result async for result in parse_stream_async(queries, chunk_size=4, ordered=ordered,
+                                                                      flat=True, parser=parser)]
+
+        results = asyncio.run(run(source(), True))
+        self.assertEqual([result.index for result in results], list(range(30)))
+        self.assertEqual(results[17].flat_tokens[2], "col17")
+
+        results = asyncio.run(run(["SELECT 1", None, "SELECT 2"], False))
+        self.assertEqual(sorted(result.index for result in results), [0, 1, 2])
+
+    def test_parse_stream_reads_ahead_boundedly(self):
+        consumed = []
+
+        def source():
+            for i in range(1000):
+                consumed.append(i)
+                yield f"SELECT {i}"
+
+        async def run():
+            async with AsyncParser(executor=ThreadPoolExecutor(max_workers=1), max_in_flight=2) as parser:
+                stream = parser.parse_stream(source(), chunk_size=10, flat=True)
+                first = await stream.__anext__()
+                await stream.aclose()
+            return first
+
+        first = asyncio.run(run())
+        self.assertEqual(first.index, 0)
+        self.assertLessEqual(len(consumed), 30)
+
+    def test_invalid_limits(self):
+        with self.assertRaises(ValueError):
+            AsyncParser(batch_size=0)
+
+        async def run():
+            async for _ in AsyncParser(executor=ThreadPoolExecutor(max_workers=1)).parse_stream([], chunk_size=0):
+                pass
+
+        with self.assertRaises(ValueError):
+            asyncio.run(run())
+
+    def test_loop_latency_under_load(self):
+        queries = [large_query(seed) for seed in range(8)]
+        sql_query = SqlQuery()
+        sql_query.set_query(large_query(99))
+        start = time.perf_counter()
+        sql_query.create_tree()
+        blocking = time.perf_counter() - start
+
+        async def run():
+            lag = 0.0
+            done = asyncio.Event()
+
+            async def ticker():
+                nonlocal lag
+                while not done.is_set():
+                    before = time.perf_counter()
+                    await asyncio.sleep(0.005)
+                    lag = max(lag, time.perf_counter() - before - 0.005)
+
+            async with AsyncParser(executor=ProcessPoolExecutor(max_workers=2)) as parser:
+                # Start the worker processes before measuring.
+                await parser.parse("SELECT 1")
+                ticking = asyncio.ensure_future(ticker())
+                results = await asyncio.gather(*(parser.parse(query) for query in queries))
+                done.set()
+                await ticking
+            return results, lag
+
+        results, lag = asyncio.run(run())
+        self.assertTrue(all(result.ok for result in results))
+        self.assertLess(lag, blocking / 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
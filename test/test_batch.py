@@ -0,0 +1,54 @@
+import unittest
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import sys
+
+path_to_append: Path = Path.cwd().resolve().parent
+sys.path.append(str(path_to_append))
+
+from batch import parse_chunk, parse_many
+from sql_query import SqlQuery
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.queries = ["SELECT * FROM users", "", "SELECT name, age FROM People WHERE age > 30", None]
+
+    def test_parse_chunk_keeps_errors(self):
+        results = parse_chunk(list(enumerate(self.queries)))
+
+        self.assertEqual([result.index for result in results], [0, 1, 2, 3])
+        self.assertEqual([result.ok for result in results], [True, False, True, False])
+        self.assertEqual(results[1].error, "Query cannot be empty")
+        self.assertEqual(results[0].tree["type"], "ROOT")
+        # Trees must be plain data
+        json.dumps(results[2].tree)
+
+    def test_parse_chunk_flat(self):
+        results = parse_chunk([(0, "select a from t")], flat=True, normalize=False)
+        self.assertEqual(results[0].flat_tokens, ["SELECT", " ", "a", " ", "FROM", " ", "t"])
+        self.assertIsNone(results[0].tree)
+
+    def test_parse_many_ordered(self):
+        queries = (f"SELECT col{i} FROM t{i}" for i in range(50))
+        results = list(SqlQuery.parse_many(queries, chunk_size=7, max_workers=2, flat=True))
+
+        self.assertEqual([result.index for result in results], list(range(50)))
+        self.assertEqual(results[42].flat_tokens[2], "col42")
+
+    def test_parse_many_unordered(self):
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            results = list(parse_many(self.queries * 5, chunk_size=2, ordered=False, executor=executor))
+
+        self.assertEqual(sorted(result.index for result in results), list(range(20)))
+        self.assertEqual(sum(not result.ok for result in results), 10)
+
+    def test_parse_many_invalid_chunk_size(self):
+        with self.assertRaises(ValueError):
+            list(parse_many(self.queries, chunk_size=0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import random
+import unittest
+from sqlparse import lexer
+from pathlib import Path
+import sys
+
+path_to_append: Path = Path.cwd().resolve().parent
+sys.path.append(str(path_to_append))
+
+from bulk_lexer import BulkLexer, _Plan, lex_many
+from fingerprint import fingerprint_pairs, fingerprint_query
+from test_cases.test_case import load_test_cases
+
+
+EDGE_CASES = [
+    "select $$a$$, $x$ b $x$ from t /* c */ where a = 'x''y' -- trailing",
+    "select /* never closed",
+    "select 'never closed",
+    "a.b .5 between .03 [x] `y` :p ? %(name)s",
+    "select $1, $$$$",
+    "--c\r\nselect 1",
+    "/*+ hint */ select 1",
+    "",
+    "ünïcode é",
+]
+
+
+class TestBulkLexer(unittest.TestCase):
+    _directory_test_cases = "test_cases"
+
+    def setUp(self):
+        self.queries = [case.query for case in load_test_cases(self._directory_test_cases)] + EDGE_CASES
+
+    def test_matches_sqlparse(self):
+        corpus = lex_many(self.queries)
+        self.assertEqual(corpus.query_count, len(self.queries))
+        for number, query in enumerate(self.queries):
+            with self.subTest(query=query):
+                self.assertEqual(corpus.query_text(number), query)
+                self.assertEqual(list(corpus.pairs(number)), list(lexer.tokenize(query)))
+
+    def test_random_text_matches_sqlparse(self):
+        pieces = list("abxSELCTFROMJINnotl019 \t\r\n.,;:()[]'\"`$#@%?*-+/<>=!~^|&_\\´Àé") + [
+            "select ", "left join ", "$$", "$a$", "/*", "*/", "--", "# ", "0x1F", "1.5E-3", " .5", "::",
+            "is not null", "group by ", "not like "]
+        rng = random.Random(0)
+        queries = ["".join(rng.choice(pieces) for _ in range(rng.randint(0, 40))) for _ in range(500)]
+        corpus = lex_many(queries)
+        for number, query in enumerate(queries):
+            self.assertEqual(list(corpus.pairs(number)), list(lexer.tokenize(query)), query)
+
+    def test_columns(self):
+        corpus = BulkLexer().lex(self.queries)
+        self.assertEqual(len(corpus.query), len(corpus))
+        for number in range(corpus.query_count):
+            tokens = corpus.tokens_of(number)
+            self.assertTrue(all(corpus.query[token] == number for token in tokens))
+            # Tokens tile the query text without gaps.
+            spans = [corpus.span(token) for token in tokens]
+            self.assertEqual([stop for _, stop in spans[:-1]], [start for start, _ in spans[1:]])
+            if spans:
+                self.assertEqual((spans[0][0], spans[-1][1]), (0, len(self.queries[number])))
+
+    def test_fingerprint_pairs(self):
+        corpus = lex_many(self.queries)
+        for number, query in enumerate(self.queries):
+            with self.subTest(query=query):
+                self.assertEqual(fingerprint_pairs(corpus.pairs(number, normalized=True)), fingerprint_query(query))
+
+    def test_compiled_state_is_shared(self):
+        first, second = BulkLexer(), BulkLexer()
+        self.assertIs(first._plan, second._plan)
+        first.lex(["select 1"])
+        self.assertIsNotNone(second._plan.dispatch[ord("s")])
+        # Patterns are compiled for the characters tokens start with, on first use.
+        plan = _Plan(first._plan.patterns)
+        self.assertEqual(plan.dispatch, [None] * 128)
+        entry = plan.compile_for("1")
+        self.assertIs(plan.dispatch[ord("1")], entry)
+        self.assertIs(plan.compile_for("2"), entry)
+        self.assertEqual(sum(compiled is not None for compiled in plan.dispatch), 2)
+
+    def test_invalid_query(self):
+        with self.assertRaises(ValueError):
+            lex_many(["select 1", None])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+import sqlparse
+from pathlib import Path
+import sys
+
+path_to_append: Path = Path.cwd().resolve().parent
+sys.path.append(str(path_to_append))
+
+from fingerprint import fingerprint_query, fingerprint_tokens
+from parse_cache import parse_cache
+from sql_query import SqlQuery
+from test_cases.test_case import load_test_cases
+
+
+class TestFingerprint(unittest.TestCase):
+    _directory_test_cases = "test_cases"
+
+    def test_literals_are_replaced(self):
+        first = fingerprint_query("SELECT * FROM users WHERE id = 5 AND name = 'bob'")
+        second = fingerprint_query("select *\n  from users where id=7 and name = 'alice' -- trailing")
+        self.assertEqual(first, second)
+        self.assertEqual(first.text, "SELECT * FROM users WHERE id = ? AND name = ?")
+        self.assertTrue(0 <= first.hash < 2 ** 64)
+
+    def test_in_lists_are_collapsed(self):
+        self.assertEqual(
+            fingerprint_query("SELECT a FROM t WHERE b IN (1, 2, 3)").text,
+            fingerprint_query("SELECT a FROM t WHERE b IN (4,5)").text)
+        self.assertEqual(
+            fingerprint_query("SELECT a FROM t WHERE b IN (SELECT c FROM u)").text,
+            "SELECT a FROM t WHERE b IN(SELECT c FROM u)")
+
+    def test_identifiers_and_parameters_are_kept(self):
+        self.assertNotEqual(fingerprint_query("SELECT a FROM t1"), fingerprint_query("SELECT a FROM t2"))
+        self.assertNotEqual(fingerprint_query('SELECT "x" FROM t'), fingerprint_query('SELECT "y" FROM t'))
+        self.assertNotEqual(fingerprint_query("SELECT $1"), fingerprint_query("SELECT $2"))
+
+    def test_tree_and_lexer_agree(self):
+        for case in load_test_cases(self._directory_test_cases):
+            with self.subTest(name=case.name):
+                tokens = sqlparse.parse(case.query)[0].tokens
+                self.assertEqual(fingerprint_tokens(tokens), fingerprint_query(case.query))
+
+    def test_sql_query_fingerprint(self):
+        parse_cache.clear()
+        sql_query = SqlQuery()
+        sql_query.set_query("SELECT a FROM t WHERE b = 1", normalize=False)
+        first = sql_query.fingerprint()
+        sql_query.set_query("SELECT a FROM t WHERE b = 2")
+        self.assertEqual(sql_query.fingerprint(), first)
+        sql_query.set_query("SELECT a FROM t WHERE b = 1", normalize=False)
+        self.assertEqual(sql_query.fingerprint(), first)
+        self.assertEqual(parse_cache.stats().hits, 1)
+
+        # Queries sharing a cached query's literal-free text keep their own fingerprint.
+        for cached, query in (('SELECT "5" FROM t', 'SELECT "6" FROM t'),
+                              ("SELECT a -- it's\nFROM t", "SELECT b -- it's\nFROM t")):
+            sql_query.set_query(cached, normalize=False)
+            sql_query.fingerprint()
+            sql_query.set_query(query, normalize=False)
+            self.assertEqual(sql_query.fingerprint(), fingerprint_query(query))
+
+        with self.assertRaises(ValueError):
+            SqlQuery().fingerprint()
+
+
+if __name__ == '__main__':
+    unittest.main()
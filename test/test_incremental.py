@@ -0,0 +1,99 @@
+import unittest
+from pathlib import Path
+import sys
+
+path_to_append: Path = Path.cwd().resolve().parent
+sys.path.append(str(path_to_append))
+
+from incremental import IncrementalParser
+from query_processor import QueryProcessor
+from sql_query import SqlQuery
+
+
+def shape(tokens):
+    return [(type(token).__name__, str(token.ttype), str(token), shape(token.tokens) if token.is_group else None)
+            for token in tokens]
+
+
+class TestIncrementalParser(unittest.TestCase):
+
+    def setUp(self):
+        self.document = (
+            "SELECT a, (b + (c * 2)) AS x FROM t WHERE y IN (1, 2, (3));\n"
+            "UPDATE t SET a = (1 + 2); SELECT 'x;y' FROM u -- note\n"
+            ";SELECT f(z, (w))"
+        )
+
+    def assert_matches_fresh_parse(self, parser):
+        fresh = IncrementalParser(parser.text)
+        self.assertEqual([shape(tokens) for tokens in parser.statements],
+                         [shape(tokens) for tokens in fresh.statements])
+
+    def test_edit_inside_parenthesis(self):
+        parser = IncrementalParser(self.document)
+        untouched = parser.statements[1]
+        offset = self.document.index("c * 2")
+        parser.apply_edit(offset, 1, "total")
+
+        self.assertIn("(total * 2)", parser.text)
+        self.assertEqual(parser.last_reparsed_chars, len("(total * 2)"))
+        self.assertIs(parser.statements[1], untouched)
+        self.assert_matches_fresh_parse(parser)
+
+    def test_edit_reparses_only_its_statement(self):
+        parser = IncrementalParser(self.document)
+        first, last = parser.statements[0], parser.statements[-1]
+        offset = self.document.index("UPDATE t") + len("UPDATE ")
+        parser.apply_edit(offset, 1, "accounts")
+
+        self.assertIs(parser.statements[0], first)
+        self.assertIs(parser.statements[-1], last)
+        self.assertLess(parser.last_reparsed_chars, len(self.document) // 2)
+        self.assert_matches_fresh_parse(parser)
+
+    def test_edits_that_change_statement_boundaries(self):
+        parser = IncrementalParser(self.document)
+        # Remove the first semicolon, then open a string that swallows the rest
+        parser.apply_edit(self.document.index(";"), 1, "")
+        self.assertEqual(len(parser.statements), 3)
+        self.assert_matches_fresh_parse(parser)
+
+        parser.apply_edit(len("SELECT a, "), 0, "'")
+        self.assert_matches_fresh_parse(parser)
+        parser.apply_edit(0, 0, "SELECT 1; ")
+        self.assert_matches_fresh_parse(parser)
+
+    def test_first_statement_matches_parse_query(self):
+        parser = IncrementalParser("SELECT a FROM t")
+        parser.apply_edit(len("SELECT a"), 0, ", (b)")
+        expected = QueryProcessor("SELECT a, (b) FROM t").parse_query()
+        self.assertEqual([type(token).__name__ for token in parser.tokens],
+                         [type(token).__name__ for token in expected])
+
+    def test_invalid_edit(self):
+        parser = IncrementalParser("SELECT 1")
+        with self.assertRaises(ValueError):
+            parser.apply_edit(5, 10, "")
+        with self.assertRaises(ValueError):
+            parser.apply_edit(-1, 0, "x")
+
+    def test_sql_query_apply_edit(self):
+        sql_query = SqlQuery()
+        with self.assertRaises(ValueError):
+            sql_query.apply_edit(0, 0, "x")
+
+        sql_query.set_query("select a from t where b in (1, 2)")
+        sql_query.apply_edit(len("select a from t where b in (1, 2"), 0, ", 3")
+        self.assertEqual(sql_query.raw_query, "select a from t where b in (1, 2, 3)")
+        self.assertIsNone(sql_query.normalized_query)
+        self.assertEqual(sql_query.flatten_tree()[-2], "3")
+
+        sql_query.apply_edit(0, len("select"), "SELECT")
+        tree = sql_query.tree
+        self.assertIs(sql_query.create_tree(), tree)
+        expected = QueryProcessor("SELECT a from t where b in (1, 2, 3)").normalize_query()
+        self.assertEqual(sql_query.normalized_query, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
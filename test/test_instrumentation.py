@@ -0,0 +1,93 @@
+import unittest
+import socket
+from pathlib import Path
+import sys
+
+path_to_append: Path = Path.cwd().resolve().parent
+sys.path.append(str(path_to_append))
+
+import instrumentation
+from instrumentation import Event, MetricsCollector, StatsdSink, add_hook, emit, remove_hook, stage
+from parse_cache import parse_cache
+from sql_query import SqlQuery
+from token_processor import TokenProcessor
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        parse_cache.clear()
+        self.collector = MetricsCollector()
+        add_hook(self.collector)
+
+    def tearDown(self):
+        remove_hook(self.collector)
+
+    def test_disabled_by_default(self):
+        remove_hook(self.collector)
+        self.assertFalse(instrumentation.enabled())
+        self.assertIs(stage("parse"), stage("normalize"))
+        emit("ignored")
+        self.assertEqual(self.collector.counters, {})
+
+    def test_pipeline_events(self):
+        sql_query = SqlQuery()
+        sql_query.set_query("select a from t where b = (select 1)")
+        sql_query.create_tree()
+        sql_query.set_query("select a from t where b = (select 1)")
+        TokenProcessor().process(sql_query.create_tree())
+
+        for name in ("set_query", "process_query", "create_tree", "token_process"):
+            count, total, largest = self.collector.timing("stage_seconds", stage=name)
+            self.assertGreater(count, 0, name)
+            self.assertGreaterEqual(total, largest)
+        self.assertEqual(self.collector.timing("stage_seconds", stage="process_query")[0], 1)
+        self.assertEqual(self.collector.count("cache_hits", cache="process"), 1)
+        self.assertEqual(self.collector.count("cache_misses", cache="process"), 1)
+        self.assertEqual(self.collector.gauges[("tree_depth", ())][0], sql_query.get_depth())
+        self.assertEqual(self.collector.gauges[("tree_tokens", ())][0], sql_query.count_nodes())
+
+    def test_errors_are_counted(self):
+        with self.assertRaises(ValueError):
+            SqlQuery().set_query("")
+        with self.assertRaises(ValueError):
+            TokenProcessor().process([])
+
+        self.assertEqual(self.collector.count("errors", stage="set_query"), 1)
+        self.assertEqual(self.collector.count("errors", error="ValueError"), 2)
+
+    def test_prometheus_text(self):
+        emit("cache_hits", cache="parse", tier="raw")
+        emit("cache_hits", cache="parse", tier="raw")
+        emit("stage_seconds", 0.5, instrumentation.TIMING, stage="parse")
+        emit("tree_depth", 7, instrumentation.GAUGE)
+
+        text = self.collector.prometheus_text()
+        self.assertIn("# TYPE query_parser_cache_hits_total counter\n", text)
+        self.assertIn('query_parser_cache_hits_total{cache="parse",tier="raw"} 2\n', text)
+        self.assertIn('query_parser_stage_seconds_count{stage="parse"} 1\n', text)
+        self.assertIn('query_parser_stage_seconds_sum{stage="parse"} 0.5\n', text)
+        self.assertIn("query_parser_tree_depth 7\n", text)
+
+    def test_statsd_sink(self):
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(("127.0.0.1", 0))
+        receiver.settimeout(5)
+        sink = StatsdSink(port=receiver.getsockname()[1])
+        add_hook(sink)
+        try:
+            emit("stage_seconds", 0.0015, instrumentation.TIMING, stage="parse")
+            emit("errors", stage="parse")
+            packets = [receiver.recv(1024).decode() for _ in range(2)]
+        finally:
+            remove_hook(sink)
+            sink.close()
+            receiver.close()
+
+        self.assertEqual(packets, ["query_parser.stage_seconds:1.5|ms|#stage:parse",
+                                   "query_parser.errors:1|c|#stage:parse"])
+        self.assertEqual(sink.format(Event("tree_depth", instrumentation.GAUGE, 3)), "query_parser.tree_depth:3|g")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+from pathlib import Path
+import sys
+
+path_to_append: Path = Path.cwd().resolve().parent
+sys.path.append(str(path_to_append))
+
+from instrumentation import MetricsCollector, add_hook, remove_hook
+from limits import (LIST, LITERAL, LimitExceededError, ParseLimits, apply_limits,
+                    configure_limits, default_limits)
+from sql_query import SqlQuery
+from test_cases.test_case import TestCase, load_test_cases
+from typing import Dict
+
+
+def in_list(size: int) -> str:
+    return "SELECT * FROM t WHERE id IN (" + ", ".join(str(i) for i in range(size)) + ") AND x = 1"
+
+
+class TestLimits(unittest.TestCase):
+    _directory_test_cases = "test_cases"
+
+    def setUp(self):
+        self.test_cases: Dict[str, TestCase] = {
+            case.name: case for case in load_test_cases(self._directory_test_cases)}
+
+    def tearDown(self):
+        configure_limits(None)
+
+    def test_limits_raise(self):
+        query = "SELECT 'abcdef' FROM ((SELECT a FROM t)) x"
+        cases = {
+            "max_bytes": ParseLimits(max_bytes=10),
+            "max_tokens": ParseLimits(max_tokens=10),
+            "max_depth": ParseLimits(max_depth=1),
+            "max_literal_length": ParseLimits(max_literal_length=5),
+        }
+        for limit, limits in cases.items():
+            with self.subTest(limit=limit):
+                with self.assertRaises(LimitExceededError) as raised:
+                    SqlQuery().set_query(query, limits=limits)
+                self.assertIsInstance(raised.exception, ValueError)
+                self.assertEqual(raised.exception.limit, limit)
+        bounded = apply_limits(query, ParseLimits(max_bytes=100, max_tokens=100, max_depth=2))
+        self.assertEqual((bounded.text, bounded.summaries, bounded.depth), (query, (), 2))
+
+    def test_within_limits_changes_nothing(self):
+        limits = ParseLimits(max_tokens=10000, max_depth=50, degrade=True)
+        for name, test_case in self.test_cases.items():
+            with self.subTest(name=name):
+                bounded, plain = SqlQuery(), SqlQuery()
+                bounded.set_query(test_case.query, limits=limits)
+                plain.set_query(test_case.query)
+                self.assertEqual(bounded.summaries, ())
+                self.assertEqual(bounded.normalized_query, plain.normalized_query)
+
+    def test_degraded_list(self):
+        query = in_list(5000)
+        with self.assertRaises(LimitExceededError):
+            apply_limits(query, ParseLimits(max_tokens=1000))
+        bounded = apply_limits(query, ParseLimits(max_tokens=1000, degrade=True, max_list_items=100))
+        summary, = bounded.summaries
+        self.assertEqual((summary.kind, summary.count, summary.first, summary.last), (LIST, 5000, "0", "4999"))
+        self.assertEqual(query[summary.start:summary.stop], ", ".join(str(i) for i in range(5000)))
+        self.assertEqual(bounded.text[summary.new_start:summary.new_stop], "0, /* 4998 more */ 4999")
+        self.assertLess(bounded.tokens, 40)
+        tail = bounded.text.index("AND")
+        self.assertEqual(query[bounded.original_offset(tail):], "AND x = 1")
+        self.assertEqual(bounded.original_offset(summary.new_start + 3), summary.start)
+
+    def test_degraded_list_keeps_quoted_names(self):
+        columns = ", ".join(f'"c{i}"' for i in range(200))
+        query = f"INSERT INTO t ({columns}) VALUES (1)"
+        bounded = apply_limits(query, ParseLimits(degrade=True, max_list_items=3))
+        self.assertEqual((bounded.text, bounded.summaries), (query, ()))
+
+    def test_degraded_literal(self):
+        literal = "'" + "x" * 5000 + "'"
+        query = f"SELECT a FROM t WHERE b = {literal} AND c = \"{'y' * 50}\""
+        limits = ParseLimits(max_literal_length=100, degrade=True)
+        bounded = apply_limits(query, limits)
+        summary, = bounded.summaries
+        self.assertEqual((summary.kind, summary.count), (LITERAL, len(literal)))
+        self.assertTrue(literal.startswith(summary.first) and literal.endswith(summary.last))
+        self.assertIn("b = '' /* 5002 chars */ AND", bounded.text)
+        # Quoted identifiers cannot be replaced by a string placeholder.
+        with self.assertRaises(LimitExceededError):
+            apply_limits(query, limits._replace(max_literal_length=40))
+
+    def test_configured_limits_and_peak_memory(self):
+        configure_limits(ParseLimits(degrade=True, max_list_items=10, track_memory=True))
+        collector = MetricsCollector()
+        add_hook(collector)
+        try:
+            sql_query = SqlQuery()
+            sql_query.set_query(in_list(500))
+            self.assertEqual(sql_query.summaries[0].count, 500)
+            sql_query.create_tree()
+        finally:
+            remove_hook(collector)
+        self.assertIn("/* 498 more */", sql_query.normalized_query)
+        self.assertGreater(sql_query.peak_memory, 0)
+        gauge = collector.gauges[("peak_memory_bytes", (("stage", "create_tree"),))]
+        self.assertEqual(gauge[0], sql_query.peak_memory)
+
+    def test_configure_registers_limits(self):
+        limits = ParseLimits(max_tokens=5)
+        configure_limits(limits)
+        self.assertIs(default_limits(), limits)
+        sql_query = SqlQuery()
+        with self.assertRaises(LimitExceededError):
+            sql_query.set_query("SELECT a, b, c FROM t")
+        configure_limits(None)
+        sql_query.set_query("SELECT a, b, c FROM t")
+        self.assertIsNone(sql_query.limits)
+
+
+if __name__ == '__main__':
+    unittest.main()
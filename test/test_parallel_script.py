@@ -0,0 +1,89 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import sys
+
+path_to_append: Path = Path.cwd().resolve().parent
+sys.path.append(str(path_to_append))
+
+import sqlparse
+from parallel_script import (CTE_DEFINITION, CTE_PREFIX, CTE_SEPARATOR, CTE_TAIL, STATEMENTS,
+                             parse_script, split_script)
+from query_tree import QueryTree
+from test_cases.test_case import TestCase, load_test_cases
+from typing import Dict
+
+
+def whole_tree(script: str) -> QueryTree:
+    return QueryTree(list(sqlparse.parse(script)), script)
+
+
+class TestParallelScript(unittest.TestCase):
+    _directory_test_cases = "test_cases"
+
+    def setUp(self):
+        self.test_cases: Dict[str, TestCase] = {
+            case.name: case for case in load_test_cases(self._directory_test_cases)}
+        self.script = ";\n".join(test_case.query.strip().rstrip(";") for test_case in self.test_cases.values())
+
+    def assertSameTree(self, script: str, **options):
+        tree = parse_script(script, **options)
+        expected = whole_tree(script)
+        self.assertEqual(tree.to_dict(spans=True), expected.to_dict(spans=True))
+        self.assertEqual(tree.text_length, expected.text_length)
+        return tree
+
+    def test_matches_whole_script_parse(self):
+        scripts = [
+            self.script,
+            "select 1;  \n-- x\n select 2; /* c */ select 3;\n\n",
+            "select 1; -- c\nselect 2;-- c\n-- d\nselect 3;\t \r\nselect 4",
+            "select 'a;b'; select $$x;y$$; select \"q;\"",
+        ]
+        for script in scripts:
+            for chunk_size in (1, 64, 1 << 16):
+                with self.subTest(script=script[:30], chunk_size=chunk_size):
+                    self.assertSameTree(script, max_workers=1, chunk_size=chunk_size)
+
+    def test_offsets_are_global(self):
+        tree = self.assertSameTree(self.script, max_workers=1, chunk_size=1)
+        statements = list(tree.roots())
+        self.assertEqual(len(statements), len(sqlparse.parse(self.script)))
+        for statement in statements:
+            start, stop = tree.span(statement)
+            self.assertEqual(tree.text(statement), self.script[start:stop])
+
+    def test_block_bodies_are_not_cut(self):
+        script = "create procedure p() begin select 1; select 2; end; select 3; select 4;"
+        self.assertGreater(len(split_script(script, chunk_size=1)), 2)
+        tree = self.assertSameTree(script, max_workers=1, chunk_size=1)
+        self.assertEqual(len(list(tree.roots())), 3)
+
+    def test_split_ctes(self):
+        script = ("insert into t select 1;\nWITH a AS (select 1), b(x) AS (select x from a), "
+                  "c AS (select 'x, y') select * from b join c on true;\nselect 9")
+        pieces = split_script(script, chunk_size=1, split_ctes=True)
+        self.assertEqual([piece.role for piece in pieces],
+                         [STATEMENTS, CTE_PREFIX, CTE_DEFINITION, CTE_SEPARATOR, CTE_DEFINITION,
+                          CTE_SEPARATOR, CTE_DEFINITION, CTE_TAIL, STATEMENTS])
+        self.assertEqual([script[piece.start:piece.stop] for piece in pieces[1:4]],
+                         ["\nWITH ", "a AS (select 1)", ", "])
+        self.assertEqual(pieces[0].start, 0)
+        self.assertEqual(pieces[-1].stop, len(script))
+        for previous, piece in zip(pieces, pieces[1:]):
+            self.assertEqual(previous.stop, piece.start)
+        self.assertSameTree(script, max_workers=1, chunk_size=1, split_ctes=True)
+        self.assertSameTree("with recursive a AS (select 1), b AS (select 2) select 1",
+                            max_workers=1, split_ctes=True)
+        self.assertSameTree(self.test_cases["select_with"].query, max_workers=1, split_ctes=True)
+
+    def test_worker_pools(self):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            self.assertSameTree(self.script, chunk_size=64, split_ctes=True, executor=executor)
+        self.assertSameTree(self.script, max_workers=2, chunk_size=256)
+
+    def test_invalid_input(self):
+        with self.assertRaises(ValueError):
+            parse_script("")
+        with self.assertRaises(ValueError):
+            split_script("select 1", chunk_size=0)
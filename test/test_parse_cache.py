@@ -0,0 +1,75 @@
+import unittest
+import threading
+from pathlib import Path
+import sys
+
+path_to_append: Path = Path.cwd().resolve().parent
+sys.path.append(str(path_to_append))
+
+from parse_cache import ParseCache, parse_cache
+from query_processor import QueryProcessor
+
+
+class TestParseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ParseCache(max_entries=2, max_bytes=1024 * 1024)
+
+    def test_hit_and_miss_counters(self):
+        self.assertIsNone(self.cache.get("normalize", "SELECT 1"))
+        self.cache.put("normalize", "SELECT 1", "SELECT 1")
+        self.assertEqual(self.cache.get("normalize", "SELECT 1"), "SELECT 1")
+
+        stats = self.cache.stats()
+        self.assertEqual((stats.hits, stats.misses, stats.entries), (1, 1, 1))
+
+    def test_lru_eviction_by_entries(self):
+        self.cache.put("normalize", "a", "A")
+        self.cache.put("normalize", "b", "B")
+        self.cache.get("normalize", "a")
+        self.cache.put("normalize", "c", "C")
+
+        self.assertEqual(self.cache.get("normalize", "a"), "A")
+        self.assertIsNone(self.cache.get("normalize", "b"))
+        self.assertEqual(self.cache.stats().evictions, 1)
+
+    def test_eviction_by_bytes(self):
+        cache = ParseCache(max_entries=100, max_bytes=200)
+        cache.put("normalize", "a", "x" * 100)
+        cache.put("normalize", "b", "y" * 100)
+        self.assertIsNone(cache.get("normalize", "a"))
+        self.assertLessEqual(cache.stats().size_bytes, 200)
+
+    def test_configure_disables_cache(self):
+        self.cache.put("normalize", "a", "A")
+        self.cache.configure(max_entries=0)
+        self.cache.put("normalize", "b", "B")
+        self.assertEqual(self.cache.stats().entries, 0)
+        with self.assertRaises(ValueError):
+            self.cache.configure(max_bytes=-1)
+
+    def test_concurrent_access(self):
+        cache = ParseCache(max_entries=50)
+
+        def work(offset):
+            for i in range(200):
+                cache.put("normalize", str(offset + i), str(i))
+                cache.get("normalize", str(offset + i // 2))
+
+        threads = [threading.Thread(target=work, args=(n * 1000,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(cache.stats().entries, 50)
+
+    def test_shared_across_processors(self):
+        parse_cache.clear()
+        tokens_first = QueryProcessor("SELECT id FROM cached_table").parse_query()
+        tokens_second = QueryProcessor("SELECT id FROM cached_table").parse_query()
+        self.assertIs(tokens_first, tokens_second)
+        self.assertEqual(parse_cache.stats().hits, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import unittest
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import sys
+
+path_to_append: Path = Path.cwd().resolve().parent
+sys.path.append(str(path_to_append))
+
+import persistent_cache
+from instrumentation import MetricsCollector, add_hook, remove_hook
+from parse_cache import disk_cache, parse_cache
+from persistent_cache import DiskCache, configure_disk_cache
+from query_processor import QueryProcessor
+from sql_query import SqlQuery
+from token_processor import TokenProcessor
+
+
+def parse_in_worker(path, queries):
+    configure_disk_cache(path)
+    results = []
+    for query in queries:
+        sql_query = SqlQuery()
+        sql_query.set_query(query)
+        sql_query.create_tree()
+        results.append(sql_query.flatten_tree())
+    return results
+
+
+class TestPersistentCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = str(Path(self.directory.name) / "cache.sqlite")
+        parse_cache.clear()
+
+    def tearDown(self):
+        configure_disk_cache(None)
+        parse_cache.clear()
+        self.directory.cleanup()
+
+    def test_get_put(self):
+        cache = DiskCache(self.path)
+        self.assertIsNone(cache.get("normalize", "select 1"))
+        cache.put("normalize", "select 1", text="SELECT 1")
+        cache.put("process", "select 1", text="SELECT 1", tree=b"\x00\x01")
+        self.assertEqual(cache.get("normalize", "select 1"), ("SELECT 1", None))
+        self.assertEqual(cache.get("process", "select 1"), ("SELECT 1", b"\x00\x01"))
+
+        stats = cache.stats()
+        self.assertEqual((stats.hits, stats.misses, stats.entries), (2, 1, 2))
+        cache.close()
+
+    def test_version_stamp(self):
+        DiskCache(self.path, version="old").put("normalize", "select 1", text="SELECT 1")
+        cache = DiskCache(self.path, version="new")
+        self.assertIsNone(cache.get("normalize", "select 1"))
+        self.assertEqual(cache.stats().entries, 0)
+
+    def test_size_bound(self):
+        cache = DiskCache(self.path, max_bytes=1000)
+        for i in range(50):
+            cache.put("normalize", f"select {i}", text="x" * 100)
+        stats = cache.stats()
+        self.assertLessEqual(stats.size_bytes, 1000)
+        self.assertGreater(stats.evictions, 0)
+        self.assertIsNotNone(cache.get("normalize", "select 49"))
+
+    def test_size_totals(self):
+        cache = DiskCache(self.path, max_bytes=1000)
+        for i in range(30):
+            cache.put("normalize", f"select {i % 12}", text="x" * (10 + i * 3))
+        cache.put("process", "select 1", text="y" * 20, tree=b"\x00" * 5)
+        connection = cache._connection()
+        self.assertEqual(connection.execute("SELECT entries, size FROM totals").fetchone(),
+                         connection.execute("SELECT COUNT(*), SUM(size) FROM entries").fetchone())
+        self.assertLessEqual(cache.stats().size_bytes, 1000)
+
+        # Databases written before the totals existed get them on first use.
+        connection.executescript("DROP TRIGGER entries_insert; DROP TRIGGER entries_delete; "
+                                 "DROP TRIGGER entries_update; DROP TABLE totals;")
+        expected = connection.execute("SELECT COUNT(*), SUM(size) FROM entries").fetchone()
+        cache.close()
+        stats = DiskCache(self.path).stats()
+        self.assertEqual((stats.entries, stats.size_bytes), expected)
+
+    def test_configure_registers_cache(self):
+        cache = configure_disk_cache(self.path)
+        self.assertIs(disk_cache(), cache)
+        QueryProcessor("select 1").normalize_query()
+        self.assertEqual(cache.get("normalize", "select 1"), ("SELECT 1", None))
+        configure_disk_cache(None)
+        self.assertIsNone(disk_cache())
+
+    def test_trees_load_without_sqlparse(self):
+        query = "select a, b from t where c in (1, 2) and d = (select max(e) from u)"
+        configure_disk_cache(self.path)
+        first = SqlQuery()
+        first.set_query(query)
+        expected = TokenProcessor().process(first.create_tree())
+        raw = SqlQuery()
+        raw.set_query(query, normalize=False)
+        expected_raw = TokenProcessor().process(raw.create_tree())
+
+        # A restarted process: empty memory cache, same database.
+        parse_cache.clear()
+        configure_disk_cache(self.path)
+        collector = MetricsCollector()
+        add_hook(collector)
+        try:
+            second = SqlQuery()
+            second.set_query(query)
+            tree = second.create_tree()
+            raw = SqlQuery()
+            raw.set_query(query, normalize=False)
+            raw_tree = raw.create_tree()
+        finally:
+            remove_hook(collector)
+
+        self.assertEqual(second.normalized_query, first.normalized_query)
+        self.assertEqual(TokenProcessor().process(tree), expected)
+        self.assertEqual(TokenProcessor().process(raw_tree), expected_raw)
+        self.assertEqual(collector.timing("stage_seconds", stage="process_query")[0], 0)
+        self.assertEqual(collector.timing("stage_seconds", stage="parse")[0], 0)
+        self.assertEqual(collector.count("cache_hits", tier="disk"), 2)
+
+    def test_shared_across_processes(self):
+        queries = [f"select col{i} from t where x = {i}" for i in range(20)]
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(parse_in_worker, self.path, queries) for _ in range(4)]
+            results = [future.result() for future in futures]
+
+        self.assertTrue(all(result == results[0] for result in results))
+        self.assertEqual(results[0][3][2], "col3")
+        cache = DiskCache(self.path)
+        self.assertEqual(cache.stats().entries, 20)
+        self.assertIsNotNone(persistent_cache.PARSER_VERSION)
+
+
+if __name__ == '__main__':
+    unittest.main()
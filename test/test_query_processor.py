@@ -1,9 +1,10 @@
 import unittest
 import sqlparse
 from query_processor import QueryProcessor
-from test_cases import test_cases
+from test_cases.test_case import load_test_cases
 
 class TestQueryProcessor(unittest.TestCase):
+    _directory_test_cases = "test_cases"
 
     def setUp(self):
         self.simple_query = "SELECT * FROM users"
@@ -50,5 +51,37 @@ class TestQueryProcessor(unittest.TestCase):
             processor.parse_query()
         self.assertTrue("Error while parsing the query" in str(context.exception))
 
+    def test_process_query(self):
+        # The single-pass pipeline must agree with normalizing then re-parsing
+        for case in load_test_cases(self._directory_test_cases):
+            with self.subTest(name=case.name):
+                normalized, tokens = QueryProcessor(case.query).process_query()
+                expected_normalized = QueryProcessor(case.query).normalize_query()
+                expected_tokens = QueryProcessor(expected_normalized).parse_query()
+
+                self.assertEqual(normalized, expected_normalized)
+                self.assertEqual(structure(tokens), structure(expected_tokens))
+
+    def test_process_query_whitespace_placement(self):
+        # Line breaks added by reindenting sit where the grouper would put them
+        queries = [
+            "update t set a = 1 where b = 'x'",
+            "select a from t where b = 1 order by a limit 3",
+            "select * from (select a from t where x = 1 group by a) s where y = 2",
+            "with c as (select a from t where b = 1) select a, b from c union select 1, 2 from d",
+            "select a -- note\n from t /* block */ where b = 1",
+        ]
+        for query in queries:
+            with self.subTest(query=query):
+                normalized, tokens = QueryProcessor(query).process_query()
+                self.assertEqual(structure(tokens), structure(QueryProcessor(normalized).parse_query()))
+        where = QueryProcessor("select a from t where b = 1").process_query()[1][-1]
+        self.assertEqual((type(where).__name__, where.value), ("Where", "WHERE b = 1"))
+
+
+def structure(tokens):
+    return [(type(token).__name__, token.value, structure(token.tokens)) if token.is_group
+            else (token.ttype, token.value) for token in tokens]
+
 if __name__ == '__main__':
     unittest.main()
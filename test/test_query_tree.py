@@ -0,0 +1,104 @@
+import unittest
+import json
+import sqlparse
+from sqlparse import tokens as T
+from pathlib import Path
+import sys
+
+path_to_append: Path = Path.cwd().resolve().parent
+sys.path.append(str(path_to_append))
+
+from query_tree import QueryTree
+from sql_query import SqlQuery
+from token_processor import TokenProcessor
+from test_cases.test_case import TestCase, load_test_cases
+from typing import List
+
+
+class TestQueryTree(unittest.TestCase):
+    _directory_test_cases = "test_cases"
+
+    def setUp(self):
+        self.test_cases: List[TestCase] = load_test_cases(self._directory_test_cases)
+        self.tokens = sqlparse.parse("SELECT name, age FROM People WHERE age > 30")[0].tokens
+        self.tree = QueryTree(self.tokens)
+
+    def test_view_matches_token_processor(self):
+        for case in self.test_cases:
+            with self.subTest(name=case.name):
+                sql_query = SqlQuery()
+                sql_query.set_query(case.query)
+                expected = {"type": "ROOT", "children": TokenProcessor().process(sql_query.create_tree())}
+                self.assertEqual(sql_query.tree_to_dict(), expected)
+                self.assertEqual(sql_query.tree_to_dict().to_dict(), expected)
+
+    def test_structure(self):
+        roots = list(self.tree.roots())
+        self.assertEqual([self.tree.type_of(node) for node in roots if not self.tree.is_group(node)][0], T.DML)
+        where = self.tree.find_tokens("Where")[0]
+        self.assertEqual(self.tree.text(where), "WHERE age > 30")
+        self.assertEqual(self.tree.parent[where], -1)
+        for child in self.tree.children(where):
+            self.assertEqual(self.tree.parent[child], where)
+            self.assertTrue(where < child < self.tree.end[where])
+
+    def test_find_depth_count(self):
+        self.assertEqual(len(self.tree.find_tokens("Identifier")), 4)
+        self.assertEqual([self.tree.value(node) for node in self.tree.find_tokens(T.Keyword)], ["SELECT", "FROM", "WHERE"])
+        self.assertEqual(self.tree.get_depth(), 4)
+        # 18 leaves plus IdentifierList, four Identifiers, Where and Comparison
+        self.assertEqual(self.tree.count_nodes(), 25)
+
+    def test_deep_tree(self):
+        tree = sqlparse.sql.Token(T.Name, "x")
+        for _ in range(sys.getrecursionlimit() + 100):
+            tree = sqlparse.sql.Parenthesis([tree])
+        query_tree = QueryTree([tree])
+        self.assertEqual(query_tree.get_depth(), sys.getrecursionlimit() + 101)
+        self.assertEqual(query_tree.count_nodes(), sys.getrecursionlimit() + 101)
+        self.assertEqual(query_tree.view()["children"][0]["value"], "x")
+
+    def test_plain_dict_with_type_names(self):
+        plain = self.tree.to_dict(type_names=True)
+        self.assertEqual(plain["children"][0]["type"], "Token.Keyword.DML")
+        json.dumps(plain)
+
+    def test_sql_query_helpers(self):
+        sql_query = SqlQuery()
+        sql_query.set_query("select a from t where b = 1")
+        self.assertEqual([node["value"] for node in sql_query.find_tokens("Identifier")], ["a", "t", "b"])
+        self.assertEqual(sql_query.count_nodes(), sql_query.query_tree().count_nodes())
+        self.assertGreater(sql_query.get_depth(), 1)
+
+    def test_spans(self):
+        self.assertEqual(self.tree.source, "SELECT name, age FROM People WHERE age > 30")
+        where = self.tree.find_tokens("Where")[0]
+        self.assertEqual(self.tree.span(where), (29, 43))
+        for node in range(len(self.tree)):
+            start, stop = self.tree.span(node)
+            self.assertEqual(self.tree.text(node), self.tree.source[start:stop])
+
+        plain = self.tree.to_dict(spans=True)
+        self.assertEqual(plain["source"], self.tree.source)
+        self.assertEqual(plain["children"][0], {"type": T.DML, "span": [0, 6], "is_group": False})
+        self.assertEqual(TokenProcessor().process(self.tokens, spans=True), plain["children"])
+
+    def test_shared_source(self):
+        sql_query = SqlQuery()
+        sql_query.set_query("select a, b from t where c in (1, 2)")
+        self.assertIs(sql_query.query_tree().source, sql_query.normalized_query)
+        plain = sql_query.tree_to_dict(spans=True)
+        identifier = sql_query.find_tokens("IdentifierList")[0]
+        self.assertEqual(identifier["value"], "a,\n       b")
+        json.dumps(plain, default=str)
+
+        with self.assertRaises(ValueError):
+            QueryTree(self.tokens, source="SELECT something else")
+
+    def test_invalid_tokens(self):
+        with self.assertRaises(ValueError):
+            QueryTree([])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import unittest
+import sqlparse
+from pathlib import Path
+import sys
+
+path_to_append: Path = Path.cwd().resolve().parent
+sys.path.append(str(path_to_append))
+
+from references import READ, WRITE, build_index
+from sql_query import SqlQuery
+from test_cases.test_case import TestCase, load_test_cases
+from typing import Dict
+
+
+class TestReferences(unittest.TestCase):
+    _directory_test_cases = "test_cases"
+
+    def setUp(self):
+        self.test_cases: Dict[str, TestCase] = {
+            case.name: case for case in load_test_cases(self._directory_test_cases)}
+
+    def index_of(self, name: str):
+        sql_query = SqlQuery()
+        sql_query.set_query(self.test_cases[name].query)
+        index = sql_query.references()
+        self.assertIs(sql_query.references(), index)
+        return index
+
+    def test_select_with(self):
+        index = self.index_of("select_with")
+        self.assertEqual([table.name for table in index.tables_with_role(READ)], ["table1", "table2"])
+        self.assertEqual(index.tables_with_role(WRITE), ())
+        cte = index.cte("CTE")
+        self.assertEqual(cte.name, "cte")
+        body = index.scopes[cte.scope]
+        self.assertEqual((body.kind, body.name, body.parent), ("cte", "cte", 0))
+        self.assertTrue(index.text(body).startswith("(SELECT col1"))
+        usage, = index.table_references("cte")
+        self.assertTrue(usage.cte)
+        self.assertEqual(index.text(usage), "cte")
+        self.assertEqual([column.name for column in index.columns_of("table1")], ["col1"])
+        self.assertEqual([column.name for column in index.columns_of("table2")], ["col2"])
+        self.assertEqual([column.name for column in index.columns_of("cte")], ["*"])
+
+    def test_subselect_column_agg(self):
+        index = self.index_of("subselect_column_agg")
+        self.assertEqual([table.name for table in index.tables_with_role(READ)],
+                         ["orders", "payments", "users", "vip_users"])
+        self.assertEqual(index.alias("u", scope=2).name, "users")
+        self.assertEqual([scope.name for scope in index.scopes if scope.kind == "subquery"],
+                         ["order_count", "average_payment", None])
+        # Correlated references resolve to the outer alias.
+        outer = index.columns_qualified_by("u")
+        self.assertEqual(len(outer), 6)
+        self.assertEqual({column.table for column in outer}, {"users"})
+        self.assertEqual({column.scope for column in outer}, {0, 1, 2})
+        self.assertEqual([index.text(column) for column in index.columns_of("payments")],
+                         ["amount", "payments.user_id"])
+        vip, = index.scope_columns(3)
+        self.assertEqual((vip.name, vip.table, vip.clause), ("user_id", "vip_users", "SELECT"))
+
+    def test_update_table_set_column(self):
+        index = self.index_of("update_table_set_column")
+        table, = index.tables_with_role(WRITE)
+        self.assertEqual(table.name.lower(), "table")
+        self.assertEqual(index.tables_with_role(READ), ())
+        column, = index.columns_of("table")
+        self.assertEqual((column.name, column.clause), ("column1", "SET"))
+        self.assertEqual(index.text(column), "column1")
+
+    def test_offsets_follow_source(self):
+        query = "select q.a, c from (select a from s.t x where x.b = 1) q join c on q.a = c.a"
+        index = build_index(sqlparse.parse(query)[0].tokens)
+        for reference in index.tables + index.columns + index.scopes:
+            self.assertEqual(index.text(reference), query[reference.start:reference.stop])
+        table, = index.table_references("t")
+        self.assertEqual((table.schema, table.alias, index.text(table)), ("s", "x", "s.t"))
+        self.assertEqual([column.name for column in index.columns_of("q")], ["a", "a"])
+        self.assertIsNone(index.columns[1].table)
+
+    def test_write_roles(self):
+        cases = {
+            "INSERT INTO t (a, b) SELECT c FROM u": (["t"], ["u"]),
+            "DELETE FROM t WHERE a IN (SELECT a FROM u)": (["t"], ["u"]),
+            "CREATE TABLE IF NOT EXISTS t AS SELECT a FROM u": (["t"], ["u"]),
+            "UPDATE t SET a = b FROM u WHERE t.id = u.id": (["t"], ["u"]),
+        }
+        for query, (written, read) in cases.items():
+            with self.subTest(query=query):
+                index = build_index(sqlparse.parse(query)[0].tokens)
+                self.assertEqual([table.name for table in index.tables_with_role(WRITE)], written)
+                self.assertEqual([table.name for table in index.tables_with_role(READ)], read)
+
+    def test_insert_select_columns(self):
+        cases = {
+            "INSERT INTO t (a, b) SELECT c, d FROM s": "s",
+            "INSERT INTO t SELECT c, d FROM s WHERE e = 1": "s",
+            "CREATE TABLE t AS SELECT c, d FROM s": "s",
+        }
+        for query, table in cases.items():
+            with self.subTest(query=query):
+                index = build_index(sqlparse.parse(query)[0].tokens)
+                columns = {column.name: column.table for column in index.columns}
+                self.assertEqual(columns.pop("c"), table)
+                self.assertEqual(columns.pop("d"), table)
+        index = build_index(sqlparse.parse("INSERT INTO t (a, b) SELECT c, d FROM s")[0].tokens)
+        self.assertEqual([column.name for column in index.columns_of("t")], ["a", "b"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import unittest
+from pathlib import Path
+import sys
+
+path_to_append: Path = Path.cwd().resolve().parent
+sys.path.append(str(path_to_append))
+
+from sqlparse import tokens as T
+from instrumentation import MetricsCollector, add_hook, remove_hook
+from rules import (BLOCK, WARN, Rule, RuleSet, blocked_tables, default_rules, no_cross_join,
+                   no_select_star, require_where)
+from sql_query import SqlQuery
+from test_cases.test_case import TestCase, load_test_cases
+from typing import Dict
+
+
+def check(query: str, rules: RuleSet, **options):
+    sql_query = SqlQuery()
+    sql_query.set_query(query)
+    return sql_query.check_rules(rules, **options)
+
+
+class TestRules(unittest.TestCase):
+    _directory_test_cases = "test_cases"
+
+    def setUp(self):
+        self.test_cases: Dict[str, TestCase] = {
+            case.name: case for case in load_test_cases(self._directory_test_cases)}
+
+    def test_builtin_rules(self):
+        rules = RuleSet([no_select_star(), require_where(), no_cross_join(), blocked_tables(["hr.salaries", "Secrets"])])
+        cases = {
+            "select * from t": ["no_select_star"],
+            "select t.* from t": ["no_select_star"],
+            "select count(*) from t": [],
+            "delete from t": ["require_where"],
+            "update t set a = 1 where b = 2": [],
+            "with x as (select 1) update t set a = 1": ["require_where"],
+            "select a from t for update": [],
+            "select a from t where b = 1 for update": [],
+            "select a from t cross join u": ["no_cross_join"],
+            "select a from t, u": ["no_cross_join"],
+            "select a from t, u where t.id = u.id": [],
+            "select a from t join hr.salaries s on s.id = t.id": ["blocked_tables"],
+            "select a from t join salaries s on s.id = t.id": [],
+            "insert into app.secrets values (1)": ["blocked_tables"],
+            "INSERT INTO secrets (a) VALUES (1)": ["blocked_tables"],
+            "insert into secrets(a, b) select 1, 2": ["blocked_tables"],
+            "insert into app.secrets (a, b) values (1, 2)": ["blocked_tables"],
+            'insert into "Secrets" (a) values (1)': ["blocked_tables"],
+            "insert into t (secrets) values (1)": [],
+            "select secrets from t": [],
+        }
+        for query, expected in cases.items():
+            with self.subTest(query=query):
+                report = check(query, rules, stop_on_block=False)
+                self.assertEqual([violation.rule for violation in report.violations], expected)
+                self.assertEqual(report.blocked, bool(expected))
+
+    def test_corpus_select_star(self):
+        rules = RuleSet([no_select_star(WARN)])
+        for name, test_case in self.test_cases.items():
+            with self.subTest(name=name):
+                sql_query = SqlQuery()
+                sql_query.set_query(test_case.query)
+                report = sql_query.check_rules(rules)
+                wildcards = [node for node in sql_query.query_tree().find_tokens(T.Wildcard)]
+                self.assertLessEqual(len(report.violations), len(wildcards))
+                self.assertFalse(report.blocked)
+                tree = sql_query.query_tree()
+                for violation in report.violations:
+                    self.assertEqual(tree.source[violation.start:violation.stop], "*")
+
+    def test_stops_on_first_block(self):
+        query = "select * from t where a in (select * from u)"
+        sql_query = SqlQuery()
+        sql_query.set_query(query)
+        report = sql_query.check_rules(default_rules())
+        self.assertEqual(len(report.violations), 1)
+        self.assertLess(report.nodes_visited, len(sql_query.query_tree()))
+        report = sql_query.check_rules(default_rules(), stop_on_block=False)
+        self.assertEqual(len(report.violations), 2)
+        self.assertEqual(report.nodes_visited, len(sql_query.query_tree()))
+
+    def test_custom_rule_and_timings(self):
+        seen = []
+
+        def record(context, node):
+            seen.append(context.keyword_before(node))
+            return False
+
+        rules = RuleSet([
+            Rule("limit_required", [T.Keyword.DML], values=["select"],
+                 check=lambda context, node: not any(
+                     context.tree.value(sibling) == "LIMIT" for sibling in context.tree.roots()),
+                 severity=WARN, message="{text} without LIMIT"),
+            Rule("identifiers", ["Identifier"], check=record),
+        ])
+        collector = MetricsCollector()
+        add_hook(collector)
+        try:
+            report = check("select a from t", rules, timings=True)
+        finally:
+            remove_hook(collector)
+        violation, = report.violations
+        self.assertEqual((violation.severity, violation.message), (WARN, "SELECT without LIMIT"))
+        self.assertFalse(report.blocked)
+        self.assertEqual(seen, ["SELECT", "FROM"])
+        self.assertEqual(set(report.timings), {"limit_required", "identifiers"})
+        self.assertEqual(collector.timing("rule_seconds", rule="identifiers")[0], 1)
+
+    def test_invalid_rules(self):
+        with self.assertRaises(ValueError):
+            Rule("empty", [])
+        with self.assertRaises(ValueError):
+            Rule("severity", [T.Wildcard], severity="fatal")
+        with self.assertRaises(ValueError):
+            RuleSet([no_select_star(), no_select_star(BLOCK)])
+
+
+if __name__ == '__main__':
+    unittest.main()
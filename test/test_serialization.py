@@ -0,0 +1,78 @@
+import unittest
+import io
+import json
+from pathlib import Path
+import sys
+
+path_to_append: Path = Path.cwd().resolve().parent
+sys.path.append(str(path_to_append))
+
+from serialization import dump_dict, dump_tree, dumps_json, load_dict, load_tree, write_json
+from sql_query import SqlQuery
+from test_cases.test_case import TestCase, load_test_cases
+from typing import List
+
+
+class TestSerialization(unittest.TestCase):
+    _directory_test_cases = "test_cases"
+
+    def setUp(self):
+        self.test_cases: List[TestCase] = load_test_cases(self._directory_test_cases)
+
+    def query_tree(self, query):
+        sql_query = SqlQuery()
+        sql_query.set_query(query)
+        return sql_query, sql_query.query_tree()
+
+    def test_fixture_round_trip(self):
+        for case in self.test_cases:
+            with self.subTest(name=case.name):
+                self.assertEqual(load_dict(dump_dict(case.expected)), case.expected)
+                self.assertEqual(json.loads(dumps_json(case.expected)), case.expected)
+
+    def test_tree_round_trip(self):
+        for case in self.test_cases:
+            with self.subTest(name=case.name):
+                sql_query, tree = self.query_tree(case.query)
+                loaded = load_tree(dump_tree(tree))
+
+                self.assertEqual(loaded.to_dict(), tree.to_dict())
+                self.assertEqual(loaded.to_dict(spans=True), tree.to_dict(spans=True))
+                self.assertEqual(list(loaded.end), list(tree.end))
+                self.assertEqual(list(loaded.next_sibling), list(tree.next_sibling))
+                # The dict form keeps sqlparse token types through the binary format.
+                plain = sql_query.tree_to_dict().to_dict()
+                self.assertEqual(load_dict(dump_dict(sql_query.tree_to_dict())), plain)
+
+    def test_streaming_json_matches_dict_form(self):
+        for case in self.test_cases:
+            with self.subTest(name=case.name):
+                sql_query, tree = self.query_tree(case.query)
+                expected = tree.to_dict(type_names=True)
+                self.assertEqual(json.loads(dumps_json(tree)), expected)
+                self.assertEqual(json.loads(dumps_json(sql_query.tree_to_dict())), expected)
+                self.assertEqual(json.loads(dumps_json(tree, spans=True)), tree.to_dict(type_names=True, spans=True))
+
+                stream = io.StringIO()
+                write_json(tree, stream, buffer_size=16)
+                self.assertEqual(stream.getvalue(), dumps_json(tree))
+
+    def test_binary_is_smaller_than_json(self):
+        case = next(case for case in self.test_cases if case.name == "subselect_column_agg")
+        _, tree = self.query_tree(case.query)
+        self.assertLess(len(dump_tree(tree)) * 5, len(dumps_json(tree)))
+
+    def test_invalid_data(self):
+        _, tree = self.query_tree("select a from t")
+        data = dump_tree(tree)
+        for broken in (b"", b"nope", data[:-1], data + b"\x00", dump_dict({"type": "ROOT", "children": []})):
+            with self.subTest(data=broken[:8]):
+                with self.assertRaises(ValueError):
+                    load_tree(broken)
+        with self.assertRaises(ValueError):
+            dump_dict({"type": "ROOT", "children": [{"type": "Keyword"}]})
+        self.assertEqual(load_dict(dump_dict({"type": "ROOT", "children": []})), {"type": "ROOT", "children": []})
+
+
+if __name__ == '__main__':
+    unittest.main()
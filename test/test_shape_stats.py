@@ -0,0 +1,99 @@
+import tempfile
+import unittest
+from pathlib import Path
+import sys
+
+path_to_append: Path = Path.cwd().resolve().parent
+sys.path.append(str(path_to_append))
+
+from shape_stats import ShapeStats, collect_shape_stats
+from sql_query import SqlQuery
+from test_cases.test_case import TestCase, load_test_cases
+from typing import Dict
+
+
+def log_lines():
+    lines = []
+    for number in range(60):
+        lines.append(f"select a, b from s.orders o join users u on u.id = o.user_id where o.id = {number}\n")
+        if number % 3 == 0:
+            lines.append(f"UPDATE accounts SET balance = {number} WHERE id IN ({number}, {number + 1})")
+        if number % 20 == 0:
+            lines.append(f"select c{number} from rare{number}")
+    return lines + ["", "  \n"]
+
+
+class TestShapeStats(unittest.TestCase):
+    _directory_test_cases = "test_cases"
+
+    def setUp(self):
+        self.test_cases: Dict[str, TestCase] = {
+            case.name: case for case in load_test_cases(self._directory_test_cases)}
+
+    def test_shape_statistics(self):
+        stats = ShapeStats().update(log_lines())
+        self.assertEqual((stats.queries, stats.errors), (83, 0))
+        self.assertEqual(stats.distinct_shapes(), 5)
+        top = stats.top(2)
+        self.assertEqual([(summary.count, summary.tracked) for summary in top], [(60, 60), (20, 20)])
+        select = top[0]
+        self.assertEqual(select.fingerprint, "SELECT a, b FROM s.orders o JOIN users u ON u.id = o.user_id WHERE o.id = ?")
+        self.assertEqual(select.tables, ("s.orders", "users"))
+        self.assertEqual((select.min_tokens, select.max_tokens), (26, 26))
+        self.assertEqual(select.token_histogram[5], 60)
+        self.assertGreater(select.max_depth, 1)
+        self.assertEqual(top[1].tables, ("accounts",))
+        self.assertEqual(stats.token_counts.quantile(0.5), 26)
+
+    def test_matches_single_query_path(self):
+        batched = ShapeStats().update(test_case.query for test_case in self.test_cases.values())
+        single = ShapeStats()
+        for test_case in self.test_cases.values():
+            sql_query = SqlQuery()
+            sql_query.set_query(test_case.query.strip(), normalize=False)
+            with self.subTest(name=test_case.name):
+                self.assertEqual(single.add(test_case.query.strip()), sql_query.fingerprint().hash)
+        self.assertEqual(batched.top(), single.top())
+
+    def test_bounded_tracking(self):
+        lines = [f"select x from t{number % 50}" for number in range(500)] + ["select y from hot"] * 100
+        stats = ShapeStats(max_shapes=5).update(lines)
+        top = stats.top()
+        self.assertEqual(len(top), 5)
+        self.assertEqual(top[0].fingerprint, "SELECT y FROM hot")
+        self.assertEqual(top[0].count, 100)
+
+    def test_rare_shapes_do_not_displace_frequent_ones(self):
+        lines = ["select a from t"] * 100 + ["select b from t"] * 100 + ["select c from t"]
+        stats = ShapeStats(max_shapes=2).update(lines + ["select d from t"] * 50)
+        self.assertEqual([(summary.fingerprint, summary.count, summary.tracked) for summary in stats.top()],
+                         [("SELECT a FROM t", 100, 100), ("SELECT b FROM t", 100, 100)])
+        stats.update(["select d from t"] * 60)
+        self.assertEqual([(summary.fingerprint, summary.count) for summary in stats.top()],
+                         [("SELECT d FROM t", 110), ("SELECT a FROM t", 100)])
+
+    def test_merge_and_dump(self):
+        lines = log_lines()
+        whole = ShapeStats().update(lines)
+        merged = ShapeStats().update(lines[::2]).merge(ShapeStats().update(lines[1::2]))
+        self.assertEqual(merged.top(), whole.top())
+        self.assertEqual(merged.distinct_shapes(), whole.distinct_shapes())
+        with self.assertRaises(ValueError):
+            merged.merge(ShapeStats(max_shapes=10))
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "stats.json"
+            merged.dump(path)
+            loaded = ShapeStats.load(path)
+            self.assertEqual(loaded.top(), merged.top())
+            self.assertEqual(loaded.to_dict(), merged.to_dict())
+            path.write_text("{}")
+            with self.assertRaises(ValueError):
+                ShapeStats.load(path)
+        pooled = collect_shape_stats(lines, chunk_size=20, max_workers=2)
+        self.assertEqual(pooled.top(), whole.top())
+
+    def test_errors(self):
+        stats = ShapeStats()
+        self.assertIsNone(stats.add(""))
+        stats.update([None, "select 1"])
+        self.assertEqual((stats.queries, stats.errors), (3, 2))
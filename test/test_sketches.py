@@ -0,0 +1,65 @@
+import random
+import unittest
+from pathlib import Path
+import sys
+
+path_to_append: Path = Path.cwd().resolve().parent
+sys.path.append(str(path_to_append))
+
+from sketches import CountMinSketch, HyperLogLog, TDigest, mix64
+
+
+class TestSketches(unittest.TestCase):
+
+    def test_count_min_never_undercounts(self):
+        generator = random.Random(3)
+        sketch = CountMinSketch(width=256, depth=4)
+        exact = {}
+        for _ in range(20000):
+            key = generator.randrange(2000)
+            sketch.add(key)
+            exact[key] = exact.get(key, 0) + 1
+        sketch.add(10 ** 9, 5000)
+        self.assertTrue(all(sketch.estimate(key) >= count for key, count in exact.items()))
+        self.assertLess(sketch.estimate(10 ** 9) - 5000, 2 * 25000 / 256)
+        self.assertEqual(sketch.total, 25000)
+
+    def test_hyperloglog_estimate_and_merge(self):
+        first, second = HyperLogLog(12), HyperLogLog(12)
+        for key in range(40000):
+            (first if key % 2 else second).add(mix64(key))
+            first.add(mix64(key % 100))
+        self.assertAlmostEqual(first.merge(second).estimate(), 40000, delta=40000 * 0.05)
+        small = HyperLogLog(12)
+        for key in range(50):
+            small.add(mix64(key))
+        self.assertAlmostEqual(small.estimate(), 50, delta=2)
+        with self.assertRaises(ValueError):
+            first.merge(HyperLogLog(10))
+
+    def test_tdigest_quantiles(self):
+        generator = random.Random(5)
+        values = [generator.lognormvariate(3, 1) for _ in range(50000)]
+        halves = TDigest(), TDigest()
+        for index, value in enumerate(values):
+            halves[index % 2].add(value)
+        digest = halves[0].merge(halves[1])
+        values.sort()
+        for q in (0.5, 0.9, 0.99):
+            expected = values[int(q * len(values))]
+            self.assertAlmostEqual(digest.quantile(q), expected, delta=expected * 0.03)
+        self.assertEqual((digest.quantile(0), digest.quantile(1)), (values[0], values[-1]))
+        self.assertLessEqual(len(digest.means), 2 * digest.compression)
+        self.assertAlmostEqual(digest.cdf(values[25000]), 0.5, delta=0.02)
+
+    def test_round_trip(self):
+        sketches = [CountMinSketch(64, 2), HyperLogLog(8), TDigest(50)]
+        for key in range(1000):
+            sketches[0].add(key % 37)
+            sketches[1].add(mix64(key))
+            sketches[2].add(key)
+        for sketch in sketches:
+            with self.subTest(sketch=type(sketch).__name__):
+                copy = type(sketch).from_dict(sketch.to_dict())
+                self.assertEqual(copy.to_dict(), sketch.to_dict())
+        self.assertTrue(TDigest().quantile(0.5) != TDigest().quantile(0.5))
@@ -0,0 +1,100 @@
+import dataclasses
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import sys
+
+path_to_append: Path = Path.cwd().resolve().parent
+sys.path.append(str(path_to_append))
+
+from limits import LimitExceededError, ParseLimits
+from pool import ObjectPool
+from query_processor import format_stacks
+from sql_parser import Parser
+from sql_query import SqlQuery
+from test_cases.test_case import TestCase, load_test_cases
+from typing import Dict
+
+
+class TestSqlParser(unittest.TestCase):
+    _directory_test_cases = "test_cases"
+
+    def setUp(self):
+        self.test_cases: Dict[str, TestCase] = {
+            case.name: case for case in load_test_cases(self._directory_test_cases)}
+
+    def test_matches_sql_query(self):
+        parser = Parser()
+        for name, test_case in self.test_cases.items():
+            with self.subTest(name=name):
+                sql_query = SqlQuery()
+                sql_query.set_query(test_case.query)
+                result = parser.parse(test_case.query)
+                self.assertEqual(result.normalized_query, sql_query.normalized_query)
+                self.assertEqual(result.flatten_tree(), sql_query.flatten_tree())
+                self.assertEqual(result.tree_to_dict(), sql_query.tree_to_dict())
+                self.assertEqual(result.get_depth(), sql_query.get_depth())
+
+    def test_result_is_immutable(self):
+        result = Parser().parse("select a from t")
+        with self.assertRaises(dataclasses.FrozenInstanceError):
+            result.query = "select b from t"
+        self.assertIsInstance(result.tokens, tuple)
+        with self.assertRaises(AttributeError):
+            Parser().normalize = False
+
+    def test_options(self):
+        raw = Parser(normalize=False).parse("select a from t")
+        self.assertIsNone(raw.normalized_query)
+        self.assertEqual(raw.tree.source, "select a from t")
+        flat = Parser(tokens_only=True).parse("select a from t where b = 1")
+        self.assertEqual(flat.get_depth(), 1)
+        with self.assertRaises(ValueError):
+            Parser().parse("")
+        with self.assertRaises(LimitExceededError):
+            Parser(limits=ParseLimits(max_tokens=3)).parse("select a from t")
+        reduced = Parser(limits=ParseLimits(degrade=True, max_list_items=2)).parse(
+            "select a from t where b in (1, 2, 3, 4)")
+        self.assertEqual(len(reduced.summaries), 1)
+
+    def test_threads_share_one_parser(self):
+        parser = Parser()
+        queries = [test_case.query for test_case in self.test_cases.values()] * 4
+        expected = [parser.parse(query).tree_to_dict() for query in queries]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(parser.parse, queries))
+        self.assertEqual([result.tree_to_dict() for result in results], expected)
+
+    def test_pooled_stacks_do_not_leak_state(self):
+        format_stacks.clear()
+        first = Parser().parse("select a from t; select b from u").normalized_query
+        second = Parser().parse("select c from v").normalized_query
+        self.assertEqual(second, "SELECT c\nFROM v")
+        self.assertEqual(Parser().parse("select a from t; select b from u").normalized_query, first)
+        self.assertEqual(format_stacks.stats().created, 1)
+
+
+class TestObjectPool(unittest.TestCase):
+
+    def test_reuse_and_reset(self):
+        resets = []
+        pool = ObjectPool(list, reset=resets.append, max_idle=1)
+        with pool.borrow() as first:
+            first.append(1)
+        with pool.borrow() as second:
+            self.assertIs(second, first)
+        held = [pool.acquire(), pool.acquire()]
+        for item in held:
+            pool.release(item)
+        stats = pool.stats()
+        self.assertEqual((stats.created, stats.reused, stats.idle), (2, 2, 1))
+        self.assertEqual(len(resets), 4)
+
+    def test_failed_block_drops_object(self):
+        pool = ObjectPool(list)
+        with self.assertRaises(KeyError):
+            with pool.borrow():
+                raise KeyError("x")
+        self.assertEqual(pool.stats().idle, 0)
+        with self.assertRaises(ValueError):
+            ObjectPool(list, max_idle=-1)
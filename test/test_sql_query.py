@@ -1,3 +1,4 @@
+import subprocess
 import unittest
 import sqlparse
 from pathlib import Path
@@ -6,6 +7,8 @@ import sys
 path_to_append: Path = Path.cwd().resolve().parent
 sys.path.append(str(path_to_append))
 
+from instrumentation import MetricsCollector, add_hook, remove_hook
+from parse_cache import parse_cache
 from sql_query import SqlQuery
 from test_cases.test_case import TestCase, load_test_cases
 from typing import List
@@ -29,6 +32,56 @@ class TestSqlQuery(unittest.TestCase):
         tree_after_clearing = self.sql_query.create_tree()
         self.assertNotEqual(tree_before_clearing, tree_after_clearing)
 
+    def test_iter_flat_tokens(self):
+        self.sql_query.set_query("select a from (select b from (select c from t) x) y", normalize=False)
+        tokens = self.sql_query.iter_flat_tokens()
+        self.assertEqual(next(tokens), "SELECT")
+        self.assertEqual(
+            self.sql_query.flatten_tree(),
+            [token.normalized for token in sqlparse.parse(self.sql_query.raw_query)[0].flatten()])
+
+    def test_lazy_artifacts(self):
+        parse_cache.clear()
+        collector = MetricsCollector()
+        add_hook(collector)
+        try:
+            self.sql_query.set_query("select a, b from t where c = 1")
+            self.assertEqual(collector.timing("stage_seconds", stage="process_query")[0], 0)
+            self.assertEqual(collector.timing("stage_seconds", stage="normalize")[0], 0)
+            normalized = self.sql_query.normalized_query
+            tree = self.sql_query.create_tree()
+            self.assertIs(self.sql_query.normalized_query, normalized)
+            self.assertIs(self.sql_query.create_tree(), tree)
+            self.assertIs(self.sql_query.tokens(), self.sql_query.tokens())
+        finally:
+            remove_hook(collector)
+        # Normalizing and grouping happened once, in the same pass.
+        self.assertEqual(collector.timing("stage_seconds", stage="process_query")[0], 1)
+        self.assertEqual(collector.timing("stage_seconds", stage="parse")[0], 0)
+
+    def test_tokens_only(self):
+        query = "select a, b from t where c in (1, 2)"
+        parse_cache.clear()
+        collector = MetricsCollector()
+        add_hook(collector)
+        try:
+            self.sql_query.set_query(query, tokens_only=True)
+            flat = self.sql_query.flatten_tree()
+            self.sql_query.fingerprint()
+        finally:
+            remove_hook(collector)
+        self.assertEqual(flat, [token.normalized for token in sqlparse.parse(query)[0].flatten()])
+        self.assertTrue(all(not token.is_group for token in self.sql_query.tree))
+        for name in ("parse", "process_query", "normalize"):
+            self.assertEqual(collector.timing("stage_seconds", stage=name)[0], 0)
+
+    def test_import_is_lazy(self):
+        script = (f"import sys; sys.path.insert(0, {str(path_to_append)!r}); import sql_query; "
+                  "print(sorted(name for name in ('sqlparse', 'query_processor', 'sqlite3', 'socket') "
+                  "if name in sys.modules))")
+        output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+        self.assertEqual(output.stdout.strip(), "[]")
+
     # def test_tree_to_dict(self):
     #     for case in self.test_cases:
     #         with self.subTest(name=case.name, query=case.query):
@@ -0,0 +1,75 @@
+import unittest
+import io
+import tempfile
+from pathlib import Path
+import sys
+
+path_to_append: Path = Path.cwd().resolve().parent
+sys.path.append(str(path_to_append))
+
+from statement_reader import StatementSplitter, iter_statements, read_queries
+
+
+class TestStatementReader(unittest.TestCase):
+
+    def setUp(self):
+        self.script = (
+            "SELECT 'a;b', \"c;d\" FROM t; -- note; here\n"
+            "/* block; comment */ UPDATE t SET x = 'it''s;';\n"
+            "CREATE FUNCTION f() RETURNS int AS $body$ BEGIN; RETURN 1; END $body$ LANGUAGE plpgsql;\n"
+            "SELECT 'é;' FROM ü"
+        )
+        self.expected = [
+            "SELECT 'a;b', \"c;d\" FROM t;",
+            "-- note; here\n/* block; comment */ UPDATE t SET x = 'it''s;';",
+            "CREATE FUNCTION f() RETURNS int AS $body$ BEGIN; RETURN 1; END $body$ LANGUAGE plpgsql;",
+            "SELECT 'é;' FROM ü",
+        ]
+
+    def test_splitter_respects_quotes_and_comments(self):
+        splitter = StatementSplitter()
+        statements = splitter.feed(self.script) + splitter.close()
+        self.assertEqual([statement.text for statement in statements], self.expected)
+        for statement in statements:
+            self.assertEqual(self.script[statement.start:statement.end], statement.text)
+
+    def test_splitter_chunk_boundaries(self):
+        # Feeding one character at a time must give the same statements
+        splitter = StatementSplitter()
+        statements = []
+        for char in self.script:
+            statements.extend(splitter.feed(char))
+        statements.extend(splitter.close())
+        self.assertEqual([statement.text for statement in statements], self.expected)
+
+    def test_splitter_positional_parameters(self):
+        splitter = StatementSplitter()
+        statements = splitter.feed("SELECT $1, a$b$ FROM t; SELECT 2") + splitter.close()
+        self.assertEqual([statement.text for statement in statements], ["SELECT $1, a$b$ FROM t;", "SELECT 2"])
+
+    def test_iter_statements_from_path(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "script.sql"
+            path.write_bytes(self.script.encode("utf-8"))
+            statements = [statement.text for statement in iter_statements(path, chunk_size=3)]
+        self.assertEqual(statements, self.expected)
+
+    def test_iter_statements_from_file_objects(self):
+        binary = [statement.text for statement in iter_statements(io.BytesIO(self.script.encode("utf-8")), chunk_size=5)]
+        text = [statement.text for statement in iter_statements(io.StringIO(self.script), chunk_size=5)]
+        self.assertEqual(binary, self.expected)
+        self.assertEqual(text, self.expected)
+
+    def test_read_queries(self):
+        queries = list(read_queries(io.StringIO("select a from t; select b from u;"), normalize=False))
+        self.assertEqual([query.raw_query for query in queries], ["select a from t;", "select b from u;"])
+        self.assertEqual(queries[1].flatten_tree()[-2], "u")
+
+    def test_empty_source(self):
+        self.assertEqual(list(iter_statements(io.BytesIO(b""))), [])
+        with self.assertRaises(ValueError):
+            list(iter_statements(io.BytesIO(b""), chunk_size=0))
+
+
+if __name__ == '__main__':
+    unittest.main()
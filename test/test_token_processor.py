@@ -1,7 +1,7 @@
 import unittest
+import sys
 import sqlparse
-from token_processor import TokenProcessor
-from test_cases import test_cases
+from token_processor import TokenProcessor, iter_leaves
 
 class TestTokenProcessor(unittest.TestCase):
 
@@ -66,6 +66,26 @@ class TestTokenProcessor(unittest.TestCase):
         ]
         self.assertEqual(result, expected)
 
+    def test_process_deeply_nested_tokens(self):
+        # Deeper than the recursion limit
+        leaf = sqlparse.sql.Token(sqlparse.tokens.Name, "x")
+        tree = leaf
+        for _ in range(sys.getrecursionlimit() + 100):
+            tree = sqlparse.sql.Parenthesis([tree])
+        result = self.processor.process([tree])
+
+        depth = 0
+        node = result[0]
+        while node["is_group"]:
+            node = node["children"][0]
+            depth += 1
+        self.assertEqual(depth, sys.getrecursionlimit() + 100)
+        self.assertEqual(node["value"], "x")
+
+    def test_iter_leaves(self):
+        leaves = [token.value for token in iter_leaves(self.complex_tokens)]
+        self.assertEqual(leaves, [token.value for token in sqlparse.parse(self.complex_query)[0].flatten()])
+
 
 if __name__ == '__main__':
     unittest.main()
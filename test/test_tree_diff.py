@@ -0,0 +1,65 @@
+import unittest
+from pathlib import Path
+import sys
+
+path_to_append: Path = Path.cwd().resolve().parent
+sys.path.append(str(path_to_append))
+
+from query_tree import QueryTree
+from sql_query import SqlQuery
+from tree_diff import DELETED, INSERTED, MODIFIED, diff_queries, tree_hashes
+from test_cases.test_case import TestCase, load_test_cases
+from typing import Dict
+import sqlparse
+
+
+class TestTreeDiff(unittest.TestCase):
+    _directory_test_cases = "test_cases"
+
+    def setUp(self):
+        self.test_cases: Dict[str, TestCase] = {
+            case.name: case for case in load_test_cases(self._directory_test_cases)}
+
+    def test_identical_queries(self):
+        for name, test_case in self.test_cases.items():
+            with self.subTest(name=name):
+                first, second = SqlQuery(), SqlQuery()
+                first.set_query(test_case.query)
+                second.set_query(test_case.query)
+                self.assertEqual(first.diff(second), [])
+
+    def test_layout_and_case_are_ignored(self):
+        self.assertEqual(diff_queries("select a, b from t where x = 1",
+                                      "SELECT a,\n   b FROM t WHERE x = 1", normalize=False), [])
+
+    def test_modified_literal(self):
+        old = "select a, b from t where x = 1"
+        new = "select a, b from t where x = 22"
+        change, = diff_queries(old, new, normalize=False)
+        self.assertEqual((change.kind, change.clause), (MODIFIED, "WHERE"))
+        self.assertTrue(change.path.startswith("Where[4]/Comparison"))
+        self.assertEqual(old[slice(*change.old_span)], "1")
+        self.assertEqual(new[slice(*change.new_span)], "22")
+
+    def test_inserted_and_deleted_clauses(self):
+        changes = diff_queries("select a from t", "select a from t where y > 3 order by a", normalize=False)
+        self.assertEqual({change.kind for change in changes}, {INSERTED})
+        self.assertEqual([change.clause for change in changes], ["WHERE", "ORDER BY", "ORDER BY"])
+        self.assertEqual(changes[0].new_text.strip(), "where y > 3")
+        changes = diff_queries("select a, b, c from t", "select a, c from t", normalize=False)
+        self.assertEqual([(change.kind, change.old_text) for change in changes],
+                         [(DELETED, "b"), (DELETED, ",")])
+        self.assertTrue(all(change.new_span is None for change in changes))
+
+    def test_hashes_are_per_subtree(self):
+        tree = QueryTree(sqlparse.parse("select (a + 1), (a + 1) from t")[0].tokens)
+        hashes = tree_hashes(tree)
+        self.assertIs(tree_hashes(tree), hashes)
+        parenthesis = tree.find_tokens("Parenthesis")
+        self.assertEqual(len(parenthesis), 2)
+        self.assertEqual(hashes[parenthesis[0]], hashes[parenthesis[1]])
+        self.assertNotEqual(hashes[next(tree.roots())], hashes[parenthesis[0]])
+
+
+if __name__ == '__main__':
+    unittest.main()
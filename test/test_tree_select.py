@@ -0,0 +1,92 @@
+import unittest
+from pathlib import Path
+import sys
+
+path_to_append: Path = Path.cwd().resolve().parent
+sys.path.append(str(path_to_append))
+
+from sqlparse import tokens as T
+from query_tree import QueryTree
+from sql_query import SqlQuery
+from test_cases.test_case import TestCase, load_test_cases
+from tree_select import Selector, select_nodes
+from typing import Dict, List, Optional
+
+
+def reference(tree: QueryTree, selector, within: Optional[str] = None) -> List[int]:
+    # Selection on the compact tree, where every node knows its ancestors.
+    def ancestors(node: int) -> List[str]:
+        names = []
+        while tree.parent[node] >= 0:
+            node = tree.parent[node]
+            names.append(tree.type_of(node))
+        return names
+
+    if isinstance(selector, str):
+        steps = selector.split("/")
+        candidates = tree.find_tokens(steps[-1])
+        candidates = [node for node in candidates if ancestors(node)[:len(steps) - 1] == steps[-2::-1]]
+    else:
+        candidates = [node for node in tree.find_tokens(selector) if not tree.is_group(node)]
+    return [node for node in candidates if within is None or within in ancestors(node)]
+
+
+class TestTreeSelect(unittest.TestCase):
+    _directory_test_cases = "test_cases"
+
+    def setUp(self):
+        self.test_cases: Dict[str, TestCase] = {
+            case.name: case for case in load_test_cases(self._directory_test_cases)}
+
+    def test_matches_compact_tree(self):
+        selectors = [("Where", None), ("Identifier", None), ("Identifier", "Function"),
+                     ("Where/Comparison", None), ("Parenthesis/Identifier", "Where"),
+                     (T.Keyword, None), (T.Name, "Function")]
+        for name, test_case in self.test_cases.items():
+            sql_query = SqlQuery()
+            sql_query.set_query(test_case.query)
+            tree = sql_query.query_tree()
+            for selector, within in selectors:
+                with self.subTest(name=name, selector=str(selector), within=within):
+                    nodes = reference(tree, selector, within)
+                    self.assertEqual(sql_query.select(selector, within=within),
+                                     [tree.node_dict(node) for node in nodes])
+                    self.assertEqual(sql_query.select(selector, within=within, spans=True),
+                                     [tree.node_dict(node, spans=True) for node in nodes])
+                    self.assertEqual(sql_query.select(selector, within=within, first=True),
+                                     [tree.node_dict(node) for node in nodes[:1]])
+
+    def test_select_clause(self):
+        sql_query = SqlQuery()
+        sql_query.set_query("select a, count(b) from t where x = 1 and y in (select z from u where k = f(v))")
+        where = sql_query.select("Where", first=True)
+        self.assertEqual(len(where), 1)
+        self.assertTrue(where[0]["value"].startswith("WHERE x = 1"))
+        self.assertEqual(len(sql_query.select("Where")), 2)
+        self.assertEqual([node["value"] for node in sql_query.select("Identifier", within="Function")],
+                         ["count", "b", "f", "v"])
+        self.assertEqual([node["value"] for node in sql_query.select("Where/Comparison")], ["x = 1", "k = f(v)"])
+        self.assertEqual(sql_query.select("Having"), [])
+
+    def test_walk_stops_at_first_match(self):
+        visited = []
+
+        class Recording(list):
+            def __iter__(self):
+                for token in super().__iter__():
+                    visited.append(token)
+                    yield token
+
+        sql_query = SqlQuery()
+        sql_query.set_query("select a from t where x = 1; select b from u")
+        tokens = Recording(sql_query.create_tree())
+        self.assertEqual(select_nodes(tokens, T.Keyword.DML, first=True)[0]["value"], "SELECT")
+        self.assertEqual(len(visited), 1)
+
+    def test_invalid_selectors(self):
+        for selector, within in (("", None), ("Where//Comparison", None), (3, None), ("Where", "")):
+            with self.subTest(selector=selector, within=within):
+                with self.assertRaises(ValueError):
+                    Selector(selector, within)
+        with self.assertRaises(ValueError):
+            SqlQuery().select("Where")
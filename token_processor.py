@@ -1,14 +1,44 @@
-from typing import List, Dict
-from sqlparse.sql import Token, TokenList
+from __future__ import annotations
+from typing import TYPE_CHECKING, List, Dict, Iterator
+from instrumentation import stage
+
+if TYPE_CHECKING:
+    from sqlparse.sql import Token
+
+
+def iter_leaves(tokens: List[Token]) -> Iterator[Token]:
+    """
+    Iterate over the leaf tokens of a token tree in document order.
+
+    The tree is walked with an explicit stack, so arbitrarily deep nesting
+    does not hit the recursion limit.
+
+    Parameters:
+    tokens (List[Token]): The top-level tokens of the tree.
+
+    Returns:
+    Iterator[Token]: The tokens that are not groups.
+    """
+    stack = [iter(tokens)]
+    while stack:
+        for token in stack[-1]:
+            if token.is_group:
+                stack.append(iter(token.tokens))
+                break
+            yield token
+        else:
+            stack.pop()
 
 
 class TokenProcessor:
-    def process(self, tokens: List[Token]) -> List[Dict]:
+    def process(self, tokens: List[Token], spans: bool = False) -> List[Dict]:
         """
         Process a list of tokens into a structured format.
 
         Parameters:
         tokens (List[Token]): The list of tokens to process.
+        spans (bool): If True, give each dictionary a "span" of [start, stop]
+            offsets into the concatenated token text instead of a "value".
 
         Returns:
         List[Dict]: A list of dictionaries representing the processed tokens.
@@ -16,23 +46,35 @@ class TokenProcessor:
         Raises:
         ValueError: If the tokens list is empty or not a list.
         """
+        with stage("token_process"):
+            if spans:
+                from query_tree import QueryTree
+                return QueryTree(tokens).to_dict(spans=True)["children"]
+            return self._process(tokens)
+
+    def _process(self, tokens: List[Token]) -> List[Dict]:
         if not isinstance(tokens, list) or not tokens:
             raise ValueError("Tokens must be a non-empty list")
 
         result = []
-        for token in tokens:
-            if isinstance(token, TokenList):
-                children = self.process(token.tokens)
-                result.append({
-                    "type": type(token).__name__,
-                    "value": token.normalized,
-                    "is_group": True,
-                    "children": children
-                })
-            else:
-                result.append({
-                    "type": token.ttype,
-                    "value": token.normalized,
-                    "is_group": False
-                })
+        # Each entry pairs the tokens of a level with the list receiving their dicts.
+        stack = [(tokens, result)]
+        while stack:
+            level, output = stack.pop()
+            for token in level:
+                if token.is_group:
+                    children = []
+                    output.append({
+                        "type": type(token).__name__,
+                        "value": token.normalized,
+                        "is_group": True,
+                        "children": children
+                    })
+                    stack.append((token.tokens, children))
+                else:
+                    output.append({
+                        "type": token.ttype,
+                        "value": token.normalized,
+                        "is_group": False
+                    })
         return result
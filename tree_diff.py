@@ -0,0 +1,231 @@
+import hashlib
+import weakref
+from difflib import SequenceMatcher
+from typing import List, NamedTuple, Optional, Tuple
+from sqlparse import tokens as T
+from query_tree import QueryTree
+
+
+INSERTED = "inserted"
+DELETED = "deleted"
+MODIFIED = "modified"
+
+_ROOT = -1
+# Hashes are computed once per tree and dropped with it.
+_hash_cache: "weakref.WeakKeyDictionary[QueryTree, List[bytes]]" = weakref.WeakKeyDictionary()
+
+
+class Change(NamedTuple):
+    """
+    One structural difference between two query trees.
+
+    Attributes:
+    kind (str): INSERTED, DELETED or MODIFIED.
+    path (str): Slash-separated node types with their position among the
+        significant children, e.g. "Where[4]/Comparison[2]/Literal.Number.Integer[2]",
+        in the new tree, or in the old tree for deletions.
+    clause (str): The top-level clause the node belongs to, e.g. "SELECT" or "WHERE".
+    old_span (Optional[Tuple[int, int]]): Offsets in the old query, None for insertions.
+    new_span (Optional[Tuple[int, int]]): Offsets in the new query, None for deletions.
+    old_text (Optional[str]): Text of the node in the old query.
+    new_text (Optional[str]): Text of the node in the new query.
+    """
+    kind: str
+    path: str
+    clause: str
+    old_span: Optional[Tuple[int, int]]
+    new_span: Optional[Tuple[int, int]]
+    old_text: Optional[str]
+    new_text: Optional[str]
+
+
+def tree_hashes(tree: QueryTree) -> List[bytes]:
+    """
+    Return the Merkle hash of every node's subtree.
+
+    A leaf hashes its type and normalized value; a group hashes its type and
+    the hashes of its children. Whitespace is left out, so subtrees that differ
+    only in layout or keyword case hash the same. Hashes are cached per tree.
+
+    Parameters:
+    tree (QueryTree): The tree.
+
+    Returns:
+    List[bytes]: The hash of each node, by node index.
+    """
+    hashes = _hash_cache.get(tree)
+    if hashes is not None:
+        return hashes
+    count = len(tree)
+    hashes = [b""] * count
+    type_names = [str(node_type).encode("utf-8") for node_type in tree.types]
+    skipped = _whitespace_kinds(tree)
+    kind, group, first_child, next_sibling = tree.kind, tree.group, tree.first_child, tree.next_sibling
+    source, start, stop, keyword = tree.source, tree.start, tree.stop, tree.keyword
+    blake2b = hashlib.blake2b
+    # Children come after their parent in pre-order, so hash back to front.
+    for node in range(count - 1, -1, -1):
+        if group[node]:
+            digest = blake2b(type_names[kind[node]], digest_size=16)
+            child = first_child[node]
+            while child >= 0:
+                if not skipped[kind[child]]:
+                    digest.update(hashes[child])
+                child = next_sibling[child]
+        else:
+            value = source[start[node]:stop[node]]
+            if keyword[node]:
+                value = value.upper()
+            digest = blake2b(type_names[kind[node]] + b"\0" + value.encode("utf-8", "surrogatepass"),
+                             digest_size=16)
+        hashes[node] = digest.digest()
+    _hash_cache[tree] = hashes
+    return hashes
+
+
+def diff_trees(old: QueryTree, new: QueryTree) -> List[Change]:
+    """
+    Report the clauses that were inserted, deleted or modified between two trees.
+
+    Subtrees with equal hashes are skipped without being visited, and children
+    are aligned by hash, so the work is proportional to the changed part of
+    the trees plus one hashing pass over each.
+
+    Parameters:
+    old (QueryTree): The tree of the previous query.
+    new (QueryTree): The tree of the current query.
+
+    Returns:
+    List[Change]: The changes, innermost nodes that differ, in document order of the new tree.
+    """
+    return _Differ(old, new).run()
+
+
+def diff_queries(old: str, new: str, normalize: bool = True) -> List[Change]:
+    """
+    Parse two queries and report their structural differences.
+
+    Parameters:
+    old (str): The previous query.
+    new (str): The current query.
+    normalize (bool): If True, compare the trees of the normalized queries;
+        offsets then refer to the normalized text.
+
+    Returns:
+    List[Change]: The changes, as returned by diff_trees.
+
+    Raises:
+    ValueError: If either query is empty or cannot be parsed.
+    """
+    # Imported here: sql_query imports this module for SqlQuery.diff.
+    from sql_query import SqlQuery
+    trees = []
+    for query in (old, new):
+        sql_query = SqlQuery()
+        sql_query.set_query(query, normalize=normalize)
+        trees.append(sql_query.query_tree())
+    return diff_trees(*trees)
+
+
+class _Differ:
+    def __init__(self, old: QueryTree, new: QueryTree):
+        self.old = old
+        self.new = new
+        self.old_hashes = tree_hashes(old)
+        self.new_hashes = tree_hashes(new)
+        self.old_skipped = _whitespace_kinds(old)
+        self.new_skipped = _whitespace_kinds(new)
+        self.changes: List[Change] = []
+
+    def run(self) -> List[Change]:
+        self._diff_children(_ROOT, _ROOT, "", "")
+        return self.changes
+
+    def _children(self, tree: QueryTree, skipped: bytearray, node: int) -> List[int]:
+        children = tree.roots() if node == _ROOT else tree.children(node)
+        return [child for child in children if not skipped[tree.kind[child]]]
+
+    def _diff_children(self, old_node: int, new_node: int, old_path: str, new_path: str):
+        old_children = self._children(self.old, self.old_skipped, old_node)
+        new_children = self._children(self.new, self.new_skipped, new_node)
+        old_keys = [self.old_hashes[child] for child in old_children]
+        new_keys = [self.new_hashes[child] for child in new_children]
+
+        # Most edits leave long runs of equal siblings at both ends.
+        prefix = 0
+        limit = min(len(old_keys), len(new_keys))
+        while prefix < limit and old_keys[prefix] == new_keys[prefix]:
+            prefix += 1
+        suffix = 0
+        while suffix < limit - prefix and old_keys[-1 - suffix] == new_keys[-1 - suffix]:
+            suffix += 1
+        old_middle = old_keys[prefix:len(old_keys) - suffix]
+        new_middle = new_keys[prefix:len(new_keys) - suffix]
+        if not old_middle and not new_middle:
+            return
+
+        matcher = SequenceMatcher(None, old_middle, new_middle, autojunk=False)
+        for tag, old_begin, old_end, new_begin, new_end in matcher.get_opcodes():
+            if tag == "equal":
+                continue
+            old_range = range(prefix + old_begin, prefix + old_end)
+            new_range = range(prefix + new_begin, prefix + new_end)
+            for old_index, new_index in zip(old_range, new_range):
+                self._diff_node(old_children[old_index], new_children[new_index],
+                                self._path(self.old, old_path, old_children[old_index], old_index),
+                                self._path(self.new, new_path, new_children[new_index], new_index))
+            for old_index in old_range[len(new_range):]:
+                node = old_children[old_index]
+                self._report(DELETED, self._path(self.old, old_path, node, old_index), node, None)
+            for new_index in new_range[len(old_range):]:
+                node = new_children[new_index]
+                self._report(INSERTED, self._path(self.new, new_path, node, new_index), None, node)
+
+    def _diff_node(self, old_node: int, new_node: int, old_path: str, new_path: str):
+        old, new = self.old, self.new
+        if old.group[old_node] and new.group[new_node] \
+                and old.type_of(old_node) == new.type_of(new_node):
+            before = len(self.changes)
+            self._diff_children(old_node, new_node, old_path, new_path)
+            if len(self.changes) > before:
+                return
+        self._report(MODIFIED, new_path, old_node, new_node)
+
+    def _path(self, tree: QueryTree, parent_path: str, node: int, index: int) -> str:
+        name = str(tree.type_of(node))
+        if name.startswith("Token."):
+            name = name[len("Token."):]
+        step = f"{name}[{index}]"
+        return f"{parent_path}/{step}" if parent_path else step
+
+    def _report(self, kind: str, path: str, old_node: Optional[int], new_node: Optional[int]):
+        old, new = self.old, self.new
+        clause = _clause(new, new_node) if new_node is not None else _clause(old, old_node)
+        self.changes.append(Change(
+            kind, path, clause,
+            old.span(old_node) if old_node is not None else None,
+            new.span(new_node) if new_node is not None else None,
+            old.text(old_node) if old_node is not None else None,
+            new.text(new_node) if new_node is not None else None,
+        ))
+
+
+def _whitespace_kinds(tree: QueryTree) -> bytearray:
+    return bytearray(1 if not isinstance(node_type, str) and node_type in T.Whitespace else 0
+                     for node_type in tree.types)
+
+
+def _clause(tree: QueryTree, node: int) -> str:
+    # The keyword that opens the top-level clause the node belongs to.
+    while tree.parent[node] >= 0:
+        node = tree.parent[node]
+    roots = list(tree.roots())
+    for root in reversed(roots[:roots.index(node) + 1]):
+        if tree.group[root]:
+            if tree.type_of(root) in ("Where", "Having"):
+                return tree.type_of(root).upper()
+            continue
+        node_type = tree.type_of(root)
+        if node_type in T.Keyword:
+            return tree.value(root).upper()
+    return ""
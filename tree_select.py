@@ -0,0 +1,187 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple, Union
+from sqlparse.tokens import _TokenType
+
+if TYPE_CHECKING:
+    from sqlparse.sql import Token
+    from query_tree import NodeType
+
+
+class Selector:
+    """
+    A compiled node selector, evaluated directly on a sqlparse token tree.
+
+    A selector is a group class name such as "Where", a slash-separated path
+    of group class names such as "Where/Comparison", where each step must be
+    the parent of the next, or a sqlparse token type such as Token.Keyword,
+    which matches leaves of that type and its sub-types. The optional within
+    clause restricts matches to nodes that have a group of that class among
+    their ancestors.
+    """
+
+    def __init__(self, selector: Union[str, _TokenType], within: Optional[str] = None):
+        """
+        Initialize the Selector.
+
+        Parameters:
+        selector (Union[str, _TokenType]): A group class name or path, or a token type.
+        within (Optional[str]): A group class name required among the ancestors.
+
+        Raises:
+        ValueError: If the selector or within is empty or malformed.
+        """
+        if isinstance(selector, _TokenType):
+            self.steps: Tuple[str, ...] = ()
+            self.ttype: Optional[_TokenType] = selector
+        elif isinstance(selector, str) and selector and all(selector.split("/")):
+            self.steps = tuple(selector.split("/"))
+            self.ttype = None
+        else:
+            raise ValueError(f"Invalid selector: {selector!r}")
+        if within is not None and (not isinstance(within, str) or not within):
+            raise ValueError(f"Invalid within: {within!r}")
+        self.within = within
+
+    def _on_path(self, ancestors: List[str]) -> bool:
+        # The steps before the last must be the closest ancestors, and within any of them.
+        parents = self.steps[:-1]
+        if parents and (len(parents) > len(ancestors) or tuple(ancestors[-len(parents):]) != parents):
+            return False
+        return self.within is None or self.within in ancestors
+
+    def iter_matches(self, tokens: List[Token]) -> Iterator[Tuple[Token, int]]:
+        """
+        Walk a token tree in document order and yield the matching tokens.
+
+        Only the path from the top to the current token is kept, so the walk
+        can stop at any match without having visited the rest of the tree.
+
+        Parameters:
+        tokens (List[Token]): The top-level tokens of the tree.
+
+        Returns:
+        Iterator[Tuple[Token, int]]: Each matching token with the offset of
+        its text in the concatenated token text.
+        """
+        ancestors: List[str] = []
+        stack = [iter(tokens)]
+        position = 0
+        target = self.steps[-1] if self.steps else None
+        ttype = self.ttype
+        on_path = self._on_path
+        while stack:
+            for token in stack[-1]:
+                if token.is_group:
+                    name = type(token).__name__
+                    if name == target and on_path(ancestors):
+                        yield token, position
+                    ancestors.append(name)
+                    stack.append(iter(token.tokens))
+                    break
+                if ttype is not None and token.ttype in ttype and on_path(ancestors):
+                    yield token, position
+                position += len(token.value)
+            else:
+                stack.pop()
+                if ancestors:
+                    ancestors.pop()
+
+    def select(self, tokens: List[Token], first: bool = False, spans: bool = False) -> List[Dict]:
+        """
+        Return the dict form of each matching subtree.
+
+        Parameters:
+        tokens (List[Token]): The top-level tokens of the tree.
+        first (bool): If True, stop at the first match.
+        spans (bool): If True, give nodes a "span" of [start, stop] offsets
+            into the concatenated token text instead of a "value".
+
+        Returns:
+        List[Dict]: The matched subtrees, in document order, in the format of
+        TokenProcessor.process; nested matches appear both on their own and
+        inside their enclosing match.
+        """
+        results = []
+        for token, position in self.iter_matches(tokens):
+            results.append(subtree_dict(token, position if spans else None))
+            if first:
+                break
+        return results
+
+
+def select_nodes(tokens: List[Token], selector: Union[str, NodeType], within: Optional[str] = None,
+                 first: bool = False, spans: bool = False) -> List[Dict]:
+    """
+    Select subtrees of a token tree, e.g. select_nodes(tokens, "Where").
+
+    Parameters:
+    tokens (List[Token]): The top-level tokens of the tree.
+    selector (Union[str, NodeType]): A group class name or path, or a token type; see Selector.
+    within (Optional[str]): A group class name required among the ancestors.
+    first (bool): If True, stop at the first match.
+    spans (bool): If True, report offsets instead of text.
+
+    Returns:
+    List[Dict]: The dict form of the matched subtrees, in document order.
+
+    Raises:
+    ValueError: If the selector is malformed.
+    """
+    return Selector(selector, within).select(tokens, first=first, spans=spans)
+
+
+def subtree_dict(token: Token, position: Optional[int] = None) -> Dict:
+    """
+    Materialize the dict form of one token and its descendants.
+
+    Parameters:
+    token (Token): The token.
+    position (Optional[int]): If given, the offset of the token's text, and
+        nodes get a "span" of [start, stop] offsets instead of a "value".
+
+    Returns:
+    Dict: The same structure TokenProcessor.process produces for the token.
+    """
+    if position is None:
+        return _value_dict(token)
+    root: Dict = {}
+    # Each entry holds the tokens of a level, the list receiving their dicts
+    # and the offset where the level's text starts.
+    stack = [([token], None, position)]
+    while stack:
+        level, output, offset = stack.pop()
+        for child in level:
+            stop = offset + len(child.value)
+            if child.is_group:
+                children = []
+                entry = {"type": type(child).__name__, "span": [offset, stop], "is_group": True,
+                         "children": children}
+                stack.append((child.tokens, children, offset))
+            else:
+                entry = {"type": child.ttype, "span": [offset, stop], "is_group": False}
+            if output is None:
+                root = entry
+            else:
+                output.append(entry)
+            offset = stop
+    return root
+
+
+def _value_dict(token: Token) -> Dict:
+    if not token.is_group:
+        return {"type": token.ttype, "value": token.normalized, "is_group": False}
+    children: List[Dict] = []
+    root = {"type": type(token).__name__, "value": token.normalized, "is_group": True, "children": children}
+    stack = [(token.tokens, children)]
+    while stack:
+        level, output = stack.pop()
+        append = output.append
+        for child in level:
+            if child.is_group:
+                grandchildren: List[Dict] = []
+                append({"type": type(child).__name__, "value": child.normalized, "is_group": True,
+                        "children": grandchildren})
+                stack.append((child.tokens, grandchildren))
+            else:
+                append({"type": child.ttype, "value": child.normalized, "is_group": False})
+    return root